@@ -0,0 +1,98 @@
+import asyncio
+import re
+import reflex as rx
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from app.processing.analysis import ANALYSIS_VERSION, load_analysis, open_features
+from app.processing.artifacts import ARTIFACTS_DIRNAME
+from app.processing.wire import FEATURE_ROWS_VERSION, encode_feature_rows
+
+CHUNK_FRAMES = 256
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+CONTENT_HASH = re.compile(r"[0-9a-f]{64}")
+# Part of every feature URL and ETag: responses are cached as immutable, so
+# a new analysis or row layout must change the URL to be seen at all.
+FEATURE_TRACK_VERSION = f"a{ANALYSIS_VERSION}w{FEATURE_ROWS_VERSION}"
+
+
+def _error(message: str, status_code: int = 400) -> JSONResponse:
+    return JSONResponse({"error": message}, status_code=status_code)
+
+
+def _open_track(version: str, content_hash: str):
+    if version != FEATURE_TRACK_VERSION or not CONTENT_HASH.fullmatch(content_hash):
+        return None
+    artifacts = rx.get_upload_dir() / ARTIFACTS_DIRNAME / content_hash
+    analysis = load_analysis(artifacts)
+    if analysis is None:
+        return None
+    return open_features(artifacts, analysis)
+
+
+async def feature_info(request: Request) -> Response:
+    version = request.path_params["version"]
+    content_hash = request.path_params["content_hash"]
+    track = await asyncio.to_thread(_open_track, version, content_hash)
+    if track is None:
+        return _error("No feature track for this upload.", status_code=404)
+    return JSONResponse(
+        {
+            "fps": track.fps,
+            "frames": len(track),
+            "num_bins": track.num_bins,
+            "wave_points": track.wave_points,
+            "chunk_frames": CHUNK_FRAMES,
+        },
+        headers={"Cache-Control": CACHE_CONTROL},
+    )
+
+
+async def feature_chunk(request: Request) -> Response:
+    """One window of ``CHUNK_FRAMES`` packed feature rows.
+
+    Tracks are content-addressed and, for one ``FEATURE_TRACK_VERSION``,
+    immutable, so the chunk is cached indefinitely and revalidated by ETag.
+    """
+    version = request.path_params["version"]
+    content_hash = request.path_params["content_hash"]
+    index = request.path_params["index"]
+    etag = f'"{version}-{content_hash[:16]}-{CHUNK_FRAMES}-{index}"'
+    if (
+        version == FEATURE_TRACK_VERSION
+        and request.headers.get("if-none-match") == etag
+    ):
+        return Response(status_code=304, headers={"ETag": etag})
+    track = await asyncio.to_thread(_open_track, version, content_hash)
+    if track is None:
+        return _error("No feature track for this upload.", status_code=404)
+    start = index * CHUNK_FRAMES
+    if start >= len(track):
+        return _error("Chunk out of range.", status_code=416)
+    stop = min(len(track), start + CHUNK_FRAMES)
+    body = await asyncio.to_thread(
+        encode_feature_rows,
+        track.bands(start, stop),
+        track.wave(start, stop),
+        track.level(start, stop),
+    )
+    return Response(
+        body,
+        media_type="application/octet-stream",
+        headers={
+            "ETag": etag,
+            "Cache-Control": CACHE_CONTROL,
+            "X-Feature-Start": str(start),
+            "X-Feature-Frames": str(stop - start),
+        },
+    )
+
+
+routes = [
+    Route("/api/features/{version}/{content_hash}", feature_info, methods=["GET"]),
+    Route(
+        "/api/features/{version}/{content_hash}/chunks/{index:int}",
+        feature_chunk,
+        methods=["GET"],
+    ),
+]
@@ -0,0 +1,107 @@
+import os
+import re
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+import reflex as rx
+from starlette.requests import Request
+from starlette.responses import FileResponse, JSONResponse, Response
+from starlette.routing import Route
+from app.processing.artifacts import ARTIFACTS_DIRNAME
+from app.processing.export import EXPORTS_DIRNAME
+from app.processing.proxy import PROXY_FILENAME, THUMBNAILS_FILENAME
+
+UPLOAD_CACHE_CONTROL = "public, max-age=86400"
+EXPORT_CACHE_CONTROL = "public, no-cache"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+PREVIEW_FILES = {"proxy": PROXY_FILENAME, "thumbnails": THUMBNAILS_FILENAME}
+CONTENT_HASH = re.compile(r"[0-9a-f]{64}")
+
+
+def _error(message: str, status_code: int = 400) -> JSONResponse:
+    return JSONResponse({"error": message}, status_code=status_code)
+
+
+def _resolve(upload_dir: Path, relative: str) -> Path | None:
+    """The served file for ``relative``, refusing hidden and outside paths."""
+    parts = Path(relative).parts
+    if not parts or any(part.startswith(".") or part == "/" for part in parts):
+        return None
+    path = (upload_dir / relative).resolve()
+    if not path.is_relative_to(upload_dir.resolve()) or not path.is_file():
+        return None
+    return path
+
+
+def _not_modified(request: Request, etag: str, stat: os.stat_result) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag in {tag.strip() for tag in if_none_match.split(",")}
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(stat.st_mtime) <= since
+    return False
+
+
+def _serve(request: Request, path: Path, cache_control: str) -> Response:
+    """Serve ``path`` with Range support and validators.
+
+    FileResponse answers ``Range`` with 206 (and ``If-Range``), and when the
+    ASGI server offers the ``http.response.pathsend`` extension it hands the
+    whole-file case to the server's sendfile instead of copying through
+    Python.
+    """
+    stat = path.stat()
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": cache_control,
+    }
+    if _not_modified(request, etag, stat):
+        return Response(status_code=304, headers=headers)
+    download = request.query_params.get("download") is not None
+    return FileResponse(
+        path,
+        stat_result=stat,
+        headers=headers,
+        filename=path.name if download else None,
+        content_disposition_type="attachment" if download else "inline",
+    )
+
+
+async def media(request: Request) -> Response:
+    """An upload or export; exports are rewritten in place, so revalidated."""
+    relative = request.path_params["path"]
+    path = _resolve(rx.get_upload_dir(), relative)
+    if path is None:
+        return _error("Not found.", status_code=404)
+    exported = Path(relative).parts[0] == EXPORTS_DIRNAME
+    return _serve(
+        request, path, EXPORT_CACHE_CONTROL if exported else UPLOAD_CACHE_CONTROL
+    )
+
+
+async def preview_asset(request: Request) -> Response:
+    """The proxy or thumbnail strip of an upload, addressed by content hash."""
+    content_hash = request.path_params["content_hash"]
+    name = PREVIEW_FILES.get(request.path_params["kind"])
+    if name is None or not CONTENT_HASH.fullmatch(content_hash):
+        return _error("Not found.", status_code=404)
+    path = rx.get_upload_dir() / ARTIFACTS_DIRNAME / content_hash / name
+    if not path.is_file():
+        return _error("Not found.", status_code=404)
+    return _serve(request, path, IMMUTABLE_CACHE_CONTROL)
+
+
+routes = [
+    Route(
+        "/api/previews/{content_hash}/{kind}",
+        preview_asset,
+        methods=["GET", "HEAD"],
+    ),
+    Route("/api/media/{path:path}", media, methods=["GET", "HEAD"]),
+]
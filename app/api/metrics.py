@@ -0,0 +1,51 @@
+import asyncio
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+from starlette.routing import Route
+from app.processing.memory import memory_reports
+from app.processing.metrics import gauge_lines, render_metrics
+from app.processing.scheduler import get_export_scheduler
+from app.processing.upload_store import get_upload_store
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _export_gauges() -> list[str]:
+    store = get_export_scheduler().store
+    lines = gauge_lines(
+        "visualizer_export_queue_depth",
+        "Export jobs waiting to start.",
+        {"": len(store.with_status("queued"))},
+    )
+    lines += gauge_lines(
+        "visualizer_export_running",
+        "Export jobs currently running.",
+        {"": len(store.with_status("running"))},
+    )
+    latest = {report["kind"]: report["peak_job_rss"] for report in memory_reports()}
+    lines += gauge_lines(
+        "visualizer_last_job_peak_rss_bytes",
+        "Peak RSS added by the most recent job of each kind.",
+        {f'kind="{kind}"': peak for kind, peak in sorted(latest.items())},
+    )
+    uploads = get_upload_store().stats()
+    lines += gauge_lines(
+        "visualizer_upload_store_bytes",
+        "Disk used by stored uploads and their artifacts.",
+        {"": uploads["bytes"]},
+    )
+    lines += gauge_lines(
+        "visualizer_upload_store_entries",
+        "Distinct upload contents stored.",
+        {"": uploads["entries"]},
+    )
+    return lines
+
+
+async def metrics(request: Request) -> Response:
+    """Stage spans and job gauges in the Prometheus text exposition format."""
+    lines = render_metrics() + await asyncio.to_thread(_export_gauges)
+    return PlainTextResponse("\n".join(lines) + "\n", media_type=CONTENT_TYPE)
+
+
+routes = [Route("/metrics", metrics)]
@@ -0,0 +1,6 @@
+from starlette.applications import Starlette
+from app.api import features, media, metrics, uploads
+
+api = Starlette(
+    routes=[*uploads.routes, *features.routes, *media.routes, *metrics.routes]
+)
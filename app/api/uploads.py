@@ -0,0 +1,95 @@
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from app.processing.resumable import (
+    DEFAULT_CHUNK_SIZE,
+    ResumableUploadError,
+    get_resumable_store,
+)
+from app.processing.upload import ACCEPTED_VIDEO_TYPES, VALID_EXTENSIONS
+
+
+def _error(message: str, status_code: int = 400) -> JSONResponse:
+    return JSONResponse({"error": message}, status_code=status_code)
+
+
+async def create_upload(request: Request) -> Response:
+    try:
+        payload = await request.json()
+        filename = str(payload["filename"])
+        size = int(payload["size"])
+        content_type = str(payload.get("content_type", ""))
+        chunk_size = int(payload.get("chunk_size", DEFAULT_CHUNK_SIZE))
+    except (ValueError, KeyError, TypeError):
+        return _error("Expected JSON with filename, size and optional chunk_size.")
+    if content_type not in ACCEPTED_VIDEO_TYPES or not any(
+        (filename.lower().endswith(ext) for ext in VALID_EXTENSIONS)
+    ):
+        return _error("Invalid file type.", status_code=415)
+    try:
+        status = await get_resumable_store().create(
+            filename, size, content_type, chunk_size
+        )
+    except ResumableUploadError as e:
+        return _error(str(e))
+    return JSONResponse(status, status_code=201)
+
+
+async def upload_status(request: Request) -> Response:
+    try:
+        status = await get_resumable_store().status(request.path_params["upload_id"])
+    except ResumableUploadError as e:
+        return _error(str(e), status_code=404)
+    return JSONResponse(status)
+
+
+async def _read_body(request: Request, limit: int) -> bytes | None:
+    """The request body, or None if it is longer than ``limit`` bytes."""
+    declared = request.headers.get("content-length")
+    if declared is not None and (not declared.isdigit() or int(declared) > limit):
+        return None
+    body = bytearray()
+    async for block in request.stream():
+        body += block
+        if len(body) > limit:
+            return None
+    return bytes(body)
+
+
+async def upload_chunk(request: Request) -> Response:
+    checksum = request.headers.get("x-chunk-sha256")
+    if not checksum:
+        return _error("Missing X-Chunk-Sha256 header.")
+    try:
+        upload = await get_resumable_store().status(request.path_params["upload_id"])
+    except ResumableUploadError as e:
+        return _error(str(e), status_code=404)
+    data = await _read_body(request, upload["chunk_size"])
+    if data is None:
+        return _error("Chunk is larger than the upload's chunk size.", 413)
+    try:
+        status = await get_resumable_store().write_chunk(
+            request.path_params["upload_id"],
+            request.path_params["index"],
+            data,
+            checksum,
+        )
+    except ResumableUploadError as e:
+        return _error(str(e), status_code=422)
+    return JSONResponse(status)
+
+
+async def abort_upload(request: Request) -> Response:
+    try:
+        await get_resumable_store().abort(request.path_params["upload_id"])
+    except ResumableUploadError as e:
+        return _error(str(e), status_code=404)
+    return Response(status_code=204)
+
+
+routes = [
+    Route("/api/uploads", create_upload, methods=["POST"]),
+    Route("/api/uploads/{upload_id}", upload_status, methods=["GET"]),
+    Route("/api/uploads/{upload_id}", abort_upload, methods=["DELETE"]),
+    Route("/api/uploads/{upload_id}/chunks/{index:int}", upload_chunk, methods=["PUT"]),
+]
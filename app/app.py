@@ -3,6 +3,23 @@ from app.state import State
 from app.states.audio_state import AudioState
 from app.states.export_state import ExportState
 from app.components.visualizer import visualization_preview, viz_controls
+from app.api.routes import api
+from app.processing.resumable import run_resumable_cleanup
+from app.processing.scheduler import run_export_scheduler
+from app.processing.upload import MAX_DIRECT_UPLOAD_BYTES, VALID_EXTENSIONS
+
+
+def media_url(path: rx.Var[str], download: bool = False) -> rx.Var[str]:
+    """URL of an upload or export on the Range-capable media route."""
+    url = f"{rx.config.get_config().api_url}/api/media/{path}"
+    return rx.Var.create(f"{url}?download" if download else url)
+
+
+def preview_url(content_hash: rx.Var[str], kind: str) -> rx.Var[str]:
+    """URL of an upload's proxy or thumbnail strip."""
+    return rx.Var.create(
+        f"{rx.config.get_config().api_url}/api/previews/{content_hash}/{kind}"
+    )
 
 
 def file_info_item(icon: str, label: str, value: rx.Var[str | None]) -> rx.Component:
@@ -35,6 +52,8 @@ def metadata_display() -> rx.Component:
             file_info_item(
                 "volume-2", "Audio Info", State.video_metadata["audio_info"]
             ),
+            file_info_item("film", "Video Info", State.video_metadata["video_info"]),
+            file_info_item("timer", "Probe Time", State.video_metadata["probe_time"]),
             class_name="grid grid-cols-1 md:grid-cols-2 gap-4",
         ),
         class_name="w-full",
@@ -43,15 +62,31 @@ def metadata_display() -> rx.Component:
 
 def video_player() -> rx.Component:
     return rx.el.div(
-        rx.video(
-            src=rx.get_upload_url(State.video_file_name),
-            playing=True,
-            controls=True,
-            width="100%",
-            height="auto",
-            class_name="rounded-lg overflow-hidden shadow-md",
+        rx.el.div(
+            rx.video(
+                src=rx.cond(
+                    State.preview_proxy_ready,
+                    preview_url(State.video_content_hash, "proxy"),
+                    media_url(State.video_file_name),
+                ),
+                playing=True,
+                controls=True,
+                width="100%",
+                height="auto",
+                class_name="rounded-lg overflow-hidden shadow-md",
+            ),
+            id="video-player",
+            class_name="w-full aspect-video bg-black rounded-lg",
         ),
-        class_name="w-full aspect-video bg-black rounded-lg",
+        rx.cond(
+            State.thumbnail_strip_ready,
+            rx.image(
+                src=preview_url(State.video_content_hash, "thumbnails"),
+                alt="Keyframe thumbnails",
+                class_name="w-full mt-2 rounded-md",
+            ),
+        ),
+        class_name="w-full",
     )
 
 
@@ -72,7 +107,7 @@ def control_panel() -> rx.Component:
             on_click=ExportState.toggle_export_modal,
             disabled=AudioState.is_processing_audio
             | ExportState.is_exporting
-            | (AudioState.waveform_data.length() == 0),
+            | (AudioState.waveform_payload == ""),
         ),
         rx.el.button(
             "Clear Video",
@@ -96,13 +131,44 @@ def upload_placeholder() -> rx.Component:
                 "Supports: MP4, AVI, MOV, MKV, WEBM",
                 class_name="text-xs text-gray-500 mt-1",
             ),
+            rx.el.p(
+                f"Files over {MAX_DIRECT_UPLOAD_BYTES // 2**20} MB: use Resumable Upload",
+                class_name="text-xs text-gray-500 mt-1",
+            ),
             class_name="text-center",
         ),
         id="upload-main",
+        max_size=MAX_DIRECT_UPLOAD_BYTES,
         border="2px dashed #D1C4E9",
         padding="2rem",
         class_name="w-full h-full flex items-center justify-center bg-white rounded-lg hover:bg-violet-50 transition-colors duration-300 cursor-pointer",
         on_drop=State.handle_upload(rx.upload_files(upload_id="upload-main")),
+        on_drop_rejected=rx.toast.error(
+            f"Only video files up to {MAX_DIRECT_UPLOAD_BYTES // 2**20} MB can be "
+            "dropped here. Use Resumable Upload for larger files."
+        ),
+    )
+
+
+def resumable_upload_control() -> rx.Component:
+    return rx.el.div(
+        rx.el.input(
+            type="file",
+            id="resumable-upload",
+            accept=",".join(VALID_EXTENSIONS),
+            class_name="text-xs text-gray-600",
+        ),
+        rx.el.button(
+            "Resumable Upload",
+            rx.icon("cloud_upload", class_name="ml-2 h-4 w-4"),
+            on_click=rx.call_script(
+                f"window.resumableUpload('resumable-upload', '{rx.config.get_config().api_url}')",
+                callback=State.finish_resumable_upload,
+            ),
+            class_name="px-3 py-1 bg-gray-200 text-gray-800 rounded-md font-semibold text-sm flex items-center",
+        ),
+        rx.el.span(id="resumable-upload-progress", class_name="text-xs text-gray-500"),
+        class_name="flex items-center gap-4 mt-4",
     )
 
 
@@ -273,6 +339,35 @@ def export_modal() -> rx.Component:
                         class_name="flex gap-2 flex-wrap",
                     ),
                 ),
+                rx.el.div(
+                    rx.el.p(
+                        "Renderer",
+                        class_name="text-sm font-medium text-gray-600 mb-2",
+                    ),
+                    rx.el.div(
+                        rx.el.button(
+                            "Native (FFmpeg)",
+                            on_click=lambda: ExportState.set_export_engine("native"),
+                            class_name=rx.cond(
+                                ExportState.export_engine == "native",
+                                "bg-[#6200EA] text-white",
+                                "bg-gray-200 text-gray-800",
+                            )
+                            + " px-3 py-1 text-sm rounded-md",
+                        ),
+                        rx.el.button(
+                            "Python",
+                            on_click=lambda: ExportState.set_export_engine("python"),
+                            class_name=rx.cond(
+                                ExportState.export_engine == "python",
+                                "bg-[#6200EA] text-white",
+                                "bg-gray-200 text-gray-800",
+                            )
+                            + " px-3 py-1 text-sm rounded-md",
+                        ),
+                        class_name="flex gap-2",
+                    ),
+                ),
                 class_name="grid grid-cols-1 gap-4 mt-4",
             ),
             rx.el.div(
@@ -327,7 +422,7 @@ def export_preview() -> rx.Component:
             "Exported Video", class_name="text-lg font-semibold text-gray-800 mb-4"
         ),
         rx.video(
-            src=rx.get_upload_url(ExportState.exported_video_url),
+            src=media_url(ExportState.exported_video_url),
             playing=False,
             controls=True,
             width="100%",
@@ -336,7 +431,7 @@ def export_preview() -> rx.Component:
         ),
         rx.el.a(
             "Download Video",
-            href=rx.get_upload_url(ExportState.exported_video_url),
+            href=media_url(ExportState.exported_video_url, download=True),
             download=True,
             class_name="mt-4 inline-block px-5 py-3 bg-green-600 text-white rounded-md font-semibold text-sm text-center w-full hover:bg-green-700 transition-colors",
         ),
@@ -375,6 +470,11 @@ def index() -> rx.Component:
                         ),
                         class_name="w-full aspect-video flex items-center justify-center bg-gray-100 rounded-lg shadow-inner",
                     ),
+                    rx.cond(
+                        State.video_metadata | State.is_uploading,
+                        None,
+                        resumable_upload_control(),
+                    ),
                     rx.cond(
                         State.video_metadata & ~State.show_processing_error,
                         rx.el.div(
@@ -406,6 +506,7 @@ def index() -> rx.Component:
 
 app = rx.App(
     theme=rx.theme(appearance="light"),
+    api_transformer=api,
     head_components=[
         rx.el.link(rel="preconnect", href="https://fonts.googleapis.com"),
         rx.el.link(rel="preconnect", href="https://fonts.gstatic.com", cross_origin=""),
@@ -413,6 +514,10 @@ app = rx.App(
             href="https://fonts.googleapis.com/css2?family=JetBrains+Mono:wght@400;500;700&display=swap",
             rel="stylesheet",
         ),
+        rx.script(src="/resumable_upload.js"),
+        rx.script(src="/feature_preview.js"),
     ],
 )
-app.add_page(index)
\ No newline at end of file
+app.add_page(index)
+app.register_lifespan_task(run_export_scheduler)
+app.register_lifespan_task(run_resumable_cleanup)
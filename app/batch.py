@@ -0,0 +1,440 @@
+"""Analyze and export a batch of videos without the web UI.
+
+    python -m app.batch ~/videos --output-dir ~/videos/visualized --jobs 4
+    python -m app.batch manifest.json --output-dir out --style spectrum
+
+Inputs are directories (scanned for video files, ``--recursive`` mirrors
+subdirectories into the output) or manifests: a text file with one path
+per line, or a JSON list of paths or ``{"source": ..., "output": ...,
+**settings}`` objects. Files are processed by a pool of ``--jobs``
+processes using the same probe, analysis and export code as the app, with
+analysis artifacts cached in ``--work-dir``. An output whose stamp still
+matches its source and settings is skipped. A per-file timing and
+throughput report is written to ``--report`` (JSON, or CSV for a ``.csv``
+path).
+
+Every export also calibrates a throughput model kept in the work dir. With
+``--deadline SECONDS`` each file gets the slowest x264 preset and the fewest
+threads that the model predicts will finish in time.
+"""
+
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Literal, TypedDict
+from app.processing.analysis import analyze_media
+from app.processing.artifacts import artifact_dir, hash_file
+from app.processing.decode import DecodeError
+from app.processing.estimate import THROUGHPUT_FILENAME, ThroughputModel
+from app.processing.export import ExportError, ExportSettings, output_size
+from app.processing.memory import MEMORY_BUDGET, MemoryTracker
+from app.processing.pipeline import build_export_job, export_name, uses_native_engine
+from app.processing.probe import ProbeError, probe_media
+from app.processing.upload import VALID_EXTENSIONS
+
+CORES_PER_JOB = 2
+STAMP_VERSION = 1
+WORK_DIRNAME = ".batch"
+REPORT_FILENAME = "batch_report.json"
+
+BatchStatus = Literal["done", "skipped", "failed"]
+
+
+class BatchTask(TypedDict):
+    source: str
+    destination: str
+    work_dir: str
+    settings: ExportSettings
+    threads: int
+    memory_budget: int
+    deadline: float | None
+    force: bool
+
+
+class BatchResult(TypedDict):
+    source: str
+    output: str
+    status: BatchStatus
+    error: str | None
+    source_bytes: int
+    media_seconds: float
+    probe_seconds: float
+    analysis_seconds: float
+    export_seconds: float
+    total_seconds: float
+    frames: int
+    preset: str | None
+    threads: int
+    estimated_seconds: float | None
+    realtime: float
+    mb_per_second: float
+    peak_rss: int
+
+
+def _stamp_path(destination: Path) -> Path:
+    return destination.with_name(f".{destination.name}.batch.json")
+
+
+def _stamp(source: Path, settings: ExportSettings) -> dict:
+    stat = source.stat()
+    return {
+        "version": STAMP_VERSION,
+        "source": str(source.resolve()),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "settings": settings,
+    }
+
+
+def is_up_to_date(source: Path, destination: Path, settings: ExportSettings) -> bool:
+    """Whether ``destination`` was exported from this exact source and settings."""
+    if not destination.exists():
+        return False
+    try:
+        stamp = json.loads(_stamp_path(destination).read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return False
+    return stamp == _stamp(source, settings)
+
+
+async def _prepare(task: BatchTask, partial: Path, result: BatchResult):
+    source = Path(task["source"])
+    work_dir = Path(task["work_dir"])
+    started = time.perf_counter()
+    content_hash = await asyncio.to_thread(hash_file, source)
+    artifacts = artifact_dir(work_dir, content_hash)
+    probe = await probe_media(source, work_dir, content_hash)
+    result["media_seconds"] = probe["duration"] or 0.0
+    result["probe_seconds"] = time.perf_counter() - started
+    if not uses_native_engine(probe, task["settings"]):
+        started = time.perf_counter()
+        await analyze_media(source, artifacts, probe)
+        result["analysis_seconds"] = time.perf_counter() - started
+    model = ThroughputModel(work_dir / THROUGHPUT_FILENAME)
+    frames = round(result["media_seconds"] * (probe["fps"] or 30.0))
+    size = output_size(probe, task["settings"]["resolution"])
+    if task["deadline"] and (
+        choice := model.choose_encoder(
+            task["settings"],
+            size,
+            result["media_seconds"],
+            frames,
+            task["deadline"],
+            task["threads"],
+        )
+    ):
+        result["preset"] = choice["preset"]
+        result["threads"] = choice["threads"]
+    result["estimated_seconds"] = model.predict_seconds(
+        task["settings"],
+        size,
+        result["media_seconds"],
+        frames,
+        result["preset"],
+        result["threads"],
+    )
+    return await build_export_job(
+        source,
+        partial,
+        artifacts,
+        probe,
+        task["settings"],
+        workers=1,
+        threads=result["threads"],
+        memory_budget=task["memory_budget"],
+        preset=result["preset"],
+    )
+
+
+def process_file(task: BatchTask) -> BatchResult:
+    """Pool worker: probe, analyze and export one file, timing each stage.
+
+    Never raises: any error is reported as a failed result for this file.
+    """
+    source = Path(task["source"])
+    destination = Path(task["destination"])
+    partial = destination.with_name(f".{destination.stem}.part{destination.suffix}")
+    result: BatchResult = {
+        "source": task["source"],
+        "output": task["destination"],
+        "status": "skipped",
+        "error": None,
+        "source_bytes": 0,
+        "media_seconds": 0.0,
+        "probe_seconds": 0.0,
+        "analysis_seconds": 0.0,
+        "export_seconds": 0.0,
+        "total_seconds": 0.0,
+        "frames": 0,
+        "preset": None,
+        "threads": task["threads"],
+        "estimated_seconds": None,
+        "realtime": 0.0,
+        "mb_per_second": 0.0,
+        "peak_rss": 0,
+    }
+    started = time.perf_counter()
+    try:
+        result["source_bytes"] = source.stat().st_size
+        if not task["force"] and is_up_to_date(source, destination, task["settings"]):
+            return result
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        with MemoryTracker("batch", source.name, task["memory_budget"]) as memory:
+            job = asyncio.run(_prepare(task, partial, result))
+            export_started = time.perf_counter()
+            job.run()
+            result["export_seconds"] = time.perf_counter() - export_started
+        os.replace(partial, destination)
+        _stamp_path(destination).write_text(
+            json.dumps(_stamp(source, task["settings"]))
+        )
+        result["status"] = "done"
+        result["frames"] = job.total_frames
+        result["peak_rss"] = memory.peak_job_rss
+        ThroughputModel(Path(task["work_dir"]) / THROUGHPUT_FILENAME).record(
+            task["settings"],
+            job.size,
+            result["media_seconds"],
+            result["export_seconds"],
+            job.frames_done,
+            job.stage_fps,
+            result["preset"],
+            result["threads"],
+        )
+    except (ExportError, ProbeError, DecodeError, OSError) as e:
+        partial.unlink(missing_ok=True)
+        result["status"] = "failed"
+        result["error"] = str(e)
+    except Exception as e:
+        logging.exception(f"Batch export of {source} failed unexpectedly: {e}")
+        partial.unlink(missing_ok=True)
+        result["status"] = "failed"
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["total_seconds"] = elapsed = time.perf_counter() - started
+    if result["status"] == "done" and elapsed > 0:
+        result["realtime"] = result["media_seconds"] / elapsed
+        result["mb_per_second"] = result["source_bytes"] / elapsed / 1e6
+    return result
+
+
+def _video_files(directory: Path, recursive: bool) -> list[Path]:
+    pattern = "**/*" if recursive else "*"
+    return sorted(
+        path
+        for path in directory.glob(pattern)
+        if path.is_file()
+        and path.suffix.lower() in VALID_EXTENSIONS
+        and not any(part.startswith(".") for part in path.relative_to(directory).parts)
+    )
+
+
+def _manifest_entries(manifest: Path) -> list[dict]:
+    """Manifest entries as ``{"source": Path, "output"?: str, **settings}`` dicts."""
+    text = manifest.read_text()
+    if manifest.suffix.lower() == ".json":
+        entries = [
+            entry if isinstance(entry, dict) else {"source": entry}
+            for entry in json.loads(text)
+        ]
+    else:
+        entries = [
+            {"source": line.strip()}
+            for line in text.splitlines()
+            if line.strip() and not line.lstrip().startswith("#")
+        ]
+    keys = {"source", "output", *ExportSettings.__annotations__}
+    for entry in entries:
+        if unknown := set(entry) - keys:
+            raise ValueError(f"Unknown manifest keys {sorted(unknown)} in {manifest}")
+        entry["source"] = manifest.parent / Path(entry["source"]).expanduser()
+    return entries
+
+
+def collect_tasks(
+    args: argparse.Namespace, settings: ExportSettings
+) -> list[BatchTask]:
+    """One task per input file, each with its own output path.
+
+    A file listed twice is exported once. Same-named files from different
+    directories get a digest of their source path in the generated output
+    name; explicit manifest outputs that clash are an error.
+    """
+    threads = max(1, (os.cpu_count() or 1) // args.jobs)
+    tasks: list[BatchTask] = []
+    claimed: dict[Path, Path] = {}
+    for target in args.inputs:
+        if target.is_dir():
+            entries = [
+                {"source": path, "subdir": path.parent.relative_to(target)}
+                for path in _video_files(target, args.recursive)
+            ]
+        else:
+            entries = _manifest_entries(target)
+        for entry in entries:
+            source = entry.pop("source")
+            subdir = entry.pop("subdir", Path())
+            output = entry.pop("output", None)
+            file_settings: ExportSettings = {**settings, **entry}
+            destination = (
+                args.output_dir
+                / subdir
+                / (output or export_name(source.name, file_settings))
+            )
+            resolved = source.resolve()
+            if (owner := claimed.get(destination)) == resolved:
+                continue
+            if owner is not None:
+                if output:
+                    raise ValueError(
+                        f"{source} and {owner} would both be exported to {destination}"
+                    )
+                digest = hashlib.sha256(str(resolved).encode()).hexdigest()[:8]
+                destination = destination.with_name(
+                    export_name(f"{source.stem}_{digest}{source.suffix}", file_settings)
+                )
+            claimed[destination] = resolved
+            tasks.append(
+                {
+                    "source": str(source),
+                    "destination": str(destination),
+                    "work_dir": str(args.work_dir or args.output_dir / WORK_DIRNAME),
+                    "settings": file_settings,
+                    "threads": threads,
+                    "memory_budget": args.memory_budget // args.jobs,
+                    "deadline": args.deadline,
+                    "force": args.force,
+                }
+            )
+    return tasks
+
+
+def write_report(path: Path, results: list[BatchResult]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix.lower() == ".csv":
+        with path.open("w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(BatchResult.__annotations__))
+            writer.writeheader()
+            writer.writerows(results)
+    else:
+        path.write_text(json.dumps(results, indent=2))
+
+
+def _print_result(result: BatchResult):
+    name = Path(result["source"]).name
+    if result["status"] == "failed":
+        print(f"failed   {name}: {result['error']}")
+    elif result["status"] == "skipped":
+        print(f"skipped  {name} (up to date)")
+    else:
+        stages = [
+            f"probe {result['probe_seconds']:.1f}",
+            f"analysis {result['analysis_seconds']:.1f}",
+            f"export {result['export_seconds']:.1f}",
+        ]
+        if result["estimated_seconds"] is not None:
+            stages.append(f"estimated {result['estimated_seconds']:.1f}")
+        if result["preset"]:
+            stages.append(f"preset {result['preset']} x{result['threads']}")
+        print(
+            f"done     {name}: {result['total_seconds']:.1f} s "
+            f"({', '.join(stages)}), "
+            f"{result['realtime']:.2f}x realtime, "
+            f"{result['mb_per_second']:.1f} MB/s, "
+            f"peak {result['peak_rss'] / 2**20:.0f} MB"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", type=Path, nargs="+", help="directories or manifests")
+    parser.add_argument("--output-dir", type=Path, required=True)
+    parser.add_argument("--work-dir", type=Path, help="analysis cache")
+    parser.add_argument("--report", type=Path)
+    parser.add_argument("--recursive", action="store_true")
+    parser.add_argument("--force", action="store_true", help="redo up-to-date outputs")
+    parser.add_argument(
+        "--jobs", type=int, default=max(1, (os.cpu_count() or 1) // CORES_PER_JOB)
+    )
+    parser.add_argument("--memory-budget", type=int, default=MEMORY_BUDGET)
+    parser.add_argument(
+        "--deadline", type=float, help="seconds each export should finish within"
+    )
+    parser.add_argument("--engine", choices=["python", "native"], default="python")
+    parser.add_argument("--format", choices=["mp4", "mov", "avi"], default="mp4")
+    parser.add_argument(
+        "--quality", choices=["low", "medium", "high"], default="medium"
+    )
+    parser.add_argument(
+        "--resolution", choices=["480p", "720p", "1080p", "source"], default="source"
+    )
+    parser.add_argument(
+        "--style", choices=["waveform", "spectrum", "both"], default="waveform"
+    )
+    parser.add_argument("--color", default="#6200EA")
+    parser.add_argument(
+        "--position", choices=["bottom", "top", "overlay"], default="bottom"
+    )
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    args.jobs = max(1, args.jobs)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    settings: ExportSettings = {
+        "engine": args.engine,
+        "format": args.format,
+        "quality": args.quality,
+        "resolution": args.resolution,
+        "visualization_type": args.style,
+        "color": args.color,
+        "position": args.position,
+    }
+    try:
+        tasks = collect_tasks(args, settings)
+    except (OSError, ValueError) as e:
+        sys.exit(str(e))
+    if not tasks:
+        sys.exit("No video files found.")
+
+    started = time.perf_counter()
+    results: list[BatchResult] = []
+    pool = ProcessPoolExecutor(
+        max_workers=min(args.jobs, len(tasks)),
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+    try:
+        futures = [pool.submit(process_file, task) for task in tasks]
+        for future in as_completed(futures):
+            results.append(future.result())
+            _print_result(results[-1])
+    except KeyboardInterrupt:
+        print("Interrupted; unfinished files will be redone on the next run.")
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        report = args.report or args.output_dir / REPORT_FILENAME
+        write_report(report, sorted(results, key=lambda result: result["source"]))
+
+    elapsed = time.perf_counter() - started
+    done = [result for result in results if result["status"] == "done"]
+    failed = sum(result["status"] == "failed" for result in results)
+    media = sum(result["media_seconds"] for result in done)
+    size = sum(result["source_bytes"] for result in done)
+    print(
+        f"{len(done)} exported, {len(results) - len(done) - failed} skipped, "
+        f"{failed} failed in {elapsed:.1f} s "
+        f"({media / elapsed:.2f}x realtime, {size / elapsed / 1e6:.1f} MB/s overall); "
+        f"report written to {report}"
+    )
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
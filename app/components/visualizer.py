@@ -1,6 +1,39 @@
 import reflex as rx
+from reflex.vars.base import VarData
+from app.api.features import FEATURE_TRACK_VERSION
 from app.states.audio_state import AudioState
 
+# Decoders for the compact payloads produced by app.processing.wire.
+WAVEFORM_DECODER = """(payload, duration) => {
+  const bytes = Uint8Array.from(atob(payload), (c) => c.charCodeAt(0));
+  const values = new Int8Array(bytes.buffer);
+  const count = values.length / 3;
+  return Array.from({ length: count }, (_, i) => ({
+    time: count > 1 ? (i * duration) / (count - 1) : 0,
+    amplitude: values[3 * i] / 127,
+    min: values[3 * i + 1] / 127,
+    max: values[3 * i + 2] / 127,
+  }));
+}"""
+SPECTRUM_DECODER = """(payload) => {
+  const bytes = Uint8Array.from(atob(payload), (c) => c.charCodeAt(0));
+  const count = bytes.length / 3;
+  const view = new DataView(bytes.buffer);
+  return Array.from({ length: count }, (_, i) => ({
+    frequency: view.getUint16(2 * i, true),
+    magnitude: bytes[2 * count + i] / 255,
+  }));
+}"""
+
+
+def decoded_points(decoder: str, *args: rx.Var) -> rx.Var:
+    """Chart data decoded in the browser from the state's payload vars."""
+    return rx.Var(
+        _js_expr=f"({decoder})({', '.join(str(arg) for arg in args)})",
+        _var_type=list[dict[str, float]],
+        _var_data=VarData.merge(*(arg._get_all_var_data() for arg in args)),
+    )
+
 
 def waveform_chart() -> rx.Component:
     return rx.recharts.area_chart(
@@ -14,7 +47,9 @@ def waveform_chart() -> rx.Component:
         ),
         rx.recharts.x_axis(data_key="time", hide=True),
         rx.recharts.y_axis(domain=[-1, 1], hide=True),
-        data=AudioState.waveform_data,
+        data=decoded_points(
+            WAVEFORM_DECODER, AudioState.waveform_payload, AudioState.waveform_duration
+        ),
         height=120,
         width="100%",
     )
@@ -27,13 +62,27 @@ def spectrum_chart() -> rx.Component:
         ),
         rx.recharts.x_axis(data_key="frequency", hide=True),
         rx.recharts.y_axis(domain=[0, 1], hide=True),
-        data=AudioState.spectrum_data,
+        data=decoded_points(SPECTRUM_DECODER, AudioState.spectrum_payload),
         height=120,
         width="100%",
         bar_gap=2,
     )
 
 
+def animated_preview() -> rx.Component:
+    """Canvas animated by assets/feature_preview.js in step with the video."""
+    api_url = rx.config.get_config().api_url
+    return rx.el.canvas(
+        custom_attrs={
+            "data-feature-track": f"{api_url}/api/features/{FEATURE_TRACK_VERSION}/{AudioState.feature_track_id}",
+            "data-video": "#video-player video",
+            "data-style": AudioState.visualization_type,
+            "data-color": AudioState.visualization_color,
+        },
+        class_name="w-full h-32 bg-gray-900 rounded-md mb-4",
+    )
+
+
 def visualization_preview() -> rx.Component:
     return rx.el.div(
         rx.el.h3(
@@ -51,8 +100,9 @@ def visualization_preview() -> rx.Component:
                 class_name="flex items-center justify-center h-32",
             ),
             rx.cond(
-                AudioState.waveform_data,
+                AudioState.waveform_payload,
                 rx.el.div(
+                    rx.cond(AudioState.feature_track_id, animated_preview()),
                     rx.match(
                         AudioState.visualization_type,
                         ("waveform", waveform_chart()),
@@ -165,4 +215,4 @@ def viz_controls() -> rx.Component:
             ),
         ),
         class_name="grid grid-cols-3 gap-4 mt-6",
-    )
\ No newline at end of file
+    )
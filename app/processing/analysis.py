@@ -0,0 +1,222 @@
+import asyncio
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, TypedDict
+import numpy as np
+from app.processing.analyzers import ANALYZERS, Analyzer, TrackInfo
+from app.processing.decode import BYTES_PER_SAMPLE, SAMPLE_RATE, decode_pcm
+from app.processing.features import (
+    DEFAULT_FPS,
+    FEATURES_FILENAME,
+    WAVE_POINTS,
+    FeatureTrack,
+    FeatureTrackBuilder,
+    FeatureTrackInfo,
+)
+from app.processing.memory import MemoryTracker
+from app.processing.metrics import Span, record_span
+from app.processing.npy import NpyRowWriter
+from app.processing.peaks import PEAKS_FILENAME, PeakPyramid, PeakPyramidBuilder
+from app.processing.probe import ProbeResult
+from app.processing.spectrogram import NUM_BANDS, SPECTROGRAM_FILENAME
+
+ANALYSIS_VERSION = 3
+ANALYSIS_FILENAME = "analysis.json"
+PROGRESS_INTERVAL = 0.5
+MAX_CHANNELS = 8
+
+ProgressCallback = Callable[[float], Awaitable[None]]
+
+
+class AnalysisResult(TypedDict):
+    version: int
+    sample_rate: int
+    duration: float
+    spectrum: list[float]
+    features: FeatureTrackInfo
+    channels: int
+    tracks: dict[str, TrackInfo]
+
+
+_locks: dict[Path, asyncio.Lock] = {}
+
+
+def load_analysis(artifacts: Path) -> AnalysisResult | None:
+    """The cached analysis in ``artifacts``, if it is complete and current."""
+    try:
+        result = json.loads((artifacts / ANALYSIS_FILENAME).read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if result.get("version") != ANALYSIS_VERSION:
+        return None
+    names = [PEAKS_FILENAME, SPECTROGRAM_FILENAME, FEATURES_FILENAME]
+    names += [track["filename"] for track in result["tracks"].values()]
+    for name in names:
+        if not (artifacts / name).exists():
+            return None
+    return result
+
+
+def open_peaks(artifacts: Path) -> PeakPyramid:
+    return PeakPyramid(artifacts / PEAKS_FILENAME)
+
+
+def open_features(artifacts: Path, result: AnalysisResult) -> FeatureTrack:
+    return FeatureTrack(artifacts / FEATURES_FILENAME, result["features"])
+
+
+async def analyze_media(
+    video_path: Path,
+    artifacts: Path,
+    probe: ProbeResult,
+    progress: ProgressCallback | None = None,
+) -> AnalysisResult:
+    """Decode the audio once and derive every visualization artifact from it.
+
+    Writes the peak pyramid and the frame-aligned feature track (at the
+    probed frame rate) into ``artifacts``, computed from a mono downmix,
+    plus one track per registered analyzer, which sees every source
+    channel. The spectrogram holds the feature track's raw bands, so one
+    STFT serves both. A finished analysis is reused as long as its files
+    are present, so the preview, the exporter and repeated processing all
+    share one decode.
+
+    Audio is processed in fixed-size blocks and every artifact is streamed
+    to disk, so memory use does not grow with the length of the input; the
+    peak of the decoder plus the analysis buffers is recorded as a
+    ``MemoryTracker`` report. The run is timed as an ``analysis`` span, with
+    the time spent waiting on the decoder also recorded as an
+    ``extraction`` span.
+    """
+    lock = _locks.setdefault(artifacts, asyncio.Lock())
+    async with lock:
+        cached = load_analysis(artifacts)
+        if cached is not None:
+            return cached
+        with Span(
+            "analysis",
+            video_path.name,
+            num_bytes=probe["size"] or 0,
+            media_seconds=probe["duration"] or 0.0,
+        ) as span:
+            return await _analyze(video_path, artifacts, probe, progress, span)
+
+
+async def _analyze(
+    video_path: Path,
+    artifacts: Path,
+    probe: ProbeResult,
+    progress: ProgressCallback | None,
+    span: Span,
+) -> AnalysisResult:
+    sample_rate = SAMPLE_RATE
+    fps = probe["fps"] or DEFAULT_FPS
+    duration = probe["duration"] or 0
+    expected_samples = int(duration * sample_rate)
+    peaks = PeakPyramidBuilder(sample_rate, expected_samples)
+    spectrogram_writer = NpyRowWriter(artifacts / SPECTROGRAM_FILENAME, NUM_BANDS)
+    features_writer = NpyRowWriter(
+        artifacts / FEATURES_FILENAME, NUM_BANDS + WAVE_POINTS + 1
+    )
+    features = FeatureTrackBuilder(
+        sample_rate, fps, features_writer, bands_sink=spectrogram_writer.append
+    )
+    channels = min(probe["channels"] or 1, MAX_CHANNELS)
+    analyzers: list[Analyzer] = []
+    decoder_pids: list[int] = []
+    block_bytes = 0
+
+    def buffered_bytes() -> int:
+        """Everything the analysis holds in this process, counted explicitly
+        so concurrent requests in the server are not measured with it.
+        """
+        return (
+            block_bytes
+            + peaks.buffered_bytes
+            + features.buffered_bytes
+            + sum(analyzer.buffered_bytes for analyzer in analyzers)
+        )
+
+    def analyze_block(block: np.ndarray):
+        frames = block.reshape(len(block), -1)
+        mono = block if block.ndim == 1 else frames.mean(axis=1, dtype=np.float32)
+        peaks.push(mono)
+        features.push(mono)
+        for analyzer in analyzers:
+            analyzer.push(frames)
+
+    started = time.perf_counter()
+    last_report = started
+    decode_wait = 0.0
+    waiting_since = started
+    with MemoryTracker(
+        "analysis",
+        video_path.name,
+        pids=decoder_pids.copy,
+        allocated=buffered_bytes,
+    ):
+        try:
+            for cls in ANALYZERS.values():
+                analyzers.append(cls(sample_rate, channels, fps, artifacts))
+            async for block in decode_pcm(
+                video_path, sample_rate, channels, pids=decoder_pids
+            ):
+                decode_wait += time.perf_counter() - waiting_since
+                block_bytes = block.nbytes
+                for pid in decoder_pids:
+                    span.watch(pid)
+                await asyncio.to_thread(span.timed, analyze_block, block)
+                now = time.perf_counter()
+                if (
+                    progress
+                    and expected_samples
+                    and now - last_report > PROGRESS_INTERVAL
+                ):
+                    last_report = now
+                    await progress(min(1.0, peaks.num_samples / expected_samples))
+                waiting_since = time.perf_counter()
+            decode_wait += time.perf_counter() - waiting_since
+            record_span(
+                "extraction",
+                video_path.name,
+                decode_wait,
+                span.watched_cpu,
+                num_bytes=peaks.num_samples * channels * BYTES_PER_SAMPLE,
+                media_seconds=peaks.num_samples / sample_rate,
+            )
+            await asyncio.to_thread(
+                span.timed, peaks.finish, artifacts / PEAKS_FILENAME
+            )
+            feature_info = await asyncio.to_thread(span.timed, features.finish)
+            spectrum = features.spectrum
+            tracks = {}
+            for analyzer in analyzers:
+                tracks[analyzer.name] = await asyncio.to_thread(
+                    span.timed, analyzer.finish
+                )
+        except BaseException:
+            spectrogram_writer.abort()
+            features_writer.abort()
+            for analyzer in analyzers:
+                analyzer.abort()
+            raise
+    spectrogram_writer.close()
+    features_writer.close()
+    result: AnalysisResult = {
+        "version": ANALYSIS_VERSION,
+        "sample_rate": sample_rate,
+        "duration": peaks.num_samples / sample_rate,
+        "spectrum": [float(m) for m in spectrum],
+        "features": feature_info,
+        "channels": channels,
+        "tracks": tracks,
+    }
+    (artifacts / ANALYSIS_FILENAME).write_text(json.dumps(result))
+    logging.info(
+        f"Analyzed {video_path.name}: {result['duration']:.1f} s of audio, "
+        f"{feature_info['frames']} frames at {fps:.3f} fps "
+        f"in {time.perf_counter() - started:.2f} s"
+    )
+    return result
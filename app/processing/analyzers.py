@@ -0,0 +1,413 @@
+import abc
+from pathlib import Path
+from typing import TypedDict
+import numpy as np
+from scipy import signal
+from app.processing.npy import NpyRowWriter
+from app.processing.spectrogram import NUM_BANDS, SpectrogramEngine
+
+TRACK_DTYPE = "<f2"
+SILENCE_LUFS = -70.0
+MOMENTARY_SECONDS = 0.4
+SHORT_TERM_SECONDS = 3.0
+GATE_INTERVAL_SECONDS = 0.1
+RELATIVE_GATE_LU = -10.0
+RANGE_GATE_LU = -20.0
+ONSET_HISTORY_SECONDS = 1.0
+ONSET_RATIO = 1.5
+ONSET_MIN_STRENGTH = 0.02
+ONSET_REFRACTORY_SECONDS = 0.1
+PULSE_DECAY_SECONDS = 0.15
+
+
+class TrackInfo(TypedDict):
+    filename: str
+    fps: float
+    frames: int
+    columns: list[str]
+    stats: dict[str, float]
+
+
+class Analyzer(abc.ABC):
+    """One analysis fed by the shared decode, writing a per-video-frame track.
+
+    ``push`` receives every decoded block as float32 ``(frames, channels)``
+    with the source channels intact; row ``k`` of the track describes video
+    frame ``k``. Subclasses are registered with ``register_analyzer`` and run
+    on every analysis, so a new feature costs its own CPU time and never
+    another decode.
+    """
+
+    name = ""
+
+    def __init__(
+        self,
+        sample_rate: int,
+        channels: int,
+        fps: float,
+        artifacts: Path,
+        columns: list[str],
+    ):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.fps = fps
+        self.columns = columns
+        self.writer = NpyRowWriter(
+            artifacts / f"{self.name}.npy", len(columns), TRACK_DTYPE
+        )
+
+    @abc.abstractmethod
+    def push(self, block: np.ndarray):
+        """Consume one decoded ``(frames, channels)`` block."""
+
+    @abc.abstractmethod
+    def stats(self) -> dict[str, float]:
+        """Summary values stored with the finished track."""
+
+    @property
+    def buffered_bytes(self) -> int:
+        """Memory held between pushes; zero unless the subclass buffers audio."""
+        return 0
+
+    def flush(self):
+        """Write the rows still buffered at the end of the stream."""
+
+    def finish(self) -> TrackInfo:
+        self.flush()
+        self.writer.close()
+        return {
+            "filename": self.writer.path.name,
+            "fps": self.fps,
+            "frames": self.writer.rows,
+            "columns": self.columns,
+            "stats": self.stats(),
+        }
+
+    def abort(self):
+        self.writer.abort()
+
+
+ANALYZERS: dict[str, type[Analyzer]] = {}
+
+
+def register_analyzer(cls: type[Analyzer]) -> type[Analyzer]:
+    ANALYZERS[cls.name] = cls
+    return cls
+
+
+def open_track(artifacts: Path, info: TrackInfo) -> np.ndarray:
+    """The ``(frames, columns)`` rows of a track, memory-mapped."""
+    return np.load(artifacts / info["filename"], mmap_mode="r")
+
+
+class FrameSplitter:
+    """Cuts a streamed signal at video frame boundaries.
+
+    Frame ``k`` covers samples ``[round(k * hop), round((k + 1) * hop))``,
+    the same frames as the feature track. Samples past the last complete
+    frame are held until the next block.
+    """
+
+    def __init__(self, sample_rate: int, fps: float, channels: int):
+        self.hop = sample_rate / fps
+        self.frames = 0
+        self._buffer = np.empty((0, channels), dtype=np.float32)
+        self._buffer_start = 0
+
+    @property
+    def buffered_bytes(self) -> int:
+        return self._buffer.nbytes
+
+    def push(
+        self, block: np.ndarray, final: bool = False
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Samples of the newly completed frames and each frame's start offset."""
+        self._buffer = np.concatenate((self._buffer, block))
+        end = self._buffer_start + len(self._buffer)
+        if final:
+            # Every frame that starts before the end, however short.
+            total = int(np.ceil(end / self.hop))
+            while total > self.frames and round((total - 1) * self.hop) >= end:
+                total -= 1
+        else:
+            total = int(np.floor(end / self.hop))
+            while total > self.frames and round(total * self.hop) > end:
+                total -= 1
+        if total <= self.frames:
+            return self._buffer[:0], np.empty(0, dtype=np.intp)
+        bounds = np.minimum(
+            np.rint(np.arange(self.frames, total + 1) * self.hop).astype(np.intp), end
+        )
+        local = bounds - self._buffer_start
+        samples = self._buffer[local[0] : local[-1]]
+        self._buffer = self._buffer[local[-1] :]
+        self._buffer_start = int(bounds[-1])
+        self.frames = total
+        return samples, local[:-1] - local[0]
+
+
+def _channel_weights(channels: int) -> np.ndarray:
+    """BS.1770 channel gains in ffmpeg's 5.1/7.1 order (the LFE is ignored)."""
+    weights = np.ones(channels)
+    if channels >= 6:
+        weights[3] = 0.0
+        weights[4:] = 1.41
+    return weights
+
+
+def k_weighting(sample_rate: int) -> np.ndarray:
+    """The BS.1770 K-weighting pre-filter as second-order sections.
+
+    A high shelf followed by a high-pass, designed for any sample rate with
+    the same analog prototypes as the 48 kHz coefficients in the standard.
+    """
+    k = np.tan(np.pi * 1681.974450955533 / sample_rate)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh**0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = [
+        (vh + vb * k / q + k * k) / a0,
+        2 * (k * k - vh) / a0,
+        (vh - vb * k / q + k * k) / a0,
+        1.0,
+        2 * (k * k - 1) / a0,
+        (1 - k / q + k * k) / a0,
+    ]
+    k = np.tan(np.pi * 38.13547087602444 / sample_rate)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    high_pass = [1.0, -2.0, 1.0, 1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+    return np.array([shelf, high_pass])
+
+
+def _lufs(mean_square: np.ndarray | float) -> np.ndarray:
+    with np.errstate(divide="ignore"):
+        return np.maximum(-0.691 + 10 * np.log10(mean_square), SILENCE_LUFS)
+
+
+@register_analyzer
+class LoudnessAnalyzer(Analyzer):
+    """EBU R128 momentary and short-term loudness (LUFS) per video frame.
+
+    Windows are whole video frames, so the 400 ms and 3 s windows are
+    rounded to the frame rate. Integrated loudness and loudness range are
+    gated over windows taken every 100 ms, as in BS.1770 and EBU Tech 3342.
+    """
+
+    name = "loudness"
+
+    def __init__(self, sample_rate: int, channels: int, fps: float, artifacts: Path):
+        super().__init__(
+            sample_rate,
+            channels,
+            fps,
+            artifacts,
+            ["momentary_lufs", "short_term_lufs"],
+        )
+        self._sos = k_weighting(sample_rate)
+        self._zi = np.zeros((len(self._sos), 2, channels))
+        self._weights = _channel_weights(channels)
+        self._splitter = FrameSplitter(sample_rate, fps, channels)
+        self._momentary = max(1, round(MOMENTARY_SECONDS * fps))
+        self._short_term = max(1, round(SHORT_TERM_SECONDS * fps))
+        self._gate_interval = max(1, round(GATE_INTERVAL_SECONDS * fps))
+        self._tail_energy = np.empty(0)
+        self._tail_counts = np.empty(0)
+        self._momentary_blocks: list[np.ndarray] = []
+        self._short_term_blocks: list[np.ndarray] = []
+        self._peaks = np.full(2, SILENCE_LUFS)
+
+    def _windowed(self, cumulative: np.ndarray, ends: np.ndarray, size: int):
+        return cumulative[ends] - cumulative[np.maximum(ends - size, 0)]
+
+    def _emit(self, samples: np.ndarray, starts: np.ndarray):
+        if not len(starts):
+            return
+        energy = np.add.reduceat(np.square(samples, dtype=np.float64), starts)
+        energy = energy @ self._weights
+        counts = np.diff(np.append(starts, len(samples))).astype(np.float64)
+        first = self._splitter.frames - len(starts)
+        history = len(self._tail_energy)
+        energy = np.concatenate((self._tail_energy, energy))
+        counts = np.concatenate((self._tail_counts, counts))
+        total_energy = np.concatenate(([0.0], np.cumsum(energy)))
+        total_counts = np.concatenate(([0.0], np.cumsum(counts)))
+        ends = np.arange(history, len(energy)) + 1
+        windows = []
+        for size in (self._momentary, self._short_term):
+            windows.append(
+                self._windowed(total_energy, ends, size)
+                / self._windowed(total_counts, ends, size)
+            )
+        frames = np.arange(first, first + len(ends))
+        gated = frames % self._gate_interval == self._gate_interval - 1
+        self._momentary_blocks.append(
+            windows[0][gated & (frames >= self._momentary - 1)]
+        )
+        self._short_term_blocks.append(
+            windows[1][gated & (frames >= self._short_term - 1)]
+        )
+        rows = np.column_stack([_lufs(window) for window in windows])
+        for column, size in enumerate((self._momentary, self._short_term)):
+            full = rows[frames >= size - 1, column]
+            self._peaks[column] = max(
+                self._peaks[column], full.max(initial=SILENCE_LUFS)
+            )
+        self.writer.append(rows)
+        keep = self._short_term - 1
+        self._tail_energy = energy[len(energy) - keep :] if keep else energy[:0]
+        self._tail_counts = counts[len(counts) - keep :] if keep else counts[:0]
+
+    @property
+    def buffered_bytes(self) -> int:
+        blocks = self._momentary_blocks + self._short_term_blocks
+        return (
+            self._splitter.buffered_bytes
+            + self._tail_energy.nbytes
+            + self._tail_counts.nbytes
+            + sum(block.nbytes for block in blocks)
+        )
+
+    def push(self, block: np.ndarray):
+        filtered, self._zi = signal.sosfilt(self._sos, block, axis=0, zi=self._zi)
+        self._emit(*self._splitter.push(filtered.astype(np.float32)))
+
+    def flush(self):
+        empty = np.empty((0, self.channels), dtype=np.float32)
+        self._emit(*self._splitter.push(empty, final=True))
+
+    def stats(self) -> dict[str, float]:
+        momentary = np.concatenate(self._momentary_blocks)
+        momentary = momentary[_lufs(momentary) > SILENCE_LUFS]
+        integrated = SILENCE_LUFS
+        if len(momentary):
+            threshold = _lufs(momentary.mean()) + RELATIVE_GATE_LU
+            momentary = momentary[_lufs(momentary) > threshold]
+            integrated = (
+                float(_lufs(momentary.mean())) if len(momentary) else integrated
+            )
+        short_term = np.concatenate(self._short_term_blocks)
+        short_term = short_term[_lufs(short_term) > SILENCE_LUFS]
+        loudness_range = 0.0
+        if len(short_term):
+            threshold = _lufs(short_term.mean()) + RANGE_GATE_LU
+            levels = _lufs(short_term[_lufs(short_term) > threshold])
+            if len(levels):
+                low, high = np.percentile(levels, [10, 95])
+                loudness_range = float(high - low)
+        return {
+            "integrated_lufs": integrated,
+            "loudness_range_lu": loudness_range,
+            "max_momentary_lufs": float(self._peaks[0]),
+            "max_short_term_lufs": float(self._peaks[1]),
+        }
+
+
+@register_analyzer
+class OnsetAnalyzer(Analyzer):
+    """Spectral-flux onset strength and a decaying onset pulse per frame.
+
+    Onsets are picked causally: the flux must exceed ``ONSET_RATIO`` times
+    its mean over the previous second, so the pulse can drive visuals
+    without looking ahead.
+    """
+
+    name = "onsets"
+
+    def __init__(self, sample_rate: int, channels: int, fps: float, artifacts: Path):
+        super().__init__(sample_rate, channels, fps, artifacts, ["strength", "pulse"])
+        self._spectrogram = SpectrogramEngine(
+            sample_rate, self._emit, hop=sample_rate / fps, num_bins=NUM_BANDS
+        )
+        self._previous: np.ndarray | None = None
+        self._history = np.zeros(max(1, round(ONSET_HISTORY_SECONDS * fps)))
+        self._refractory = max(1, round(ONSET_REFRACTORY_SECONDS * fps))
+        self._decay = float(np.exp(-1.0 / (PULSE_DECAY_SECONDS * fps)))
+        self._frames = 0
+        self._since_onset = self._refractory
+        self._pulse = 0.0
+        self._onsets = 0
+        self._strength_peak = 0.0
+
+    def _emit(self, bands: np.ndarray):
+        compressed = np.log1p(100 * bands)
+        first = compressed[0] if self._previous is None else self._previous
+        previous = np.vstack((first, compressed[:-1]))
+        flux = np.maximum(compressed - previous, 0).mean(axis=1)
+        self._previous = compressed[-1]
+        rows = np.empty((len(flux), 2), dtype=np.float32)
+        history = self._history
+        for i, strength in enumerate(flux):
+            threshold = max(ONSET_MIN_STRENGTH, ONSET_RATIO * history.mean())
+            self._since_onset += 1
+            self._pulse *= self._decay
+            if strength > threshold and self._since_onset >= self._refractory:
+                self._since_onset = 0
+                self._pulse = 1.0
+                self._onsets += 1
+            history[(self._frames + i) % len(history)] = strength
+            rows[i] = strength, self._pulse
+        self._frames += len(flux)
+        self._strength_peak = max(self._strength_peak, float(flux.max(initial=0)))
+        self.writer.append(rows)
+
+    @property
+    def buffered_bytes(self) -> int:
+        return self._spectrogram.buffered_bytes + self._history.nbytes
+
+    def push(self, block: np.ndarray):
+        self._spectrogram.push(block.mean(axis=1, dtype=np.float32))
+
+    def flush(self):
+        self._spectrogram.finish()
+
+    def stats(self) -> dict[str, float]:
+        duration = self._frames / self.fps
+        return {
+            "onsets": float(self._onsets),
+            "onsets_per_minute": 60 * self._onsets / duration if duration else 0.0,
+            "strength_peak": self._strength_peak,
+        }
+
+
+@register_analyzer
+class ChannelLevelsAnalyzer(Analyzer):
+    """RMS and peak level of every source channel per frame."""
+
+    name = "channel_levels"
+
+    def __init__(self, sample_rate: int, channels: int, fps: float, artifacts: Path):
+        super().__init__(
+            sample_rate,
+            channels,
+            fps,
+            artifacts,
+            [f"rms_{c}" for c in range(channels)]
+            + [f"peak_{c}" for c in range(channels)],
+        )
+        self._splitter = FrameSplitter(sample_rate, fps, channels)
+        self._peaks = np.zeros(channels)
+
+    def _emit(self, samples: np.ndarray, starts: np.ndarray):
+        if not len(starts):
+            return
+        counts = np.diff(np.append(starts, len(samples)))[:, None]
+        rms = np.sqrt(np.add.reduceat(np.square(samples), starts) / counts)
+        peak = np.maximum.reduceat(np.abs(samples), starts)
+        self._peaks = np.maximum(self._peaks, peak.max(axis=0))
+        self.writer.append(np.hstack((rms, peak)))
+
+    @property
+    def buffered_bytes(self) -> int:
+        return self._splitter.buffered_bytes
+
+    def push(self, block: np.ndarray):
+        self._emit(*self._splitter.push(block))
+
+    def flush(self):
+        empty = np.empty((0, self.channels), dtype=np.float32)
+        self._emit(*self._splitter.push(empty, final=True))
+
+    def stats(self) -> dict[str, float]:
+        return {f"peak_{c}": float(peak) for c, peak in enumerate(self._peaks)}
@@ -0,0 +1,52 @@
+import hashlib
+import os
+from pathlib import Path
+
+ARTIFACTS_DIRNAME = ".artifacts"
+NAME_INDEX_DIRNAME = "names"
+HASH_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def artifact_dir(upload_dir: Path, content_hash: str) -> Path:
+    """Directory holding everything derived from one upload's content.
+
+    Its mtime is refreshed on every call and marks the content's last use.
+    """
+    path = upload_dir / ARTIFACTS_DIRNAME / content_hash
+    path.mkdir(parents=True, exist_ok=True)
+    os.utime(path)
+    return path
+
+
+def name_index_dir(upload_dir: Path) -> Path:
+    return upload_dir / ARTIFACTS_DIRNAME / NAME_INDEX_DIRNAME
+
+
+def _name_index_path(upload_dir: Path, file_name: str) -> Path:
+    return name_index_dir(upload_dir) / Path(file_name).name
+
+
+def register_upload(upload_dir: Path, file_name: str, content_hash: str):
+    path = _name_index_path(upload_dir, file_name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content_hash)
+
+
+def hash_file(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with path.open("rb") as f:
+        while block := f.read(HASH_BLOCK_SIZE):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def content_hash_for(upload_dir: Path, file_name: str) -> str:
+    """Content hash of an upload, hashing the file only if it was never recorded."""
+    index_path = _name_index_path(upload_dir, file_name)
+    try:
+        return index_path.read_text().strip()
+    except FileNotFoundError:
+        pass
+    content_hash = hash_file(upload_dir / file_name)
+    register_upload(upload_dir, file_name, content_hash)
+    return content_hash
@@ -0,0 +1,93 @@
+import asyncio
+import contextlib
+from pathlib import Path
+from typing import AsyncIterator
+import numpy as np
+
+FFMPEG = "ffmpeg"
+SAMPLE_RATE = 44100
+BLOCK_FRAMES = 65536
+BYTES_PER_SAMPLE = 4
+
+
+class DecodeError(Exception):
+    pass
+
+
+def pcm_command(
+    path: Path, sample_rate: int = SAMPLE_RATE, channels: int = 1
+) -> list[str]:
+    return [
+        FFMPEG,
+        "-nostdin",
+        "-v",
+        "error",
+        "-i",
+        str(path),
+        "-map",
+        "0:a:0",
+        "-vn",
+        "-ac",
+        str(channels),
+        "-ar",
+        str(sample_rate),
+        "-f",
+        "f32le",
+        "pipe:1",
+    ]
+
+
+async def decode_pcm(
+    path: Path,
+    sample_rate: int = SAMPLE_RATE,
+    channels: int = 1,
+    block_frames: int = BLOCK_FRAMES,
+    pids: list[int] | None = None,
+) -> AsyncIterator[np.ndarray]:
+    """Decode the first audio stream of ``path`` into float32 blocks.
+
+    ffmpeg writes raw little-endian float PCM to its stdout, which is read
+    without blocking the event loop. Blocks hold ``block_frames`` frames
+    (the last one may be shorter) and are 1-D for mono, ``(frames, channels)``
+    otherwise. Closing the iterator early kills the decoder. The decoder's
+    pid is kept in ``pids`` while it runs.
+
+    Raises:
+        FileNotFoundError: If ffmpeg is not installed.
+        DecodeError: If ffmpeg exits with an error.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *pcm_command(path, sample_rate, channels),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    if pids is not None:
+        pids.append(process.pid)
+    stderr_task = asyncio.create_task(process.stderr.read())
+    frame_bytes = BYTES_PER_SAMPLE * channels
+    block_bytes = block_frames * frame_bytes
+    try:
+        while True:
+            try:
+                data = await process.stdout.readexactly(block_bytes)
+            except asyncio.IncompleteReadError as e:
+                data = e.partial[: len(e.partial) // frame_bytes * frame_bytes]
+            if data:
+                block = np.frombuffer(data, dtype="<f4")
+                yield block if channels == 1 else block.reshape(-1, channels)
+            if len(data) < block_bytes:
+                break
+        returncode = await process.wait()
+        stderr = await stderr_task
+        if returncode != 0:
+            raise DecodeError(
+                stderr.decode(errors="replace").strip() or "ffmpeg failed"
+            )
+    finally:
+        if process.returncode is None:
+            with contextlib.suppress(ProcessLookupError):
+                process.kill()
+            await process.wait()
+        stderr_task.cancel()
+        if pids is not None:
+            pids.remove(process.pid)
@@ -0,0 +1,270 @@
+import contextlib
+import fcntl
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+from pathlib import Path
+from typing import Iterator, TypedDict
+from app.processing.export import X264_QUALITY, ExportSettings
+
+# One model per host: throughput measured on one machine says little about another.
+THROUGHPUT_FILENAME = f".throughput-{socket.gethostname()}.json"
+THROUGHPUT_VERSION = 2
+# Weight of the newest sample in the moving averages.
+SMOOTHING = 0.3
+# Progress after which the ETA trusts the job's own rate over the model.
+CALIBRATION_PROGRESS = 0.2
+# x264 presets from fastest to slowest, with their approximate encoding time
+# per frame relative to "medium".
+PRESET_COST = {
+    "ultrafast": 0.15,
+    "superfast": 0.25,
+    "veryfast": 0.35,
+    "faster": 0.6,
+    "fast": 0.75,
+    "medium": 1.0,
+    "slow": 1.5,
+    "slower": 2.5,
+    "veryslow": 5.0,
+}
+# Encoder speed grows roughly as threads ** THREAD_SCALING.
+THREAD_SCALING = 0.8
+PIPELINE_STAGES = {"decode", "render", "encode"}
+
+
+class Throughput(TypedDict):
+    samples: int
+    speed: float
+    fps: float
+    stages: dict[str, float]
+
+
+class EncoderChoice(TypedDict):
+    preset: str
+    threads: int
+    seconds: float
+
+
+def model_key(settings: ExportSettings, size: tuple[int, int]) -> str:
+    """Keyed on the output frame size, since "source" resolution can be any size."""
+    width, height = size
+    return "/".join(
+        (
+            settings["engine"],
+            f"{width}x{height}",
+            settings["quality"],
+            settings["format"],
+        )
+    )
+
+
+def _thread_factor(threads: int | None) -> float:
+    return (threads or os.cpu_count() or 1) ** THREAD_SCALING
+
+
+def _default_preset(settings: ExportSettings) -> str:
+    return X264_QUALITY.get(settings["quality"], X264_QUALITY["medium"])[1]
+
+
+def _average(old: float | None, new: float) -> float:
+    return new if old is None else old + SMOOTHING * (new - old)
+
+
+def _predict(
+    entry: Throughput,
+    settings: ExportSettings,
+    media_seconds: float,
+    frames: int,
+    preset: str | None,
+    threads: int | None,
+) -> float:
+    stages = entry["stages"]
+    if PIPELINE_STAGES <= stages.keys():
+        cost = PRESET_COST.get(preset or _default_preset(settings), 1.0)
+        fps = min(
+            stages["decode"],
+            stages["render"],
+            stages["encode"] / cost * _thread_factor(threads),
+        )
+        return frames / fps
+    return media_seconds / entry["speed"]
+
+
+def remaining_seconds(
+    media_seconds: float, progress: float, elapsed: float, speed: float
+) -> float:
+    """Seconds left for a running job, from the model and its own progress.
+
+    The model's prediction is used at the start and handed over gradually to
+    the job's observed rate until ``CALIBRATION_PROGRESS``.
+    """
+    predicted = max(0.0, media_seconds / speed - elapsed)
+    if progress <= 0:
+        return predicted
+    observed = elapsed * (1 - progress) / progress
+    weight = min(1.0, progress / CALIBRATION_PROGRESS)
+    return weight * observed + (1 - weight) * predicted
+
+
+class ThroughputModel:
+    """Measured export throughput on this host, per engine, output size,
+    quality and format.
+
+    Each finished export updates moving averages of its realtime speed, its
+    frame rate and, for the Python engine, each pipeline stage's own frame
+    rate. The encoder's rate is stored normalized to the "medium" preset on
+    one thread, which is what lets ``choose_encoder`` predict other presets
+    and thread counts.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._cached: tuple[int, dict[str, Throughput]] | None = None
+
+    def _load(self) -> dict[str, Throughput]:
+        """Entries on disk, re-read only when another writer changed the file."""
+        try:
+            mtime = self.path.stat().st_mtime_ns
+            if self._cached is not None and self._cached[0] == mtime:
+                return dict(self._cached[1])
+            data = json.loads(self.path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        entries = data["entries"] if data.get("version") == THROUGHPUT_VERSION else {}
+        self._cached = (mtime, entries)
+        return dict(entries)
+
+    def _save(self, entries: dict[str, Throughput]):
+        fd, tmp_name = tempfile.mkstemp(
+            dir=self.path.parent, prefix=f".{self.path.name}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"version": THROUGHPUT_VERSION, "entries": entries}, f)
+            os.replace(tmp_name, self.path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+    @contextlib.contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Serialize updates across processes, such as the batch pool's."""
+        fd = os.open(self.path.with_suffix(".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def get(self, settings: ExportSettings, size: tuple[int, int]) -> Throughput | None:
+        with self._lock:
+            return self._load().get(model_key(settings, size))
+
+    def record(
+        self,
+        settings: ExportSettings,
+        size: tuple[int, int],
+        media_seconds: float,
+        elapsed: float,
+        frames: int,
+        stage_fps: dict[str, float],
+        preset: str | None = None,
+        threads: int | None = None,
+    ):
+        """Add one finished export's measurements to the model."""
+        if elapsed <= 0 or media_seconds <= 0:
+            return
+        stage_fps = dict(stage_fps)
+        if "encode" in stage_fps:
+            cost = PRESET_COST.get(preset or _default_preset(settings), 1.0)
+            stage_fps["encode"] *= cost / _thread_factor(threads)
+        key = model_key(settings, size)
+        with self._lock, self._file_lock():
+            entries = self._load()
+            entry = entries.get(key) or {
+                "samples": 0,
+                "speed": None,
+                "fps": None,
+                "stages": {},
+            }
+            stages = entry["stages"]
+            entries[key] = {
+                "samples": entry["samples"] + 1,
+                "speed": _average(entry["speed"], media_seconds / elapsed),
+                "fps": _average(entry["fps"], frames / elapsed),
+                "stages": {
+                    **stages,
+                    **{
+                        stage: _average(stages.get(stage), fps)
+                        for stage, fps in stage_fps.items()
+                    },
+                },
+            }
+            try:
+                self._save(entries)
+            except OSError as e:
+                logging.warning(f"Could not save the throughput model: {e}")
+
+    def speed(self, settings: ExportSettings, size: tuple[int, int]) -> float | None:
+        """Media seconds exported per wall-clock second, if ever measured."""
+        entry = self.get(settings, size)
+        return entry["speed"] if entry else None
+
+    def predict_seconds(
+        self,
+        settings: ExportSettings,
+        size: tuple[int, int],
+        media_seconds: float,
+        frames: int,
+        preset: str | None = None,
+        threads: int | None = None,
+    ) -> float | None:
+        """Expected export time, or None before anything was measured."""
+        entry = self.get(settings, size)
+        if entry is None:
+            return None
+        return _predict(entry, settings, media_seconds, frames, preset, threads)
+
+    def choose_encoder(
+        self,
+        settings: ExportSettings,
+        size: tuple[int, int],
+        media_seconds: float,
+        frames: int,
+        deadline: float,
+        max_threads: int,
+    ) -> EncoderChoice | None:
+        """The slowest preset, and then the fewest threads, that meet ``deadline``.
+
+        Presets range from the one the quality setting implies down to
+        "ultrafast"; the CRF is kept, so a faster preset trades file size
+        rather than visual quality. Falls back to the fastest combination when
+        nothing fits. Returns None for non-x264 formats or until the model has
+        per-stage measurements for these settings.
+        """
+        if settings["format"] == "avi":
+            return None
+        entry = self.get(settings, size)
+        if entry is None or not PIPELINE_STAGES <= entry["stages"].keys():
+            return None
+        presets = list(PRESET_COST)
+        default = presets.index(_default_preset(settings))
+        for preset in reversed(presets[: default + 1]):
+            for threads in range(1, max_threads + 1):
+                seconds = _predict(
+                    entry, settings, media_seconds, frames, preset, threads
+                )
+                if seconds <= deadline:
+                    return {"preset": preset, "threads": threads, "seconds": seconds}
+        seconds = _predict(
+            entry, settings, media_seconds, frames, presets[0], max_threads
+        )
+        logging.warning(
+            f"No preset meets the {deadline:.0f} s deadline; "
+            f"the fastest needs about {seconds:.0f} s"
+        )
+        return {"preset": presets[0], "threads": max_threads, "seconds": seconds}
@@ -0,0 +1,483 @@
+import contextlib
+import logging
+import queue
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import TypedDict
+import numpy as np
+from app.processing.features import FeatureTrack
+from app.processing.memory import MEMORY_BUDGET
+from app.processing.metrics import reap, thread_cpu_seconds
+from app.processing.probe import ProbeResult
+from app.processing.render import OverlayRenderer
+
+FFMPEG = "ffmpeg"
+EXPORTS_DIRNAME = "exports"
+QUEUE_FRAMES = 8
+DEFAULT_SIZE = (1280, 720)
+DEFAULT_EXPORT_FPS = 30.0
+RESOLUTION_HEIGHTS = {"480p": 480, "720p": 720, "1080p": 1080}
+X264_QUALITY = {
+    "low": ("28", "veryfast"),
+    "medium": ("23", "medium"),
+    "high": ("18", "slow"),
+}
+MPEG4_QSCALE = {"low": "8", "medium": "5", "high": "2"}
+
+
+class ExportSettings(TypedDict):
+    engine: str
+    format: str
+    quality: str
+    resolution: str
+    visualization_type: str
+    color: str
+    position: str
+
+
+class ExportError(Exception):
+    pass
+
+
+class ExportCancelled(ExportError):
+    pass
+
+
+def _even(value: float) -> int:
+    return max(2, int(round(value / 2)) * 2)
+
+
+def output_size(probe: ProbeResult, resolution: str) -> tuple[int, int]:
+    """Encoded frame size for ``resolution``, keeping the source aspect ratio."""
+    if not probe["width"] or not probe["height"]:
+        return DEFAULT_SIZE
+    width, height = probe["width"], probe["height"]
+    target = RESOLUTION_HEIGHTS.get(resolution)
+    if target is None:
+        return _even(width), _even(height)
+    return _even(width * target / height), _even(target)
+
+
+def video_codec_args(settings: ExportSettings, preset: str | None = None) -> list[str]:
+    """Encoder options; ``preset`` overrides the x264 preset the quality implies."""
+    quality = settings["quality"]
+    if settings["format"] == "avi":
+        return ["-c:v", "mpeg4", "-q:v", MPEG4_QSCALE.get(quality, "5")]
+    crf, default_preset = X264_QUALITY.get(quality, X264_QUALITY["medium"])
+    preset = preset or default_preset
+    return ["-c:v", "libx264", "-preset", preset, "-crf", crf, "-pix_fmt", "yuv420p"]
+
+
+def audio_codec_args(settings: ExportSettings) -> list[str]:
+    if settings["format"] == "avi":
+        return ["-c:a", "libmp3lame", "-b:a", "192k"]
+    return ["-c:a", "aac", "-b:a", "192k"]
+
+
+def muxer_args(settings: ExportSettings) -> list[str]:
+    """Put the MP4/MOV index up front so playback starts before the download ends."""
+    if settings["format"] in ("mp4", "mov"):
+        return ["-movflags", "+faststart"]
+    return []
+
+
+def input_range_args(start: float = 0.0, duration: float | None = None) -> list[str]:
+    """Input options that limit decoding to ``[start, start + duration)``."""
+    args = ["-ss", f"{start:.6f}"] if start > 0 else []
+    if duration is not None:
+        args += ["-t", f"{duration:.6f}"]
+    return args
+
+
+def frame_limit_args(fps: float, duration: float | None) -> list[str]:
+    """Output options that stop after exactly the frames in ``duration``."""
+    if duration is None:
+        return []
+    return ["-frames:v", str(max(1, round(duration * fps)))]
+
+
+def decode_command(
+    source: Path,
+    size: tuple[int, int],
+    fps: float,
+    start: float = 0.0,
+    duration: float | None = None,
+) -> list[str]:
+    width, height = size
+    return [
+        FFMPEG,
+        "-nostdin",
+        "-v",
+        "error",
+        *input_range_args(start, duration),
+        "-i",
+        str(source),
+        "-map",
+        "0:v:0",
+        "-vf",
+        f"fps={fps},scale={width}:{height}",
+        *frame_limit_args(fps, duration),
+        "-f",
+        "rawvideo",
+        "-pix_fmt",
+        "rgb24",
+        "pipe:1",
+    ]
+
+
+def encode_command(
+    source: Path,
+    destination: Path,
+    size: tuple[int, int],
+    fps: float,
+    settings: ExportSettings,
+    include_audio: bool = True,
+    threads: int | None = None,
+    preset: str | None = None,
+) -> list[str]:
+    width, height = size
+    command = [
+        FFMPEG,
+        "-nostdin",
+        "-y",
+        "-v",
+        "error",
+        "-f",
+        "rawvideo",
+        "-pix_fmt",
+        "rgb24",
+        "-s",
+        f"{width}x{height}",
+        "-r",
+        str(fps),
+        "-i",
+        "pipe:0",
+    ]
+    if include_audio:
+        command += ["-i", str(source), "-map", "0:v:0", "-map", "1:a:0?"]
+    command += video_codec_args(settings, preset)
+    if threads:
+        command += ["-threads", str(threads)]
+    if include_audio:
+        command += [*audio_codec_args(settings), "-shortest"]
+    return [*command, *muxer_args(settings), str(destination)]
+
+
+class ExportJob:
+    """Decode, overlay and re-encode one video as three overlapping stages.
+
+    A reader thread pulls raw RGB frames from an ffmpeg decoder, a render
+    thread draws the visualization for each frame from the precomputed
+    feature track, and the calling thread feeds the result to the ffmpeg
+    encoder. Frames live in a fixed pool of buffers that are reused once the
+    encoder has consumed them, so at most a few frames are in flight, memory
+    stays flat within ``memory_budget`` and the slowest stage (normally the
+    encoder) sets the pace. The time each stage spends working is kept in
+    ``stage_seconds`` so its own frame rate can be told apart from the
+    pipeline's.
+    """
+
+    def __init__(
+        self,
+        source: Path,
+        destination: Path,
+        probe: ProbeResult,
+        features: FeatureTrack,
+        settings: ExportSettings,
+        queue_frames: int = QUEUE_FRAMES,
+        start_frame: int = 0,
+        frame_count: int | None = None,
+        include_audio: bool = True,
+        threads: int | None = None,
+        memory_budget: int = MEMORY_BUDGET,
+        preset: str | None = None,
+    ):
+        self.source = source
+        self.destination = destination
+        self.settings = settings
+        self.features = features
+        self.fps = probe["fps"] or features.fps or DEFAULT_EXPORT_FPS
+        self.size = output_size(probe, settings["resolution"])
+        self.start_frame = start_frame
+        self.frame_count = frame_count
+        self.include_audio = include_audio
+        self.threads = threads
+        self.preset = preset
+        self.total_frames = frame_count or max(
+            1, int(round((probe["duration"] or 0) * self.fps)) - start_frame
+        )
+        self.frames_done = 0
+        self.elapsed = 0.0
+        self.stage_seconds = {"decode": 0.0, "render": 0.0, "encode": 0.0}
+        self.cpu_seconds = 0.0
+        self.queue_frames = queue_frames
+        self.memory_budget = memory_budget
+        self.cancelled = False
+        self._stop = threading.Event()
+        self._errors: list[BaseException] = []
+        self._processes: list[subprocess.Popen] = []
+        self._pool_bytes = 0
+        self._renderer: OverlayRenderer | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def progress(self) -> float:
+        return min(1.0, self.frames_done / self.total_frames)
+
+    @property
+    def frames_per_second(self) -> float:
+        return self.frames_done / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def stage_fps(self) -> dict[str, float]:
+        """Frames per second each stage would manage if it never waited."""
+        return {
+            stage: self.frames_done / seconds
+            for stage, seconds in self.stage_seconds.items()
+            if seconds > 0 and self.frames_done
+        }
+
+    @property
+    def ffmpeg_speed(self) -> float | None:
+        """ffmpeg only decodes and encodes here, so it has no speed of its own."""
+        return None
+
+    def _add_cpu(self, seconds: float):
+        with self._lock:
+            self.cpu_seconds += seconds
+
+    def pids(self) -> list[int]:
+        """The decoder and encoder, while they run."""
+        return [
+            process.pid for process in self._processes if process.returncode is None
+        ]
+
+    def buffered_bytes(self) -> int:
+        """The frame pool and render buffers, which live in this process."""
+        renderer = self._renderer
+        return self._pool_bytes + (renderer.buffered_bytes if renderer else 0)
+
+    def cancel(self):
+        """Stop the export; killing ffmpeg unblocks every pipeline stage at once."""
+        with self._lock:
+            self.cancelled = True
+            self._stop.set()
+            for process in self._processes:
+                if process.poll() is None:
+                    process.kill()
+
+    def _put(self, q: queue.Queue, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, q: queue.Queue):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def _frame_pool(self) -> queue.Queue:
+        """Preallocated frame buffers: enough to fill both queues, but no more
+        than half the memory budget allows (and never fewer than one per stage).
+        """
+        width, height = self.size
+        frame_bytes = width * height * 3
+        count = min(2 * self.queue_frames + 3, self.memory_budget // 2 // frame_bytes)
+        pool: queue.Queue = queue.Queue()
+        for _ in range(max(3, count)):
+            pool.put(np.empty((height, width, 3), dtype=np.uint8))
+        self._pool_bytes = max(3, count) * frame_bytes
+        return pool
+
+    def _read_frames(self, stdout, frames: queue.Queue, pool: queue.Queue):
+        cpu_started = thread_cpu_seconds()
+        finished = False
+        try:
+            while (frame := self._get(pool)) is not None:
+                buffer = memoryview(frame).cast("B")
+                started = time.perf_counter()
+                read = stdout.readinto(buffer)
+                self.stage_seconds["decode"] += time.perf_counter() - started
+                if read != len(buffer):
+                    break
+                self._put(frames, frame)
+            finished = True
+        except (OSError, ValueError) as e:
+            # ValueError: the pipeline closed stdout while a read was pending.
+            self._errors.append(e)
+        finally:
+            if not finished:
+                self._stop.set()
+            self._put(frames, None)
+            self._add_cpu(thread_cpu_seconds() - cpu_started)
+
+    def _render_frames(self, frames: queue.Queue, rendered: queue.Queue):
+        """Rasterize strips a batch of feature rows at a time and blend each
+        into its frame.
+        """
+        width, height = self.size
+        renderer = OverlayRenderer(
+            width,
+            height,
+            self.settings["visualization_type"],
+            self.settings["color"],
+            self.settings["position"],
+        )
+        self._renderer = renderer
+        last_row = len(self.features) - 1
+        cpu_started = thread_cpu_seconds()
+        index = self.start_frame
+        strip = None
+        strip_start = index
+        finished = False
+        try:
+            while (frame := self._get(frames)) is not None:
+                if last_row >= 0:
+                    started = time.perf_counter()
+                    if strip is None or index - strip_start >= len(strip["first"]):
+                        start = min(index, last_row)
+                        stop = min(start + renderer.batch, last_row + 1)
+                        strip = renderer.rasterize(
+                            self.features.bands(start, stop),
+                            self.features.wave(start, stop),
+                        )
+                        strip_start = index
+                    renderer.composite(frame, strip, index - strip_start)
+                    self.stage_seconds["render"] += time.perf_counter() - started
+                self._put(rendered, frame)
+                index += 1
+            finished = True
+        except (OSError, ValueError, IndexError) as e:
+            # OSError: reading the memory-mapped feature track failed.
+            self._errors.append(e)
+        finally:
+            if not finished:
+                self._stop.set()
+            self._put(rendered, None)
+            self._add_cpu(thread_cpu_seconds() - cpu_started)
+
+    def _start_processes(self) -> tuple[subprocess.Popen, subprocess.Popen]:
+        try:
+            decoder = subprocess.Popen(
+                decode_command(
+                    self.source,
+                    self.size,
+                    self.fps,
+                    self.start_frame / self.fps,
+                    self.frame_count / self.fps if self.frame_count else None,
+                ),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        except FileNotFoundError:
+            raise ExportError(
+                "FFmpeg not found. Please ensure it is installed and in the system's PATH."
+            ) from None
+        self._processes.append(decoder)
+        try:
+            encoder = subprocess.Popen(
+                encode_command(
+                    self.source,
+                    self.destination,
+                    self.size,
+                    self.fps,
+                    self.settings,
+                    self.include_audio,
+                    self.threads,
+                    self.preset,
+                ),
+                stdin=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        except FileNotFoundError:
+            decoder.kill()
+            decoder.wait()
+            raise ExportError(
+                "FFmpeg not found. Please ensure it is installed and in the system's PATH."
+            ) from None
+        self._processes.append(encoder)
+        return decoder, encoder
+
+    def run(self) -> Path:
+        """Run the export to completion. Raises ExportCancelled or ExportError."""
+        started = time.perf_counter()
+        cpu_started = thread_cpu_seconds()
+        self.destination.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            if self.cancelled:
+                raise ExportCancelled()
+            decoder, encoder = self._start_processes()
+        pool = self._frame_pool()
+        frames: queue.Queue = queue.Queue(maxsize=self.queue_frames)
+        rendered: queue.Queue = queue.Queue(maxsize=self.queue_frames)
+        threads = [
+            threading.Thread(
+                target=self._read_frames,
+                args=(decoder.stdout, frames, pool),
+                daemon=True,
+            ),
+            threading.Thread(
+                target=self._render_frames, args=(frames, rendered), daemon=True
+            ),
+        ]
+        for thread in threads:
+            thread.start()
+        # With -shortest the encoder stops reading once the audio ends, which
+        # ends the export rather than failing it.
+        encoder_finished = False
+        try:
+            while (frame := self._get(rendered)) is not None:
+                write_started = time.perf_counter()
+                encoder.stdin.write(frame.data)
+                self.stage_seconds["encode"] += time.perf_counter() - write_started
+                pool.put(frame)
+                self.frames_done += 1
+                self.elapsed = time.perf_counter() - started
+            encoder.stdin.close()
+        except BrokenPipeError:
+            encoder_finished = not self._stop.is_set()
+            self._stop.set()
+        finally:
+            if self._stop.is_set():
+                decoder.kill()
+                if not encoder_finished:
+                    encoder.kill()
+            with contextlib.suppress(BrokenPipeError):
+                encoder.stdin.close()
+            for thread in threads:
+                thread.join()
+            decoder_stderr = decoder.stderr.read().decode(errors="replace").strip()
+            child_cpu = reap(decoder)
+            encoder_stderr = encoder.stderr.read().decode(errors="replace").strip()
+            child_cpu += reap(encoder)
+            self.elapsed = time.perf_counter() - started
+            self._add_cpu(thread_cpu_seconds() - cpu_started + child_cpu)
+        if self.cancelled:
+            self.destination.unlink(missing_ok=True)
+            raise ExportCancelled()
+        if self._errors:
+            self.destination.unlink(missing_ok=True)
+            raise ExportError(str(self._errors[0])) from self._errors[0]
+        # The decoder was killed when the encoder finished early.
+        if encoder.returncode != 0 or (
+            decoder.returncode != 0 and not encoder_finished
+        ):
+            self.destination.unlink(missing_ok=True)
+            raise ExportError(encoder_stderr or decoder_stderr or "ffmpeg failed")
+        stages = ", ".join(
+            f"{stage} {fps:.0f}" for stage, fps in self.stage_fps.items()
+        )
+        logging.info(
+            f"Exported {self.destination.name}: {self.frames_done} frames "
+            f"in {self.elapsed:.1f} s ({self.frames_per_second:.1f} fps; "
+            f"stage fps {stages})"
+        )
+        return self.destination
@@ -0,0 +1,159 @@
+import collections
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import TypedDict
+from app.processing.export import ExportSettings
+
+EXPORT_CACHE_DIRNAME = ".export_cache"
+EXPORT_CACHE_VERSION = 1
+EXPORT_CACHE_BYTES = (
+    int(os.environ.get("VISUALIZER_EXPORT_CACHE_MB", 4096)) * 1024 * 1024
+)
+
+
+class ExportCacheStats(TypedDict):
+    hits: int
+    misses: int
+    coalesced: int
+    entries: int
+    bytes: int
+
+
+def export_cache_key(content_hash: str, settings: ExportSettings) -> str:
+    """Key for the output of rendering ``content_hash`` with ``settings``."""
+    payload = json.dumps(
+        {
+            "version": EXPORT_CACHE_VERSION,
+            "source": content_hash,
+            "settings": settings,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def link_or_copy(source: Path, destination: Path):
+    """Atomically place ``source`` at ``destination``, sharing the inode if possible."""
+    temporary = destination.with_name(f".{destination.name}.tmp")
+    temporary.unlink(missing_ok=True)
+    try:
+        os.link(source, temporary)
+    except OSError:
+        shutil.copyfile(source, temporary)
+    os.replace(temporary, destination)
+
+
+class ExportCache:
+    """Finished exports by cache key, evicted least recently used first.
+
+    Entries are hard links to the files in ``exports_dir``, so a hit costs no
+    copy. The budget covers every file in the exports folder plus entries no
+    longer linked there, each inode counted once; evicting an entry also
+    unlinks its exports, so the space is really freed. Files in the exports
+    folder that are not cached (exports still being written) are counted
+    but never removed. Whoever writes an export must unlink the destination
+    first rather than truncate it, or the cached entry would be overwritten
+    too.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        exports_dir: Path,
+        max_bytes: int = EXPORT_CACHE_BYTES,
+    ):
+        self.directory = directory
+        self.exports_dir = exports_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        directory.mkdir(parents=True, exist_ok=True)
+
+    def _entry(self, key: str, settings: ExportSettings) -> Path:
+        return self.directory / f"{key}.{settings['format']}"
+
+    def fetch(self, key: str, settings: ExportSettings, destination: Path) -> bool:
+        """Place the cached output at ``destination``; False on a miss."""
+        entry = self._entry(key, settings)
+        with self._lock:
+            try:
+                os.utime(entry)
+                destination.parent.mkdir(parents=True, exist_ok=True)
+                link_or_copy(entry, destination)
+            except FileNotFoundError:
+                self.misses += 1
+                return False
+            self.hits += 1
+        return True
+
+    def store(self, key: str, settings: ExportSettings, output: Path):
+        with self._lock:
+            try:
+                link_or_copy(output, self._entry(key, settings))
+            except OSError as e:
+                logging.warning(f"Could not cache export {output.name}: {e}")
+                return
+            self._evict(keep=self._entry(key, settings))
+
+    def _entries(self) -> list[tuple[Path, os.stat_result]]:
+        entries = []
+        for path in self.directory.iterdir():
+            if path.name.startswith("."):
+                continue
+            try:
+                entries.append((path, path.stat()))
+            except FileNotFoundError:
+                continue
+        return entries
+
+    def _exports(self) -> dict[tuple[int, int], list[Path]]:
+        """Files in the exports folder, grouped by inode."""
+        exports: dict[tuple[int, int], list[Path]] = collections.defaultdict(list)
+        for path in self.exports_dir.iterdir() if self.exports_dir.is_dir() else ():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if path.is_file():
+                exports[(stat.st_dev, stat.st_ino, stat.st_size)].append(path)
+        return exports
+
+    def _usage(self) -> int:
+        """Bytes used by cache entries and exports, each inode counted once."""
+        inodes = {
+            (stat.st_dev, stat.st_ino, stat.st_size) for _, stat in self._entries()
+        }
+        inodes.update(self._exports())
+        return sum(size for _, _, size in inodes)
+
+    def _evict(self, keep: Path):
+        entries = sorted(self._entries(), key=lambda entry: entry[1].st_mtime)
+        exports = self._exports()
+        total = self._usage()
+        for path, stat in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            path.unlink(missing_ok=True)
+            for export in exports.get((stat.st_dev, stat.st_ino, stat.st_size), ()):
+                export.unlink(missing_ok=True)
+            total -= stat.st_size
+            logging.info(f"Evicted cached export {path.name}")
+
+    def stats(self) -> ExportCacheStats:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "entries": len(self._entries()),
+                "bytes": self._usage(),
+            }
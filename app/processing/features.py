@@ -0,0 +1,249 @@
+from pathlib import Path
+from typing import Callable, TypedDict
+import numpy as np
+from app.processing.npy import NpyRowWriter
+from app.processing.spectrogram import FFT_SIZE, NUM_BANDS, SpectrogramEngine
+
+FEATURES_FILENAME = "features.npy"
+WAVE_POINTS = 64
+DEFAULT_FPS = 30.0
+ATTACK_SECONDS = 0.01
+DECAY_SECONDS = 0.15
+
+
+class FeatureTrackInfo(TypedDict):
+    fps: float
+    sample_rate: int
+    frames: int
+    num_bins: int
+    wave_points: int
+    attack: float
+    decay: float
+    band_peak: float
+    wave_peak: float
+    level_peak: float
+
+
+def _envelope_coefficient(seconds: float, fps: float) -> float:
+    if seconds <= 0:
+        return 1.0
+    return float(1.0 - np.exp(-1.0 / (seconds * fps)))
+
+
+class FeatureTrackBuilder:
+    """Per-video-frame bands, waveform slice and level from a streamed track.
+
+    Row ``k`` describes video frame ``k`` (time ``k / fps``) and holds
+    ``num_bins`` band magnitudes, ``wave_points`` signed peak samples of the
+    audio played during that frame and one RMS level. Bands and level are
+    passed through an attack/decay envelope so bars rise quickly and fall
+    smoothly; equal attack and decay gives plain exponential smoothing.
+    Rows are streamed to ``writer`` as soon as they are complete.
+
+    The raw band magnitudes of every frame are also handed to ``bands_sink``
+    and their mean is kept as ``spectrum``, so a spectrogram at the video
+    frame rate costs no second STFT.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        fps: float,
+        writer: NpyRowWriter,
+        num_bins: int = NUM_BANDS,
+        wave_points: int = WAVE_POINTS,
+        attack: float = ATTACK_SECONDS,
+        decay: float = DECAY_SECONDS,
+        fft_size: int = FFT_SIZE,
+        bands_sink: Callable[[np.ndarray], None] | None = None,
+    ):
+        if writer.columns != num_bins + wave_points + 1:
+            raise ValueError("Writer width does not match the feature layout.")
+        self.sample_rate = sample_rate
+        self.fps = fps
+        self.num_bins = num_bins
+        self.wave_points = wave_points
+        self.attack = attack
+        self.decay = decay
+        self.hop = sample_rate / fps
+        self.frames = 0
+        self.spectrum = np.zeros(num_bins, dtype=np.float32)
+        self._writer = writer
+        self._bands_sink = bands_sink
+        self._spectrogram = SpectrogramEngine(
+            sample_rate,
+            self._pending_bands_append,
+            fft_size=fft_size,
+            hop=self.hop,
+            num_bins=num_bins,
+        )
+        self._attack = _envelope_coefficient(attack, fps)
+        self._decay = _envelope_coefficient(decay, fps)
+        self._state = np.zeros(num_bins + 1, dtype=np.float32)
+        self._pending_bands: list[np.ndarray] = []
+        self._pending_slices: list[np.ndarray] = []
+        self._slice_frames = 0
+        self._buffer = np.empty(0, dtype=np.float32)
+        self._buffer_start = 0
+        self._peaks = np.zeros(3, dtype=np.float64)
+
+    @property
+    def buffered_bytes(self) -> int:
+        """Memory held by the STFT, the buffered samples and unwritten rows."""
+        pending = self._pending_bands + self._pending_slices
+        return (
+            self._spectrogram.buffered_bytes
+            + self._buffer.nbytes
+            + sum(array.nbytes for array in pending)
+        )
+
+    def _pending_bands_append(self, bands: np.ndarray):
+        self._pending_bands.append(bands)
+        if self._bands_sink is not None:
+            self._bands_sink(bands)
+
+    def _frame_bound(self, frame: int | np.ndarray):
+        return np.rint(np.asarray(frame) * self.hop).astype(np.int64)
+
+    def _slice_frames_until(self, end_sample: int, final: bool):
+        """Waveform slice and level for every frame fully inside the buffer."""
+        if final:
+            # Every frame that starts before the end, however short.
+            total = int(np.ceil(end_sample / self.hop))
+            while (
+                total > self._slice_frames
+                and self._frame_bound(total - 1) >= end_sample
+            ):
+                total -= 1
+        else:
+            total = int(np.floor(end_sample / self.hop))
+            while total > self._slice_frames and self._frame_bound(total) > end_sample:
+                total -= 1
+        if total <= self._slice_frames:
+            return
+        frames = np.arange(self._slice_frames, total)
+        starts = self._frame_bound(frames)
+        ends = np.minimum(self._frame_bound(frames + 1), end_sample)
+        bounds = starts[:, None] + (
+            (ends - starts)[:, None]
+            * np.arange(self.wave_points + 1)[None, :]
+            // self.wave_points
+        )
+        local = bounds.ravel() - self._buffer_start
+        # reduceat needs every index to be inside the array, including the
+        # end bound of the last frame.
+        samples = np.concatenate((self._buffer, np.zeros(1, dtype=np.float32)))
+        highs = np.maximum.reduceat(samples, local).reshape(len(frames), -1)[:, :-1]
+        lows = np.minimum.reduceat(samples, local).reshape(len(frames), -1)[:, :-1]
+        wave = np.where(np.abs(highs) >= np.abs(lows), highs, lows)
+        energy = np.concatenate(
+            ([0.0], np.cumsum(np.square(self._buffer, dtype=np.float64)))
+        )
+        lengths = np.maximum(ends - starts, 1)
+        level = np.sqrt(
+            (energy[ends - self._buffer_start] - energy[starts - self._buffer_start])
+            / lengths
+        )[:, None]
+        self._pending_slices.append(
+            np.hstack((wave, level)).astype(np.float32, copy=False)
+        )
+        self._slice_frames = total
+        keep_from = self._frame_bound(total) - self._buffer_start
+        if keep_from > 0:
+            self._buffer = self._buffer[keep_from:]
+            self._buffer_start += int(keep_from)
+
+    def _apply_envelope(self, values: np.ndarray) -> np.ndarray:
+        smoothed = np.empty_like(values)
+        state = self._state
+        for i, row in enumerate(values):
+            coefficient = np.where(row > state, self._attack, self._decay)
+            state = state + coefficient * (row - state)
+            smoothed[i] = state
+        self._state = state
+        return smoothed
+
+    def _emit(self):
+        if not self._pending_bands or not self._pending_slices:
+            return
+        bands = np.concatenate(self._pending_bands)
+        slices = np.concatenate(self._pending_slices)
+        count = min(len(bands), len(slices))
+        if not count:
+            return
+        wave = slices[:count, :-1]
+        envelope = self._apply_envelope(np.hstack((bands[:count], slices[:count, -1:])))
+        rows = np.hstack((envelope[:, :-1], wave, envelope[:, -1:]))
+        self._peaks = np.maximum(
+            self._peaks,
+            [
+                envelope[:, :-1].max(initial=0),
+                np.abs(wave).max(initial=0),
+                envelope[:, -1].max(initial=0),
+            ],
+        )
+        self._writer.append(rows)
+        self.frames += count
+        self._pending_bands = [bands[count:]]
+        self._pending_slices = [slices[count:]]
+
+    def push(self, block: np.ndarray):
+        self._spectrogram.push(block)
+        self._buffer = np.concatenate((self._buffer, block))
+        self._slice_frames_until(self._buffer_start + len(self._buffer), False)
+        self._emit()
+
+    def finish(self) -> FeatureTrackInfo:
+        self.spectrum = self._spectrogram.finish()
+        self._slice_frames_until(self._buffer_start + len(self._buffer), True)
+        self._emit()
+        return {
+            "fps": self.fps,
+            "sample_rate": self.sample_rate,
+            "frames": self.frames,
+            "num_bins": self.num_bins,
+            "wave_points": self.wave_points,
+            "attack": self.attack,
+            "decay": self.decay,
+            "band_peak": float(self._peaks[0]),
+            "wave_peak": float(self._peaks[1]),
+            "level_peak": float(self._peaks[2]),
+        }
+
+
+class FeatureTrack:
+    """Memory-mapped feature rows with accessors normalised to ``[0, 1]``."""
+
+    def __init__(self, path: Path, info: FeatureTrackInfo):
+        self.path = path
+        self.info = info
+        self.rows = np.load(path, mmap_mode="r")
+        self.num_bins = info["num_bins"]
+        self.wave_points = info["wave_points"]
+
+    @property
+    def fps(self) -> float:
+        return self.info["fps"]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @staticmethod
+    def _scale(values: np.ndarray, peak: float) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float32)
+        return values / peak if peak > 0 else np.zeros_like(values)
+
+    def bands(self, start: int, stop: int) -> np.ndarray:
+        return self._scale(
+            self.rows[start:stop, : self.num_bins], self.info["band_peak"]
+        )
+
+    def wave(self, start: int, stop: int) -> np.ndarray:
+        """Signed waveform slices in ``[-1, 1]``."""
+        wave_end = self.num_bins + self.wave_points
+        return self._scale(
+            self.rows[start:stop, self.num_bins : wave_end], self.info["wave_peak"]
+        )
+
+    def level(self, start: int, stop: int) -> np.ndarray:
+        return self._scale(self.rows[start:stop, -1], self.info["level_peak"])
@@ -0,0 +1,247 @@
+import logging
+import subprocess
+import threading
+import time
+from pathlib import Path
+from app.processing.export import (
+    FFMPEG,
+    ExportCancelled,
+    ExportError,
+    ExportSettings,
+    audio_codec_args,
+    frame_limit_args,
+    input_range_args,
+    muxer_args,
+    output_size,
+    video_codec_args,
+)
+from app.processing.metrics import reap
+from app.processing.probe import ProbeResult
+from app.processing.progress import FfmpegProgress
+from app.processing.render import (
+    OVERLAY_ALPHA,
+    OVERLAY_FULL_ALPHA,
+    strip_bounds,
+)
+
+NATIVE_STYLES = ("waveform", "spectrum", "both")
+
+
+def _hex(color: str) -> str:
+    value = color.lstrip("#")
+    if len(value) == 3:
+        value = "".join(c * 2 for c in value)
+    return f"0x{value}"
+
+
+def _waves(source: str, width: int, height: int, fps: float, color: str) -> str:
+    return (
+        f"{source}showwaves=s={width}x{height}:mode=cline:rate={fps}"
+        f":colors={_hex(color)}"
+    )
+
+
+def _freqs(source: str, width: int, height: int, fps: float, color: str) -> str:
+    return (
+        f"{source}showfreqs=s={width}x{height}:mode=bar:fscale=log:ascale=sqrt"
+        f":win_size=2048:colors={_hex(color)},fps={fps}"
+    )
+
+
+def build_filtergraph(
+    settings: ExportSettings, size: tuple[int, int], fps: float
+) -> str:
+    """ffmpeg filter_complex that draws the visualization with native filters.
+
+    The graph reads ``[0:v]`` and ``[0:a]`` and produces ``[out]``.
+    """
+    width, height = size
+    top, bottom = strip_bounds(height, settings["position"])
+    strip_height = bottom - top
+    alpha = OVERLAY_FULL_ALPHA if settings["position"] == "overlay" else OVERLAY_ALPHA
+    color = settings["color"]
+    chains = [f"[0:v]scale={width}:{height},fps={fps}[base]"]
+    style = settings["visualization_type"]
+    if style == "waveform":
+        chains.append(_waves("[0:a]", width, strip_height, fps, color) + "[viz0]")
+    elif style == "spectrum":
+        chains.append(_freqs("[0:a]", width, strip_height, fps, color) + "[viz0]")
+    else:
+        wave_height = strip_height // 2
+        chains.append("[0:a]asplit=2[wa][fa]")
+        chains.append(_waves("[wa]", width, wave_height, fps, color) + "[w]")
+        chains.append(
+            _freqs("[fa]", width, strip_height - wave_height, fps, color) + "[f]"
+        )
+        chains.append("[w]format=rgba[w2];[f]format=rgba[f2];[w2][f2]vstack[viz0]")
+    chains.append(f"[viz0]format=rgba,colorchannelmixer=aa={alpha}[viz]")
+    chains.append(f"[base][viz]overlay=0:{top}:shortest=1,format=yuv420p[out]")
+    return ";".join(chains)
+
+
+def native_command(
+    source: Path,
+    destination: Path,
+    size: tuple[int, int],
+    fps: float,
+    settings: ExportSettings,
+    start: float = 0.0,
+    duration: float | None = None,
+    include_audio: bool = True,
+    threads: int | None = None,
+) -> list[str]:
+    command = [
+        FFMPEG,
+        "-nostdin",
+        "-y",
+        "-v",
+        "error",
+        "-progress",
+        "pipe:1",
+        "-nostats",
+        *input_range_args(start, duration),
+        "-i",
+        str(source),
+        "-filter_complex",
+        build_filtergraph(settings, size, fps),
+        "-map",
+        "[out]",
+        *frame_limit_args(fps, duration),
+        *video_codec_args(settings),
+    ]
+    if threads:
+        command += ["-threads", str(threads)]
+    if include_audio:
+        command += ["-map", "0:a:0", *audio_codec_args(settings)]
+    return [*command, *muxer_args(settings), str(destination)]
+
+
+class NativeExportJob:
+    """Export that draws the visualization inside a single ffmpeg process.
+
+    Has the same interface as ExportJob, but Python never touches a pixel:
+    progress comes from ffmpeg's ``-progress`` output.
+    """
+
+    def __init__(
+        self,
+        source: Path,
+        destination: Path,
+        probe: ProbeResult,
+        settings: ExportSettings,
+        start_frame: int = 0,
+        frame_count: int | None = None,
+        include_audio: bool = True,
+        threads: int | None = None,
+    ):
+        if settings["visualization_type"] not in NATIVE_STYLES:
+            raise ExportError(
+                f"No native filter graph for {settings['visualization_type']!r}."
+            )
+        self.source = source
+        self.destination = destination
+        self.settings = settings
+        self.fps = probe["fps"] or 30.0
+        self.size = output_size(probe, settings["resolution"])
+        self.start_frame = start_frame
+        self.frame_count = frame_count
+        self.include_audio = include_audio
+        self.threads = threads
+        self.start = start_frame / self.fps
+        if frame_count:
+            self.duration = frame_count / self.fps
+        else:
+            self.duration = max(0.0, (probe["duration"] or 0.0) - self.start)
+        self.total_frames = max(1, int(round(self.duration * self.fps)))
+        self.elapsed = 0.0
+        self.cpu_seconds = 0.0
+        self.cancelled = False
+        self._progress = FfmpegProgress(self.duration)
+        self._process: subprocess.Popen | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def frames_done(self) -> int:
+        return self._progress.frame
+
+    @property
+    def progress(self) -> float:
+        return self._progress.fraction
+
+    @property
+    def frames_per_second(self) -> float:
+        return self._progress.fps
+
+    @property
+    def stage_fps(self) -> dict[str, float]:
+        """Decoding, drawing and encoding share one process, so one stage."""
+        return {"ffmpeg": self._progress.fps} if self._progress.fps else {}
+
+    @property
+    def ffmpeg_speed(self) -> float | None:
+        """The realtime factor ffmpeg last reported."""
+        return self._progress.speed or None
+
+    def pids(self) -> list[int]:
+        process = self._process
+        return [process.pid] if process and process.returncode is None else []
+
+    def buffered_bytes(self) -> int:
+        """Frames never pass through this process."""
+        return 0
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            if self._process is not None and self._process.poll() is None:
+                self._process.kill()
+
+    def run(self) -> Path:
+        started = time.perf_counter()
+        self.destination.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            if self.cancelled:
+                raise ExportCancelled()
+            try:
+                self._process = subprocess.Popen(
+                    native_command(
+                        self.source,
+                        self.destination,
+                        self.size,
+                        self.fps,
+                        self.settings,
+                        self.start,
+                        self.duration if self.frame_count else None,
+                        self.include_audio,
+                        self.threads,
+                    ),
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                )
+            except FileNotFoundError:
+                raise ExportError(
+                    "FFmpeg not found. Please ensure it is installed and in the system's PATH."
+                ) from None
+        process = self._process
+        stderr_chunks: list[bytes] = []
+        stderr_thread = threading.Thread(
+            target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True
+        )
+        stderr_thread.start()
+        self._progress.follow(process.stdout)
+        self.cpu_seconds = reap(process)
+        stderr_thread.join()
+        self.elapsed = time.perf_counter() - started
+        if self.cancelled:
+            self.destination.unlink(missing_ok=True)
+            raise ExportCancelled()
+        if process.returncode != 0:
+            self.destination.unlink(missing_ok=True)
+            stderr = b"".join(stderr_chunks).decode(errors="replace").strip()
+            raise ExportError(stderr or "ffmpeg failed")
+        logging.info(
+            f"Exported {self.destination.name} with native filters: "
+            f"{self.frames_done} frames in {self.elapsed:.1f} s "
+            f"({self.duration / self.elapsed if self.elapsed else 0:.2f}x realtime)"
+        )
+        return self.destination
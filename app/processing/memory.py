@@ -0,0 +1,152 @@
+import logging
+import os
+import resource
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterable, TypedDict
+
+MEMORY_BUDGET = int(os.environ.get("VISUALIZER_MEMORY_BUDGET_MB", 300)) * 1024 * 1024
+SAMPLE_INTERVAL = 0.05
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class MemoryReport(TypedDict):
+    kind: str
+    name: str
+    baseline_rss: int
+    peak_rss: int
+    peak_job_rss: int
+    budget: int
+    seconds: float
+
+
+_reports: list[MemoryReport] = []
+_reports_lock = threading.Lock()
+MAX_REPORTS = 100
+
+
+def _rss(pid: int) -> int:
+    try:
+        pages = Path(f"/proc/{pid}/statm").read_text().split()[1]
+    except (OSError, IndexError):
+        return 0
+    return int(pages) * PAGE_SIZE
+
+
+def _children(pid: int) -> list[int]:
+    children = []
+    try:
+        tasks = list(Path(f"/proc/{pid}/task").iterdir())
+    except OSError:
+        return children
+    for task in tasks:
+        try:
+            children += [
+                int(child) for child in (task / "children").read_text().split()
+            ]
+        except OSError:
+            continue
+    return children
+
+
+def tree_rss(pid: int | None = None) -> int:
+    """Resident memory of a process and all its descendants, in bytes.
+
+    Reads /proc; elsewhere falls back to this process's lifetime peak, or 0
+    for another process.
+    """
+    if not Path("/proc/self/statm").exists():
+        if pid is not None:
+            return 0
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    pid = os.getpid() if pid is None else pid
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        total += _rss(current)
+        pending += _children(current)
+    return total
+
+
+class MemoryTracker:
+    """Samples the process tree's RSS while a job runs and records the peak.
+
+    ``peak_job_rss`` is the peak minus the RSS when tracking started, i.e.
+    what the job itself added on top of the idle server. Subprocesses such
+    as ffmpeg and export workers are included.
+
+    With ``pids``, only the processes it returns and their descendants are
+    sampled, so concurrent jobs in the same server are not counted against
+    each other. Memory the job allocates inside the calling process is then
+    counted through ``allocated``, which returns the bytes its buffers hold.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        name: str,
+        budget: int = MEMORY_BUDGET,
+        pids: Callable[[], Iterable[int]] | None = None,
+        allocated: Callable[[], int] | None = None,
+    ):
+        self.kind = kind
+        self.name = name
+        self.budget = budget
+        self.pids = pids
+        self.allocated = allocated
+        self.baseline_rss = 0
+        self.peak_rss = 0
+        self._started = 0.0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def peak_job_rss(self) -> int:
+        return max(0, self.peak_rss - self.baseline_rss)
+
+    def _measure(self) -> int:
+        rss = tree_rss() if self.pids is None else sum(map(tree_rss, self.pids()))
+        return rss + (self.allocated() if self.allocated else 0)
+
+    def _sample(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            self.peak_rss = max(self.peak_rss, self._measure())
+
+    def __enter__(self) -> "MemoryTracker":
+        self._started = time.perf_counter()
+        self.baseline_rss = self.peak_rss = self._measure()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak_rss = max(self.peak_rss, self._measure())
+        report: MemoryReport = {
+            "kind": self.kind,
+            "name": self.name,
+            "baseline_rss": self.baseline_rss,
+            "peak_rss": self.peak_rss,
+            "peak_job_rss": self.peak_job_rss,
+            "budget": self.budget,
+            "seconds": time.perf_counter() - self._started,
+        }
+        with _reports_lock:
+            _reports.append(report)
+            del _reports[:-MAX_REPORTS]
+        level = logging.WARNING if self.peak_job_rss > self.budget else logging.INFO
+        logging.log(
+            level,
+            f"{self.kind} {self.name}: peak RSS {self.peak_rss / 2**20:.0f} MB, "
+            f"{self.peak_job_rss / 2**20:.0f} MB above baseline "
+            f"(budget {self.budget / 2**20:.0f} MB)",
+        )
+
+
+def memory_reports() -> list[MemoryReport]:
+    """The most recent job memory reports, oldest first."""
+    with _reports_lock:
+        return list(_reports)
@@ -0,0 +1,306 @@
+import asyncio
+import bisect
+import json
+import logging
+import os
+import subprocess
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Literal, TypedDict, TypeVar
+
+Outcome = Literal["ok", "error", "cancelled"]
+
+SECONDS_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+SPEED_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128, 256)
+CPU_SAMPLE_INTERVAL = 0.05
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+T = TypeVar("T")
+
+
+class StageSpan(TypedDict):
+    stage: str
+    job: str
+    outcome: Outcome
+    queue_wait: float
+    wall: float
+    cpu: float
+    bytes: int
+    media_seconds: float
+    speed: float
+
+
+class Histogram:
+    """Cumulative Prometheus-style histogram, one series per stage."""
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts: dict[str, list[int]] = {}
+        self.sums: Counter[str] = Counter()
+
+    def observe(self, stage: str, value: float):
+        counts = self.counts.setdefault(stage, [0] * (len(self.buckets) + 1))
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sums[stage] += value
+
+    def lines(self, name: str) -> list[str]:
+        lines = []
+        for stage, counts in sorted(self.counts.items()):
+            total = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                total += count
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {total}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {self.sums[stage]:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {total}')
+        return lines
+
+
+_lock = threading.Lock()
+_histograms = {
+    "wall_seconds": Histogram(SECONDS_BUCKETS),
+    "cpu_seconds": Histogram(SECONDS_BUCKETS),
+    "queue_wait_seconds": Histogram(SECONDS_BUCKETS),
+    "speed_factor": Histogram(SPEED_BUCKETS),
+}
+_bytes: Counter[str] = Counter()
+_spans: Counter[tuple[str, str]] = Counter()
+_active: Counter[str] = Counter()
+
+HISTOGRAM_HELP = {
+    "wall_seconds": "Wall-clock time of completed stage spans.",
+    "cpu_seconds": "CPU time of completed stage spans, including ffmpeg.",
+    "queue_wait_seconds": "Time jobs waited in the queue before the stage.",
+    "speed_factor": "Seconds of media processed per wall-clock second.",
+}
+
+
+def thread_cpu_seconds() -> float:
+    return time.thread_time()
+
+
+def reap(process: subprocess.Popen) -> float:
+    """Wait for ``process`` like ``Popen.wait`` and return the CPU time it used.
+
+    The child is reaped with ``os.wait4`` to read its own rusage, so the time
+    belongs to this job alone. A child something else already reaped (such
+    as ``poll`` after a kill) reports 0.
+    """
+    if process.returncode is None and hasattr(os, "wait4"):
+        try:
+            _, status, usage = os.wait4(process.pid, 0)
+        except ChildProcessError:
+            pass
+        else:
+            process.returncode = os.waitstatus_to_exitcode(status)
+            return usage.ru_utime + usage.ru_stime
+    process.wait()
+    return 0.0
+
+
+def _proc_cpu(pid: int) -> tuple[str, float] | None:
+    """Start time and CPU seconds of a live process, read from /proc."""
+    try:
+        fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+        return fields[19], (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def record_span(
+    stage: str,
+    job: str,
+    wall: float,
+    cpu: float,
+    outcome: Outcome = "ok",
+    queue_wait: float = 0.0,
+    num_bytes: int = 0,
+    media_seconds: float = 0.0,
+    speed: float | None = None,
+) -> StageSpan:
+    """Log a finished span and add it to the aggregated metrics.
+
+    ``speed`` defaults to ``media_seconds / wall``; ffmpeg stages pass the
+    speed ffmpeg itself reported.
+    """
+    if speed is None:
+        speed = media_seconds / wall if wall > 0 else 0.0
+    span: StageSpan = {
+        "stage": stage,
+        "job": job,
+        "outcome": outcome,
+        "queue_wait": queue_wait,
+        "wall": wall,
+        "cpu": cpu,
+        "bytes": num_bytes,
+        "media_seconds": media_seconds,
+        "speed": speed,
+    }
+    logging.info(f"span {json.dumps(span)}")
+    with _lock:
+        _spans[stage, outcome] += 1
+        _bytes[stage] += num_bytes
+        if outcome == "ok":
+            _histograms["wall_seconds"].observe(stage, wall)
+            _histograms["cpu_seconds"].observe(stage, cpu)
+            _histograms["queue_wait_seconds"].observe(stage, queue_wait)
+            if media_seconds > 0 or speed:
+                _histograms["speed_factor"].observe(stage, speed)
+    return span
+
+
+class Span:
+    """Context manager timing one stage of a job as a span.
+
+    Set ``num_bytes``, ``media_seconds`` and, for ffmpeg stages, ``speed``
+    inside the block when they are only known once the work is done.
+    Exceptions in ``cancelled`` end the span as cancelled rather than failed.
+
+    CPU time is counted per job, so concurrent jobs do not inflate each
+    other's: the job adds the thread CPU time of its in-process work (see
+    ``timed``) and the rusage of the subprocesses it reaps (see ``reap``)
+    with ``add_cpu``, and subprocesses the event loop reaps are sampled from
+    /proc after ``watch``.
+    """
+
+    def __init__(
+        self,
+        stage: str,
+        job: str,
+        queue_wait: float = 0.0,
+        num_bytes: int = 0,
+        media_seconds: float = 0.0,
+        cancelled: tuple[type[BaseException], ...] = (asyncio.CancelledError,),
+    ):
+        self.stage = stage
+        self.job = job
+        self.queue_wait = queue_wait
+        self.num_bytes = num_bytes
+        self.media_seconds = media_seconds
+        self.cancelled = cancelled
+        self.speed: float | None = None
+        self._started = 0.0
+        self._cpu = 0.0
+        self._watched: dict[int, tuple[str, float]] = {}
+        self._cpu_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler: threading.Thread | None = None
+
+    def add_cpu(self, seconds: float):
+        with self._cpu_lock:
+            self._cpu += seconds
+
+    def timed(self, function: Callable[..., T], *args) -> T:
+        """Call ``function``, adding the calling thread's CPU time to the span.
+
+        Meant to be passed to ``asyncio.to_thread``.
+        """
+        started = thread_cpu_seconds()
+        try:
+            return function(*args)
+        finally:
+            self.add_cpu(thread_cpu_seconds() - started)
+
+    def watch(self, pid: int):
+        """Count a subprocess that is reaped elsewhere, such as by the event
+        loop, by sampling its CPU time until it exits.
+        """
+        if (sample := _proc_cpu(pid)) is None:
+            return
+        with self._cpu_lock:
+            self._watched[pid] = sample
+        if self._sampler is None:
+            self._sampler = threading.Thread(target=self._sample, daemon=True)
+            self._sampler.start()
+
+    @property
+    def watched_cpu(self) -> float:
+        """CPU seconds of the watched subprocesses, as last sampled."""
+        with self._cpu_lock:
+            return sum(cpu for _, cpu in self._watched.values())
+
+    def _sample_watched(self):
+        with self._cpu_lock:
+            for pid, (started, cpu) in list(self._watched.items()):
+                sample = _proc_cpu(pid)
+                # A different start time means the pid was reused.
+                if sample is not None and sample[0] == started:
+                    self._watched[pid] = (started, max(cpu, sample[1]))
+
+    def _sample(self):
+        while not self._stop.wait(CPU_SAMPLE_INTERVAL):
+            self._sample_watched()
+
+    def __enter__(self) -> "Span":
+        with _lock:
+            _active[self.stage] += 1
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        wall = time.perf_counter() - self._started
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self._sample_watched()
+        with _lock:
+            _active[self.stage] -= 1
+        if exc_type is None:
+            outcome = "ok"
+        elif issubclass(exc_type, self.cancelled):
+            outcome = "cancelled"
+        else:
+            outcome = "error"
+        record_span(
+            self.stage,
+            self.job,
+            wall,
+            self._cpu + self.watched_cpu,
+            outcome,
+            self.queue_wait,
+            self.num_bytes,
+            self.media_seconds,
+            self.speed,
+        )
+
+
+def gauge_lines(name: str, description: str, samples: dict[str, float]) -> list[str]:
+    """A gauge in the Prometheus text format; keys are label strings or ''."""
+    lines = [f"# HELP {name} {description}", f"# TYPE {name} gauge"]
+    for labels, value in samples.items():
+        lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+    return lines
+
+
+def render_metrics() -> list[str]:
+    """Stage histograms, counters and active-job gauges as exposition lines."""
+    lines = []
+    with _lock:
+        for key, histogram in _histograms.items():
+            name = f"visualizer_stage_{key}"
+            lines += [
+                f"# HELP {name} {HISTOGRAM_HELP[key]}",
+                f"# TYPE {name} histogram",
+            ]
+            lines += histogram.lines(name)
+        lines += [
+            "# HELP visualizer_stage_spans_total Finished stage spans by outcome.",
+            "# TYPE visualizer_stage_spans_total counter",
+        ]
+        for (stage, outcome), count in sorted(_spans.items()):
+            lines.append(
+                f'visualizer_stage_spans_total{{stage="{stage}",outcome="{outcome}"}} '
+                f"{count}"
+            )
+        lines += [
+            "# HELP visualizer_stage_bytes_total Input bytes processed by each stage.",
+            "# TYPE visualizer_stage_bytes_total counter",
+        ]
+        for stage, total in sorted(_bytes.items()):
+            lines.append(f'visualizer_stage_bytes_total{{stage="{stage}"}} {total}')
+        active = {f'stage="{stage}"': count for stage, count in sorted(_active.items())}
+    lines += gauge_lines(
+        "visualizer_active_jobs", "Stage spans currently running.", active
+    )
+    return lines
@@ -0,0 +1,51 @@
+import struct
+from pathlib import Path
+import numpy as np
+
+_MAGIC = b"\x93NUMPY\x01\x00"
+_HEADER_SIZE = 128
+
+
+class NpyRowWriter:
+    """Append rows to a ``.npy`` file whose length is only known at the end.
+
+    A fixed-size header is reserved up front and rewritten with the final
+    shape on close, so rows go straight to disk and the result can be
+    opened with ``np.load(path, mmap_mode="r")``.
+    """
+
+    def __init__(self, path: Path, columns: int, dtype: str = "<f4"):
+        self.path = path
+        self.columns = columns
+        self.dtype = np.dtype(dtype)
+        self.rows = 0
+        self._tmp_path = path.with_name(path.name + ".tmp")
+        self._file = self._tmp_path.open("wb")
+        self._file.write(self._header())
+
+    def _header(self) -> bytes:
+        header = (
+            f"{{'descr': '{self.dtype.str}', 'fortran_order': False, "
+            f"'shape': ({self.rows}, {self.columns}), }}"
+        )
+        padding = _HEADER_SIZE - len(_MAGIC) - 2 - len(header) - 1
+        if padding < 0:
+            raise ValueError("Array shape does not fit in the reserved header.")
+        header += " " * padding + "\n"
+        return _MAGIC + struct.pack("<H", len(header)) + header.encode("latin1")
+
+    def append(self, rows: np.ndarray):
+        rows = np.ascontiguousarray(rows, dtype=self.dtype).reshape(-1, self.columns)
+        self._file.write(rows.tobytes())
+        self.rows += len(rows)
+
+    def close(self) -> Path:
+        self._file.seek(0)
+        self._file.write(self._header())
+        self._file.close()
+        self._tmp_path.replace(self.path)
+        return self.path
+
+    def abort(self):
+        self._file.close()
+        self._tmp_path.unlink(missing_ok=True)
@@ -0,0 +1,212 @@
+import struct
+from pathlib import Path
+import numpy as np
+
+PEAKS_FILENAME = "peaks.bin"
+LEVELS = (256, 4096, 65536)
+_MAGIC = b"VZPK"
+_VERSION = 1
+_HEADER = struct.Struct("<4sIIIQ")
+_LEVEL_HEADER = struct.Struct("<IQ")
+_ALIGNMENT = 64
+
+
+def _bucket_stats(frames: np.ndarray) -> np.ndarray:
+    """Min, max and mean square of each row of ``frames``."""
+    stats = np.empty((len(frames), 3), dtype=np.float32)
+    np.min(frames, axis=1, out=stats[:, 0])
+    np.max(frames, axis=1, out=stats[:, 1])
+    np.einsum("ij,ij->i", frames, frames, out=stats[:, 2])
+    stats[:, 2] /= frames.shape[1]
+    return stats
+
+
+def _merge_stats(rows: np.ndarray, factor: int) -> np.ndarray:
+    groups = rows[: len(rows) // factor * factor].reshape(-1, factor, 3)
+    merged = np.empty((len(groups), 3), dtype=np.float32)
+    np.min(groups[:, :, 0], axis=1, out=merged[:, 0])
+    np.max(groups[:, :, 1], axis=1, out=merged[:, 1])
+    np.mean(groups[:, :, 2], axis=1, out=merged[:, 2])
+    return merged
+
+
+class _Level:
+    def __init__(self, bucket_size: int, capacity: int):
+        self.bucket_size = bucket_size
+        self.rows = np.empty((max(capacity, 1), 3), dtype=np.float32)
+        self.count = 0
+
+    def append(self, rows: np.ndarray):
+        end = self.count + len(rows)
+        if end > len(self.rows):
+            grown = np.empty((max(end, len(self.rows) * 2), 3), dtype=np.float32)
+            grown[: self.count] = self.rows[: self.count]
+            self.rows = grown
+        self.rows[self.count : end] = rows
+        self.count = end
+
+
+class PeakPyramidBuilder:
+    """Streaming min/max/RMS summary of a mono track at several resolutions.
+
+    Level 0 is computed from the samples, each coarser level from the one
+    below it, so every sample is only touched once. ``expected_samples``
+    (usually derived from the probed duration) sizes the level buffers up
+    front.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        expected_samples: int = 0,
+        levels: tuple[int, ...] = LEVELS,
+    ):
+        for finer, coarser in zip(levels, levels[1:]):
+            if coarser % finer:
+                raise ValueError("Each peak level must be a multiple of the previous.")
+        self.sample_rate = sample_rate
+        self.num_samples = 0
+        self._levels = [
+            _Level(size, -(-expected_samples // size) + 1) for size in levels
+        ]
+        self._pending = np.empty(0, dtype=np.float32)
+        self._carry = [np.empty((0, 3), dtype=np.float32) for _ in levels]
+
+    @property
+    def buffered_bytes(self) -> int:
+        """Memory held by the level buffers and the samples not yet bucketed."""
+        arrays = [level.rows for level in self._levels] + self._carry
+        return self._pending.nbytes + sum(array.nbytes for array in arrays)
+
+    def _cascade(self, index: int, rows: np.ndarray, final: bool):
+        level = self._levels[index]
+        level.append(rows)
+        if index + 1 == len(self._levels):
+            return
+        factor = self._levels[index + 1].bucket_size // level.bucket_size
+        carry = np.concatenate((self._carry[index], rows))
+        merged = _merge_stats(carry, factor)
+        remainder = carry[len(merged) * factor :]
+        if final and len(remainder):
+            tail = np.array(
+                [
+                    [
+                        remainder[:, 0].min(),
+                        remainder[:, 1].max(),
+                        remainder[:, 2].mean(),
+                    ]
+                ],
+                dtype=np.float32,
+            )
+            merged = np.concatenate((merged, tail))
+            remainder = remainder[:0]
+        self._carry[index] = remainder
+        if len(merged) or final:
+            self._cascade(index + 1, merged, final)
+
+    def push(self, block: np.ndarray):
+        bucket = self._levels[0].bucket_size
+        self.num_samples += len(block)
+        data = np.concatenate((self._pending, block)) if len(self._pending) else block
+        usable = len(data) // bucket * bucket
+        if usable:
+            self._cascade(0, _bucket_stats(data[:usable].reshape(-1, bucket)), False)
+        self._pending = np.array(data[usable:], dtype=np.float32)
+
+    def finish(self, path: Path) -> "PeakPyramid":
+        rows = np.empty((0, 3), dtype=np.float32)
+        if len(self._pending):
+            rows = _bucket_stats(self._pending.reshape(1, -1))
+            self._pending = self._pending[:0]
+        self._cascade(0, rows, True)
+        write_pyramid(
+            path,
+            self.sample_rate,
+            self.num_samples,
+            [(level.bucket_size, level.rows[: level.count]) for level in self._levels],
+        )
+        return PeakPyramid(path)
+
+
+def write_pyramid(
+    path: Path,
+    sample_rate: int,
+    num_samples: int,
+    levels: list[tuple[int, np.ndarray]],
+):
+    header = _HEADER.pack(_MAGIC, _VERSION, sample_rate, len(levels), num_samples)
+    header += b"".join(_LEVEL_HEADER.pack(size, len(rows)) for size, rows in levels)
+    header += b"\0" * (-len(header) % _ALIGNMENT)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("wb") as f:
+        f.write(header)
+        for _, rows in levels:
+            stats = rows.copy()
+            np.sqrt(stats[:, 2], out=stats[:, 2])
+            f.write(stats.astype("<f2").tobytes())
+    tmp_path.replace(path)
+
+
+class PeakPyramid:
+    """Read-only, memory-mapped view of a peak file written by the builder."""
+
+    def __init__(self, path: Path):
+        with path.open("rb") as f:
+            magic, version, sample_rate, num_levels, num_samples = _HEADER.unpack(
+                f.read(_HEADER.size)
+            )
+            if magic != _MAGIC or version != _VERSION:
+                raise ValueError(f"{path} is not a peak file.")
+            level_info = [
+                _LEVEL_HEADER.unpack(f.read(_LEVEL_HEADER.size))
+                for _ in range(num_levels)
+            ]
+        self.sample_rate = sample_rate
+        self.num_samples = num_samples
+        self.levels: list[tuple[int, np.ndarray]] = []
+        offset = _HEADER.size + _LEVEL_HEADER.size * num_levels
+        offset += -offset % _ALIGNMENT
+        for bucket_size, count in level_info:
+            rows = (
+                np.memmap(path, dtype="<f2", mode="r", offset=offset, shape=(count, 3))
+                if count
+                else np.empty((0, 3), dtype="<f2")
+            )
+            self.levels.append((bucket_size, rows))
+            offset += count * 3 * 2
+
+    @property
+    def duration(self) -> float:
+        return self.num_samples / self.sample_rate if self.sample_rate else 0.0
+
+    def query(self, start: float, end: float, width: int) -> np.ndarray:
+        """Min/max/RMS columns for ``[start, end)`` seconds at ``width`` pixels.
+
+        Reads from the coarsest level that still has at least one bucket per
+        pixel, so the cost depends on ``width`` rather than on the duration.
+        Returns a ``(width, 3)`` float32 array.
+        """
+        result = np.zeros((max(width, 0), 3), dtype=np.float32)
+        start_sample = max(0, int(start * self.sample_rate))
+        end_sample = min(self.num_samples, int(np.ceil(end * self.sample_rate)))
+        if width <= 0 or end_sample <= start_sample:
+            return result
+        samples_per_pixel = (end_sample - start_sample) / width
+        bucket_size, rows = self.levels[0]
+        for size, level_rows in self.levels[1:]:
+            if size <= samples_per_pixel:
+                bucket_size, rows = size, level_rows
+        first = start_sample // bucket_size
+        last = min(len(rows), -(-end_sample // bucket_size))
+        if last <= first:
+            return result
+        window = np.asarray(rows[first:last], dtype=np.float32)
+        starts = np.minimum(
+            (np.arange(width) * len(window) // width), len(window) - 1
+        ).astype(np.intp)
+        ends = np.append(starts[1:], len(window))
+        counts = np.where(ends > starts, ends - starts, 1)
+        result[:, 0] = np.minimum.reduceat(window[:, 0], starts)
+        result[:, 1] = np.maximum.reduceat(window[:, 1], starts)
+        result[:, 2] = np.sqrt(np.add.reduceat(window[:, 2] ** 2, starts) / counts)
+        return result
@@ -0,0 +1,105 @@
+import asyncio
+import hashlib
+import json
+import re
+from pathlib import Path
+from app.processing.analysis import analyze_media, open_features
+from app.processing.artifacts import artifact_dir, content_hash_for
+from app.processing.export import EXPORTS_DIRNAME, ExportJob, ExportSettings
+from app.processing.filtergraph import NATIVE_STYLES, NativeExportJob
+from app.processing.memory import MEMORY_BUDGET
+from app.processing.probe import ProbeResult, probe_media
+from app.processing.segments import (
+    EXPORT_WORKERS,
+    MIN_SEGMENT_SECONDS,
+    SegmentedExportJob,
+)
+
+AnyExportJob = ExportJob | NativeExportJob | SegmentedExportJob
+
+
+def export_name(video_file_name: str, settings: ExportSettings) -> str:
+    """Output file name, distinct per settings so exports never overwrite each
+    other or share a segment work dir.
+    """
+    digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode())
+    return (
+        f"{Path(video_file_name).stem}_visualized_{digest.hexdigest()[:8]}"
+        f".{settings['format']}"
+    )
+
+
+def export_files_pattern(video_file_name: str) -> re.Pattern:
+    """Matches the exports of ``video_file_name`` and their segment work dirs."""
+    name = rf"{re.escape(Path(video_file_name).stem)}_visualized_[0-9a-f]{{8}}"
+    return re.compile(rf"{name}\.\w+|\.{name}\.segments")
+
+
+def uses_native_engine(probe: ProbeResult, settings: ExportSettings) -> bool:
+    """Whether the export can run as a native filter graph, skipping analysis."""
+    return (
+        settings["engine"] == "native"
+        and probe["has_audio"]
+        and settings["visualization_type"] in NATIVE_STYLES
+    )
+
+
+async def build_export_job(
+    video_path: Path,
+    destination: Path,
+    artifacts: Path,
+    probe: ProbeResult,
+    settings: ExportSettings,
+    workers: int = EXPORT_WORKERS,
+    threads: int | None = None,
+    memory_budget: int = MEMORY_BUDGET,
+    preset: str | None = None,
+) -> AnyExportJob:
+    """Pick and construct the export job for a probed source, analysing it if needed.
+
+    The native filter graph is used when the settings allow it; long sources
+    are split into segments rendered by ``workers`` processes. ``preset``
+    overrides the x264 preset of a single-process Python export.
+    """
+    native = uses_native_engine(probe, settings)
+    features = None
+    if not native:
+        analysis = await analyze_media(video_path, artifacts, probe)
+        features = open_features(artifacts, analysis)
+    if workers > 1 and (probe["duration"] or 0) >= 2 * MIN_SEGMENT_SECONDS:
+        return SegmentedExportJob(
+            video_path, destination, probe, settings, features, workers, memory_budget
+        )
+    if native:
+        return NativeExportJob(
+            video_path, destination, probe, settings, threads=threads
+        )
+    return ExportJob(
+        video_path,
+        destination,
+        probe,
+        features,
+        settings,
+        threads=threads,
+        memory_budget=memory_budget,
+        preset=preset,
+    )
+
+
+async def create_export_job(
+    upload_dir: Path,
+    video_file_name: str,
+    settings: ExportSettings,
+    workers: int = EXPORT_WORKERS,
+) -> AnyExportJob:
+    """The export job for an upload, written to the uploads' exports folder."""
+    video_path = upload_dir / video_file_name
+    content_hash = await asyncio.to_thread(
+        content_hash_for, upload_dir, video_file_name
+    )
+    artifacts = artifact_dir(upload_dir, content_hash)
+    probe = await probe_media(video_path, upload_dir, content_hash)
+    destination = upload_dir / EXPORTS_DIRNAME / export_name(video_file_name, settings)
+    return await build_export_job(
+        video_path, destination, artifacts, probe, settings, workers
+    )
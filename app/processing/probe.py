@@ -0,0 +1,175 @@
+import asyncio
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, TypedDict
+from app.processing.artifacts import artifact_dir
+from app.processing.metrics import Span
+
+FFPROBE = "ffprobe"
+PROBE_CACHE_VERSION = 1
+PROBE_FILENAME = "probe.json"
+
+
+class ProbeError(Exception):
+    pass
+
+
+class ProbeResult(TypedDict):
+    version: int
+    format_name: str | None
+    duration: float | None
+    bit_rate: int | None
+    size: int | None
+    has_video: bool
+    video_codec: str | None
+    width: int | None
+    height: int | None
+    fps: float | None
+    video_bit_rate: int | None
+    has_audio: bool
+    audio_codec: str | None
+    sample_rate: int | None
+    channels: int | None
+    channel_layout: str | None
+    audio_bit_rate: int | None
+    probe_seconds: float
+
+
+_memory_cache: dict[str, ProbeResult] = {}
+
+
+def _int_or_none(value: Any) -> int | None:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _float_or_none(value: Any) -> float | None:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_rate(value: str | None) -> float | None:
+    if not value or value == "0/0":
+        return None
+    num, _, den = value.partition("/")
+    try:
+        rate = float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return rate if rate > 0 else None
+
+
+def parse_probe_output(raw: dict, probe_seconds: float) -> ProbeResult:
+    fmt = raw.get("format", {})
+    streams = raw.get("streams", [])
+    video = next(
+        (
+            s
+            for s in streams
+            if s.get("codec_type") == "video"
+            and not s.get("disposition", {}).get("attached_pic")
+        ),
+        None,
+    )
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+    duration = _float_or_none(fmt.get("duration"))
+    if duration is None:
+        duration = _float_or_none((video or audio or {}).get("duration"))
+    fps = None
+    if video:
+        fps = _parse_rate(video.get("avg_frame_rate")) or _parse_rate(
+            video.get("r_frame_rate")
+        )
+    return {
+        "version": PROBE_CACHE_VERSION,
+        "format_name": fmt.get("format_name"),
+        "duration": duration,
+        "bit_rate": _int_or_none(fmt.get("bit_rate")),
+        "size": _int_or_none(fmt.get("size")),
+        "has_video": video is not None,
+        "video_codec": video.get("codec_name") if video else None,
+        "width": _int_or_none(video.get("width")) if video else None,
+        "height": _int_or_none(video.get("height")) if video else None,
+        "fps": fps,
+        "video_bit_rate": _int_or_none(video.get("bit_rate")) if video else None,
+        "has_audio": audio is not None,
+        "audio_codec": audio.get("codec_name") if audio else None,
+        "sample_rate": _int_or_none(audio.get("sample_rate")) if audio else None,
+        "channels": _int_or_none(audio.get("channels")) if audio else None,
+        "channel_layout": audio.get("channel_layout") if audio else None,
+        "audio_bit_rate": _int_or_none(audio.get("bit_rate")) if audio else None,
+        "probe_seconds": probe_seconds,
+    }
+
+
+async def run_ffprobe(path: Path) -> ProbeResult:
+    with Span("probe", path.name) as span:
+        result = await _run_ffprobe(path, span)
+        span.num_bytes = result["size"] or 0
+        span.media_seconds = result["duration"] or 0.0
+    return result
+
+
+async def _run_ffprobe(path: Path, span: Span) -> ProbeResult:
+    started = time.perf_counter()
+    try:
+        process = await asyncio.create_subprocess_exec(
+            FFPROBE,
+            "-v",
+            "error",
+            "-print_format",
+            "json",
+            "-show_format",
+            "-show_streams",
+            str(path),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+    except FileNotFoundError:
+        raise ProbeError(
+            "FFprobe not found. Please ensure FFmpeg is installed and in the system's PATH."
+        ) from None
+    span.watch(process.pid)
+    stdout, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise ProbeError(stderr.decode(errors="replace").strip() or "ffprobe failed")
+    try:
+        raw = json.loads(stdout)
+    except json.JSONDecodeError as e:
+        raise ProbeError(f"Unreadable ffprobe output: {e}") from e
+    return parse_probe_output(raw, time.perf_counter() - started)
+
+
+async def probe_media(
+    path: Path, upload_dir: Path, content_hash: str | None = None
+) -> ProbeResult:
+    """Probe ``path``, reusing the cached result for the same content hash.
+
+    Cached results keep the ``probe_seconds`` of the original probe; callers
+    that want to report the cost of this call should time it themselves.
+    """
+    if content_hash is None:
+        return await run_ffprobe(path)
+    cached = _memory_cache.get(content_hash)
+    if cached is not None:
+        return cached
+    cache_path = artifact_dir(upload_dir, content_hash) / PROBE_FILENAME
+    try:
+        cached = json.loads(cache_path.read_text())
+        if cached.get("version") == PROBE_CACHE_VERSION:
+            _memory_cache[content_hash] = cached
+            return cached
+    except FileNotFoundError:
+        pass
+    except (OSError, json.JSONDecodeError):
+        logging.warning(f"Ignoring unreadable probe cache {cache_path}")
+    result = await run_ffprobe(path)
+    cache_path.write_text(json.dumps(result))
+    _memory_cache[content_hash] = result
+    return result
@@ -0,0 +1,47 @@
+from typing import IO
+
+
+class FfmpegProgress:
+    """Incremental parser for ffmpeg's ``-progress`` key=value output."""
+
+    def __init__(self, total_seconds: float | None = None):
+        self.total_seconds = total_seconds
+        self.frame = 0
+        self.fps = 0.0
+        self.out_seconds = 0.0
+        self.speed = 0.0
+        self.finished = False
+
+    @property
+    def fraction(self) -> float:
+        if self.finished:
+            return 1.0
+        if not self.total_seconds:
+            return 0.0
+        return min(1.0, self.out_seconds / self.total_seconds)
+
+    def feed(self, line: str) -> bool:
+        """Consume one line; returns True at the end of each progress block."""
+        key, _, value = line.strip().partition("=")
+        value = value.strip()
+        try:
+            if key == "frame":
+                self.frame = int(value)
+            elif key == "fps":
+                self.fps = float(value)
+            elif key in ("out_time_us", "out_time_ms"):
+                # Both keys are reported in microseconds.
+                self.out_seconds = max(0.0, int(value) / 1_000_000)
+            elif key == "speed":
+                self.speed = float(value.rstrip("x"))
+        except ValueError:
+            return False
+        if key == "progress":
+            self.finished = value == "end"
+            return True
+        return False
+
+    def follow(self, stream: IO[bytes]):
+        """Consume a process' progress pipe until it closes."""
+        for raw in stream:
+            self.feed(raw.decode(errors="replace"))
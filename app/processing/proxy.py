@@ -0,0 +1,194 @@
+import asyncio
+import contextlib
+import functools
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Callable, TypedDict
+from app.processing.decode import FFMPEG
+from app.processing.metrics import Span
+from app.processing.probe import ProbeResult
+
+PROXY_FILENAME = "proxy.mp4"
+THUMBNAILS_FILENAME = "thumbnails.jpg"
+PROXY_HEIGHT = 480
+PROXY_MAX_BIT_RATE = 2_000_000
+PROXY_THREADS = 2
+THUMBNAIL_COUNT = 10
+THUMBNAIL_HEIGHT = 72
+NICENESS = 19
+
+
+class ProxyError(Exception):
+    pass
+
+
+class PreviewAssets(TypedDict):
+    proxy: bool
+    thumbnails: bool
+
+
+@functools.cache
+def _slots() -> asyncio.Semaphore:
+    """One preview job at a time; created on first use, inside the running loop."""
+    return asyncio.Semaphore(1)
+
+
+def needs_proxy(probe: ProbeResult) -> bool:
+    """Whether the source is too large to preview comfortably as it is."""
+    if not probe["has_video"]:
+        return False
+    bit_rate = probe["video_bit_rate"] or probe["bit_rate"] or 0
+    return (probe["height"] or 0) > PROXY_HEIGHT or bit_rate > PROXY_MAX_BIT_RATE
+
+
+def proxy_command(source: Path, destination: Path) -> list[str]:
+    return [
+        FFMPEG,
+        "-nostdin",
+        "-y",
+        "-v",
+        "error",
+        "-i",
+        str(source),
+        "-map",
+        "0:v:0",
+        "-map",
+        "0:a:0?",
+        "-vf",
+        f"scale=-2:{PROXY_HEIGHT}",
+        "-c:v",
+        "libx264",
+        "-preset",
+        "veryfast",
+        "-crf",
+        "30",
+        "-maxrate",
+        "1M",
+        "-bufsize",
+        "2M",
+        "-pix_fmt",
+        "yuv420p",
+        "-c:a",
+        "aac",
+        "-b:a",
+        "96k",
+        "-threads",
+        str(PROXY_THREADS),
+        "-movflags",
+        "+faststart",
+        str(destination),
+    ]
+
+
+def thumbnails_command(source: Path, destination: Path, duration: float) -> list[str]:
+    """A one-row JPEG strip of THUMBNAIL_COUNT keyframes spread over the clip.
+
+    Only keyframes are decoded, so this costs a fraction of a full decode.
+    """
+    interval = max(duration / THUMBNAIL_COUNT, 0.001)
+    return [
+        FFMPEG,
+        "-nostdin",
+        "-y",
+        "-v",
+        "error",
+        "-skip_frame",
+        "nokey",
+        "-i",
+        str(source),
+        "-map",
+        "0:v:0",
+        "-vf",
+        (
+            f"select='isnan(prev_selected_t)+gte(t-prev_selected_t\\,{interval:.3f})',"
+            f"scale=-2:{THUMBNAIL_HEIGHT},tile={THUMBNAIL_COUNT}x1"
+        ),
+        "-fps_mode",
+        "vfr",
+        "-frames:v",
+        "1",
+        "-q:v",
+        "5",
+        "-update",
+        "1",
+        str(destination),
+    ]
+
+
+async def _run_low_priority(
+    command_for: Callable[[Path], list[str]], destination: Path, span: Span
+):
+    """Run ffmpeg at the lowest CPU priority, writing ``destination`` atomically."""
+    partial = destination.with_name(f".{destination.stem}.part{destination.suffix}")
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *command_for(partial),
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+    except FileNotFoundError:
+        raise ProxyError(
+            "FFmpeg not found. Please ensure it is installed and in the system's PATH."
+        ) from None
+    # Set from here rather than in a preexec_fn, which is unsafe with threads.
+    with contextlib.suppress(ProcessLookupError):
+        os.setpriority(os.PRIO_PROCESS, process.pid, NICENESS)
+    span.watch(process.pid)
+    try:
+        _, stderr = await process.communicate()
+    except BaseException:
+        process.kill()
+        await process.wait()
+        partial.unlink(missing_ok=True)
+        raise
+    if process.returncode != 0:
+        partial.unlink(missing_ok=True)
+        raise ProxyError(stderr.decode(errors="replace").strip() or "ffmpeg failed")
+    os.replace(partial, destination)
+
+
+async def generate_preview_assets(
+    source: Path, artifacts: Path, probe: ProbeResult
+) -> PreviewAssets:
+    """Create the proxy and thumbnail strip for an upload, reusing cached ones.
+
+    Both live in the upload's artifact directory, so they are shared by
+    identical uploads and removed with its other artifacts. Jobs run one at
+    a time and niced, so they only use CPU that nothing else wants.
+    """
+    assets: PreviewAssets = {"proxy": False, "thumbnails": False}
+    if not probe["has_video"]:
+        return assets
+    proxy = artifacts / PROXY_FILENAME
+    thumbnails = artifacts / THUMBNAILS_FILENAME
+    queued = time.perf_counter()
+    async with _slots():
+        started = time.perf_counter()
+        with Span(
+            "preview",
+            source.name,
+            started - queued,
+            probe["size"] or 0,
+            probe["duration"] or 0.0,
+        ) as span:
+            if not thumbnails.exists():
+                await _run_low_priority(
+                    lambda path: thumbnails_command(
+                        source, path, probe["duration"] or 0.0
+                    ),
+                    thumbnails,
+                    span,
+                )
+            if needs_proxy(probe) and not proxy.exists():
+                await _run_low_priority(
+                    lambda path: proxy_command(source, path), proxy, span
+                )
+        logging.info(
+            f"Prepared preview assets for {source.name} "
+            f"in {time.perf_counter() - started:.1f} s"
+        )
+    assets["thumbnails"] = thumbnails.exists()
+    assets["proxy"] = proxy.exists()
+    return assets
@@ -0,0 +1,208 @@
+from typing import TypedDict
+import numpy as np
+
+STRIP_FRACTION = 0.25
+OVERLAY_ALPHA = 0.85
+OVERLAY_FULL_ALPHA = 0.6
+BAR_GAP_FRACTION = 0.2
+# Feature rows rasterized per call while exporting.
+RENDER_BATCH = 8
+
+
+def parse_color(color: str) -> np.ndarray:
+    """``#rrggbb`` (or ``#rgb``) to a float32 RGB triple."""
+    value = color.lstrip("#")
+    if len(value) == 3:
+        value = "".join(c * 2 for c in value)
+    try:
+        return np.array(
+            [int(value[i : i + 2], 16) for i in (0, 2, 4)], dtype=np.float32
+        )
+    except ValueError:
+        raise ValueError(f"Invalid color {color!r}") from None
+
+
+def strip_bounds(height: int, position: str) -> tuple[int, int]:
+    """Rows ``[top, bottom)`` covered by the visualization."""
+    if position == "overlay":
+        return 0, height
+    strip_height = max(2, int(height * STRIP_FRACTION))
+    if position == "top":
+        return 0, strip_height
+    return height - strip_height, height
+
+
+class StripBatch(TypedDict):
+    top: int
+    first: np.ndarray
+    last: np.ndarray
+    extents: np.ndarray
+
+
+def blend_lut(color: np.ndarray, alpha: float) -> np.ndarray:
+    """``(3, 512)`` per-channel table: entry ``v`` is the value ``v`` left as
+    is and entry ``256 + v`` is ``v`` blended with ``color``.
+    """
+    values = np.arange(256, dtype=np.float32)
+    blended = values[None, :] + alpha * (color[:, None] - values[None, :])
+    return np.concatenate((np.tile(values, (3, 1)), blended), axis=1).astype(np.uint8)
+
+
+class OverlayRenderer:
+    """Draws the waveform and/or spectrum of feature rows onto RGB frames.
+
+    Nothing that is the same for every frame is recomputed: the bar each
+    pixel column belongs to, where each column samples the waveform and the
+    blended value of every channel value are computed once per export. Every
+    column of a style covers a single run of rows, so ``rasterize`` turns a
+    batch of feature rows into per-column runs with a few array operations,
+    and ``composite`` masks and blends only the rows of the strip that one
+    frame draws on.
+    """
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        visualization_type: str,
+        color: str,
+        position: str,
+        batch: int = RENDER_BATCH,
+    ):
+        self.width = width
+        self.height = height
+        self.visualization_type = visualization_type
+        self.color = parse_color(color)
+        self.alpha = OVERLAY_FULL_ALPHA if position == "overlay" else OVERLAY_ALPHA
+        self.top, self.bottom = strip_bounds(height, position)
+        self.batch = batch
+        rows = self.bottom - self.top
+        if visualization_type == "waveform":
+            self.layers = [("waveform", 0, rows)]
+        elif visualization_type == "spectrum":
+            self.layers = [("spectrum", 0, rows)]
+        else:
+            self.layers = [("waveform", 0, rows // 2), ("spectrum", rows // 2, rows)]
+        self.lut = blend_lut(self.color, self.alpha)
+        self._row_index = np.arange(rows)[:, None]
+        self._first = np.zeros((batch, len(self.layers), width), dtype=np.intp)
+        self._last = np.zeros_like(self._first)
+        self._extents = np.zeros((batch, 2), dtype=np.intp)
+        self._mask = np.empty((rows, width), dtype=bool)
+        self._scratch = np.empty((rows, width), dtype=bool)
+        self._offsets = np.empty((rows, width), dtype=np.uint16)
+        self._indices = np.empty((rows, width), dtype=np.uint16)
+        self._geometry: dict[tuple[str, int], tuple[np.ndarray, np.ndarray]] = {}
+
+    @property
+    def buffered_bytes(self) -> int:
+        """Memory held by the strip and compositing buffers."""
+        arrays = [self._first, self._last, self._extents, self._mask, self._scratch]
+        arrays += [self._offsets, self._indices, self._row_index, self.lut]
+        arrays += [array for pair in self._geometry.values() for array in pair]
+        return sum(array.nbytes for array in arrays)
+
+    def _bar_geometry(self, num_bins: int) -> tuple[np.ndarray, np.ndarray]:
+        """Bar index of every column, and the columns in the gaps between bars."""
+        key = ("spectrum", num_bins)
+        if key not in self._geometry:
+            columns = np.arange(self.width)
+            bar_position = (columns * num_bins / self.width) % 1.0
+            self._geometry[key] = (
+                columns * num_bins // self.width,
+                bar_position >= 1 - BAR_GAP_FRACTION,
+            )
+        return self._geometry[key]
+
+    def _wave_geometry(self, points: int) -> tuple[np.ndarray, np.ndarray]:
+        """Waveform sample left of every column and the column's distance past it."""
+        key = ("waveform", points)
+        if key not in self._geometry:
+            x = np.linspace(0, points - 1, self.width)
+            left = np.minimum(np.floor(x).astype(np.intp), max(0, points - 2))
+            self._geometry[key] = (left, x - left)
+        return self._geometry[key]
+
+    def _spectrum_runs(
+        self, bands: np.ndarray, rows: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        column_bar, gaps = self._bar_geometry(bands.shape[1])
+        heights = np.clip(bands, 0, 1)[:, column_bar] * rows
+        heights[:, gaps] = 0
+        first = np.ceil(rows - heights).astype(np.intp)
+        return first, np.full_like(first, rows)
+
+    def _waveform_runs(
+        self, wave: np.ndarray, rows: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        left, offset = self._wave_geometry(wave.shape[1])
+        wave = np.clip(wave, -1, 1).astype(np.float64)
+        right = np.minimum(left + 1, wave.shape[1] - 1)
+        values = wave[:, left] + (wave[:, right] - wave[:, left]) * offset
+        center = (rows - 1) / 2
+        y = center - values * center
+        first = np.floor(np.minimum(y, center)).astype(np.intp)
+        return first, np.ceil(np.maximum(y, center)).astype(np.intp) + 1
+
+    def rasterize(self, bands: np.ndarray, wave: np.ndarray) -> StripBatch:
+        """The strips of ``(n, bins)`` bands and ``(n, points)`` wave rows.
+
+        Only the strip is described, by the run of strip rows
+        ``[first, last)`` each pixel column covers per layer; the strip starts
+        at frame row ``top``. ``extents`` holds the first and past-the-last
+        strip row each frame draws on. The arrays live in buffers that the
+        next call overwrites.
+        """
+        count = len(bands)
+        if count > self.batch:
+            self.batch = count
+            self._first = np.zeros((count, *self._first.shape[1:]), dtype=np.intp)
+            self._last = np.zeros_like(self._first)
+            self._extents = np.zeros((count, 2), dtype=np.intp)
+        extents = self._extents[:count]
+        extents[:, 0] = self.bottom - self.top
+        extents[:, 1] = 0
+        for layer, (style, start, stop) in enumerate(self.layers):
+            if style == "waveform":
+                first, last = self._waveform_runs(wave, stop - start)
+            else:
+                first, last = self._spectrum_runs(bands, stop - start)
+            drawn = first < last
+            first = np.where(drawn, first + start, stop)
+            last = np.where(drawn, last + start, stop)
+            self._first[:count, layer] = first
+            self._last[:count, layer] = last
+            extents[:, 0] = np.minimum(extents[:, 0], first.min(axis=1))
+            extents[:, 1] = np.maximum(extents[:, 1], last.max(axis=1))
+        return {
+            "top": self.top,
+            "first": self._first[:count],
+            "last": self._last[:count],
+            "extents": extents,
+        }
+
+    def composite(self, frame: np.ndarray, strip: StripBatch, index: int):
+        """Blend frame ``index`` of ``strip`` into an ``(height, width, 3)`` frame."""
+        top, bottom = strip["extents"][index]
+        if top >= bottom:
+            return
+        mask = self._mask[: bottom - top]
+        scratch = self._scratch[: bottom - top]
+        for layer, (_, start, stop) in enumerate(self.layers):
+            rows = slice(max(start, top) - top, min(stop, bottom) - top)
+            row_index = self._row_index[max(start, top) : min(stop, bottom)]
+            np.greater_equal(row_index, strip["first"][index, layer], out=mask[rows])
+            np.less(row_index, strip["last"][index, layer], out=scratch[rows])
+        mask &= scratch
+        region = frame[strip["top"] + top : strip["top"] + bottom]
+        # Masked pixels look up the blended half of the table, others themselves.
+        offsets = self._offsets[: bottom - top]
+        indices = self._indices[: bottom - top]
+        np.multiply(mask, np.uint16(256), out=offsets)
+        for channel in range(3):
+            np.add(region[..., channel], offsets, out=indices)
+            np.take(self.lut[channel], indices, out=region[..., channel])
+
+    def render(self, frame: np.ndarray, bands: np.ndarray, wave: np.ndarray):
+        """Draw one feature row in place on an ``(height, width, 3)`` uint8 frame."""
+        self.composite(frame, self.rasterize(bands[None], wave[None]), 0)
@@ -0,0 +1,271 @@
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import os
+import secrets
+import shutil
+import time
+from pathlib import Path
+from typing import TypedDict
+import reflex as rx
+from app.processing.artifacts import hash_file
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.environ.get("VISUALIZER_MAX_UPLOAD_MB", 20480)) * 1024 * 1024
+# Unfinished uploads untouched for this long are removed with their space.
+STALE_UPLOAD_SECONDS = 24 * 60 * 60
+CLEANUP_INTERVAL = 60 * 60
+
+
+class ResumableUploadError(Exception):
+    pass
+
+
+class UploadManifest(TypedDict):
+    upload_id: str
+    filename: str
+    content_type: str
+    size: int
+    chunk_size: int
+    chunk_hashes: dict[str, str]
+
+
+class UploadStatus(TypedDict):
+    upload_id: str
+    filename: str
+    size: int
+    chunk_size: int
+    total_chunks: int
+    received_chunks: list[int]
+    confirmed_offset: int
+    complete: bool
+
+
+class CompletedUpload(TypedDict):
+    filename: str
+    stored_name: str
+    size: int
+    content_hash: str
+
+
+def _preallocate(path: Path, size: int):
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if hasattr(os, "posix_fallocate") and size > 0:
+            try:
+                os.posix_fallocate(fd, 0, size)
+                return
+            except OSError:
+                pass
+        os.ftruncate(fd, size)
+    finally:
+        os.close(fd)
+
+
+def _pwrite_all(path: Path, data: bytes, offset: int):
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view = view[written:]
+            offset += written
+    finally:
+        os.close(fd)
+
+
+class ResumableUploadStore:
+    """Chunked uploads that survive dropped connections and server restarts.
+
+    Each upload is a preallocated ``<id>.part`` file plus a JSON manifest of
+    the chunks that were received and verified. Chunks may arrive in any
+    order and in parallel; they are written in place with ``pwrite``.
+    Uploads are limited to ``max_size`` and to the free disk space, and
+    abandoned ones are removed by ``remove_stale``.
+    """
+
+    def __init__(self, upload_dir: Path, max_size: int = MAX_UPLOAD_BYTES):
+        self.upload_dir = upload_dir
+        self.max_size = max_size
+        self.work_dir = upload_dir / ".resumable"
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    def _part_path(self, upload_id: str) -> Path:
+        return self.work_dir / f"{upload_id}.part"
+
+    def _manifest_path(self, upload_id: str) -> Path:
+        return self.work_dir / f"{upload_id}.json"
+
+    def _lock(self, upload_id: str) -> asyncio.Lock:
+        return self._locks.setdefault(upload_id, asyncio.Lock())
+
+    def _load(self, upload_id: str) -> UploadManifest:
+        if not upload_id.isalnum():
+            raise ResumableUploadError("Invalid upload id.")
+        try:
+            return json.loads(self._manifest_path(upload_id).read_text())
+        except FileNotFoundError:
+            raise ResumableUploadError("Unknown upload id.") from None
+
+    def _save(self, manifest: UploadManifest):
+        path = self._manifest_path(manifest["upload_id"])
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(manifest))
+        tmp_path.replace(path)
+
+    @staticmethod
+    def _total_chunks(manifest: UploadManifest) -> int:
+        return max(1, -(-manifest["size"] // manifest["chunk_size"]))
+
+    def _status(self, manifest: UploadManifest) -> UploadStatus:
+        received = sorted(int(i) for i in manifest["chunk_hashes"])
+        total_chunks = self._total_chunks(manifest)
+        contiguous = 0
+        while contiguous < total_chunks and str(contiguous) in manifest["chunk_hashes"]:
+            contiguous += 1
+        return {
+            "upload_id": manifest["upload_id"],
+            "filename": manifest["filename"],
+            "size": manifest["size"],
+            "chunk_size": manifest["chunk_size"],
+            "total_chunks": total_chunks,
+            "received_chunks": received,
+            "confirmed_offset": min(
+                manifest["size"], contiguous * manifest["chunk_size"]
+            ),
+            "complete": len(received) == total_chunks,
+        }
+
+    async def create(
+        self,
+        filename: str,
+        size: int,
+        content_type: str = "",
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> UploadStatus:
+        if size < 0:
+            raise ResumableUploadError("Upload size must not be negative.")
+        if size > self.max_size:
+            raise ResumableUploadError(
+                f"Uploads are limited to {self.max_size // 2**20} MB."
+            )
+        if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+            raise ResumableUploadError("Unsupported chunk size.")
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        if size > shutil.disk_usage(self.work_dir).free:
+            raise ResumableUploadError("Not enough disk space for this upload.")
+        manifest: UploadManifest = {
+            "upload_id": secrets.token_hex(16),
+            "filename": Path(filename).name,
+            "content_type": content_type,
+            "size": size,
+            "chunk_size": chunk_size,
+            "chunk_hashes": {},
+        }
+        await asyncio.to_thread(
+            _preallocate, self._part_path(manifest["upload_id"]), size
+        )
+        self._save(manifest)
+        return self._status(manifest)
+
+    async def status(self, upload_id: str) -> UploadStatus:
+        return self._status(self._load(upload_id))
+
+    async def write_chunk(
+        self, upload_id: str, index: int, data: bytes, sha256: str
+    ) -> UploadStatus:
+        """Verify and store one chunk. Re-sending a confirmed chunk is a no-op."""
+        manifest = self._load(upload_id)
+        total_chunks = self._total_chunks(manifest)
+        if not 0 <= index < total_chunks:
+            raise ResumableUploadError(f"Chunk index {index} is out of range.")
+        offset = index * manifest["chunk_size"]
+        expected_length = min(manifest["chunk_size"], manifest["size"] - offset)
+        if len(data) != expected_length:
+            raise ResumableUploadError(
+                f"Chunk {index} has {len(data)} bytes, expected {expected_length}."
+            )
+        digest = await asyncio.to_thread(lambda: hashlib.sha256(data).hexdigest())
+        if digest != sha256.lower():
+            raise ResumableUploadError(f"Chunk {index} failed checksum verification.")
+        # Under the lock, so complete() never moves the file mid-write.
+        async with self._lock(upload_id):
+            manifest = self._load(upload_id)
+            if manifest["chunk_hashes"].get(str(index)) != digest:
+                try:
+                    await asyncio.to_thread(
+                        _pwrite_all, self._part_path(upload_id), data, offset
+                    )
+                except OSError as e:
+                    raise ResumableUploadError(
+                        f"Could not store chunk {index}: {e}"
+                    ) from e
+                manifest["chunk_hashes"][str(index)] = digest
+                self._save(manifest)
+        return self._status(manifest)
+
+    async def complete(self, upload_id: str, stored_name: str) -> CompletedUpload:
+        """Move a fully received upload into the upload dir as ``stored_name``."""
+        async with self._lock(upload_id):
+            manifest = self._load(upload_id)
+            if not self._status(manifest)["complete"]:
+                raise ResumableUploadError("Upload is missing chunks.")
+            part_path = self._part_path(upload_id)
+            content_hash = await asyncio.to_thread(hash_file, part_path)
+            part_path.replace(self.upload_dir / stored_name)
+            self._manifest_path(upload_id).unlink(missing_ok=True)
+        self._locks.pop(upload_id, None)
+        return {
+            "filename": manifest["filename"],
+            "stored_name": stored_name,
+            "size": manifest["size"],
+            "content_hash": content_hash,
+        }
+
+    async def abort(self, upload_id: str):
+        self._load(upload_id)
+        self._part_path(upload_id).unlink(missing_ok=True)
+        self._manifest_path(upload_id).unlink(missing_ok=True)
+        self._locks.pop(upload_id, None)
+
+    def remove_stale(self, max_age: float = STALE_UPLOAD_SECONDS) -> int:
+        """Delete unfinished uploads that received nothing for ``max_age``."""
+        cutoff = time.time() - max_age
+        removed = 0
+        for path in self.work_dir.glob("*.part") if self.work_dir.is_dir() else ():
+            upload_id = path.stem
+            manifest_path = self._manifest_path(upload_id)
+            try:
+                last_used = max(
+                    path.stat().st_mtime,
+                    manifest_path.stat().st_mtime if manifest_path.exists() else 0,
+                )
+            except FileNotFoundError:
+                continue
+            if last_used > cutoff:
+                continue
+            path.unlink(missing_ok=True)
+            manifest_path.unlink(missing_ok=True)
+            self._locks.pop(upload_id, None)
+            removed += 1
+        return removed
+
+
+@functools.cache
+def get_resumable_store() -> ResumableUploadStore:
+    return ResumableUploadStore(rx.get_upload_dir())
+
+
+async def run_resumable_cleanup():
+    """Remove abandoned resumable uploads at startup and then periodically."""
+    store = get_resumable_store()
+    while True:
+        try:
+            if removed := await asyncio.to_thread(store.remove_stale):
+                logging.info(f"Removed {removed} stale resumable upload(s)")
+        except OSError as e:
+            logging.warning(f"Could not clean up resumable uploads: {e}")
+        await asyncio.sleep(CLEANUP_INTERVAL)
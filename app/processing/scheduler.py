@@ -0,0 +1,560 @@
+import asyncio
+import functools
+import heapq
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import statistics
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Literal, TypedDict
+import reflex as rx
+from app.processing.artifacts import content_hash_for
+from app.processing.decode import DecodeError
+from app.processing.estimate import (
+    THROUGHPUT_FILENAME,
+    ThroughputModel,
+    remaining_seconds,
+)
+from app.processing.export import (
+    EXPORTS_DIRNAME,
+    ExportCancelled,
+    ExportError,
+    ExportSettings,
+)
+from app.processing.export_cache import EXPORT_CACHE_DIRNAME, ExportCache
+from app.processing.memory import MemoryTracker
+from app.processing.metrics import Span
+from app.processing.pipeline import AnyExportJob, create_export_job, export_name
+from app.processing.probe import ProbeError
+from app.processing.segments import SegmentedExportJob
+from app.processing.upload_store import get_upload_store
+
+JOBS_FILENAME = ".export_jobs.sqlite3"
+MAX_CONCURRENT = int(os.environ.get("VISUALIZER_MAX_EXPORTS", 0))
+CORES_PER_EXPORT = 2
+MEMORY_PER_EXPORT = 768 * 1024 * 1024
+POLL_INTERVAL = 0.5
+DEFAULT_SPEED = 1.0
+SPEED_SAMPLES = 20
+
+JobPriority = Literal["interactive", "normal", "batch"]
+JobStatus = Literal["queued", "running", "done", "failed", "cancelled"]
+
+PRIORITY_RANKS: dict[str, int] = {"interactive": 0, "normal": 1, "batch": 2}
+FINISHED_STATUSES = ("done", "failed", "cancelled")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    status TEXT NOT NULL,
+    video_file_name TEXT NOT NULL,
+    export_name TEXT NOT NULL,
+    settings TEXT NOT NULL,
+    media_seconds REAL NOT NULL,
+    cache_key TEXT,
+    width INTEGER,
+    height INTEGER,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    progress REAL NOT NULL DEFAULT 0,
+    fps REAL NOT NULL DEFAULT 0,
+    peak_rss INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created);
+CREATE INDEX IF NOT EXISTS jobs_by_cache_key ON jobs (cache_key, status);
+"""
+
+
+class JobRecord(TypedDict):
+    id: str
+    owner: str
+    priority: JobPriority
+    status: JobStatus
+    video_file_name: str
+    export_name: str
+    settings: ExportSettings
+    media_seconds: float
+    cache_key: str | None
+    width: int | None
+    height: int | None
+    created: float
+    started: float | None
+    finished: float | None
+    progress: float
+    fps: float
+    peak_rss: int | None
+    error: str | None
+
+
+class QueuePosition(TypedDict):
+    position: int
+    eta_seconds: float
+
+
+class JobStore:
+    """Export jobs kept in SQLite so that the queue survives a restart."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (
+            ("cache_key", "TEXT"),
+            ("peak_rss", "INTEGER"),
+            ("width", "INTEGER"),
+            ("height", "INTEGER"),
+        ):
+            if columns and column not in columns:
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._db.executescript(SCHEMA)
+
+    @staticmethod
+    def _record(row: sqlite3.Row) -> JobRecord:
+        record = dict(row)
+        record["settings"] = json.loads(record["settings"])
+        return record
+
+    def add(
+        self,
+        owner: str,
+        video_file_name: str,
+        settings: ExportSettings,
+        media_seconds: float,
+        priority: JobPriority,
+        cache_key: str | None = None,
+        status: JobStatus = "queued",
+        size: tuple[int, int] | None = None,
+    ) -> JobRecord:
+        job_id = secrets.token_hex(8)
+        now = time.time()
+        finished = now if status in FINISHED_STATUSES else None
+        width, height = size or (None, None)
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, owner, priority, status, video_file_name,"
+                " export_name, settings, media_seconds, cache_key, width, height,"
+                " created, started, finished, progress)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    owner,
+                    priority,
+                    status,
+                    video_file_name,
+                    export_name(video_file_name, settings),
+                    json.dumps(settings),
+                    media_seconds,
+                    cache_key,
+                    width,
+                    height,
+                    now,
+                    finished,
+                    finished,
+                    1.0 if status == "done" else 0.0,
+                ),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> JobRecord | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._record(row) if row else None
+
+    def active_for_key(self, cache_key: str) -> JobRecord | None:
+        """The queued or running job that will produce ``cache_key``, if any."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM jobs WHERE cache_key = ?"
+                " AND status IN ('queued', 'running') ORDER BY created LIMIT 1",
+                (cache_key,),
+            ).fetchone()
+        return self._record(row) if row else None
+
+    def active_video_names(self) -> list[str]:
+        """Uploads that queued or running jobs still have to read."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT DISTINCT video_file_name FROM jobs"
+                " WHERE status IN ('queued', 'running')"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def with_status(self, status: JobStatus) -> list[JobRecord]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created", (status,)
+            ).fetchall()
+        return [self._record(row) for row in rows]
+
+    def update(self, job_id: str, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(
+                f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id)
+            )
+
+    def requeue_interrupted(self) -> int:
+        """Put jobs that were running when the server stopped back in the queue."""
+        with self._lock:
+            return self._db.execute(
+                "UPDATE jobs SET status = 'queued', started = NULL, progress = 0,"
+                " fps = 0 WHERE status = 'running'"
+            ).rowcount
+
+    def recent_speeds(self, limit: int = SPEED_SAMPLES) -> list[float]:
+        """Media seconds exported per wall-clock second for the latest jobs."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT media_seconds / (finished - started) FROM jobs"
+                " WHERE status = 'done' AND finished > started AND media_seconds > 0"
+                " ORDER BY finished DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+
+def _available_memory() -> int | None:
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def concurrency_limit() -> int:
+    """How many exports may run at once on this host."""
+    if MAX_CONCURRENT:
+        return MAX_CONCURRENT
+    limit = max(1, (os.cpu_count() or 1) // CORES_PER_EXPORT)
+    memory = _available_memory()
+    if memory is not None:
+        limit = min(limit, max(1, memory // MEMORY_PER_EXPORT))
+    return limit
+
+
+def dispatch_order(
+    queued: list[JobRecord], running: list[JobRecord]
+) -> list[JobRecord]:
+    """The order in which queued jobs will start.
+
+    Higher priority classes always go first. Within a class each owner's jobs
+    stay in submission order, and owners take turns: the next job comes from
+    the owner with the fewest jobs running or already picked.
+    """
+    load = Counter(job["owner"] for job in running)
+    pending = sorted(
+        queued, key=lambda job: (PRIORITY_RANKS[job["priority"]], job["created"])
+    )
+    order = []
+    while pending:
+        rank = PRIORITY_RANKS[pending[0]["priority"]]
+        heads: dict[str, JobRecord] = {}
+        for job in pending:
+            if PRIORITY_RANKS[job["priority"]] != rank:
+                break
+            heads.setdefault(job["owner"], job)
+        job = min(heads.values(), key=lambda job: (load[job["owner"]], job["created"]))
+        order.append(job)
+        pending.remove(job)
+        load[job["owner"]] += 1
+    return order
+
+
+def estimate_queue(
+    order: list[JobRecord],
+    running: list[JobRecord],
+    limit: int,
+    speed: Callable[[JobRecord], float],
+    now: float,
+) -> dict[str, QueuePosition]:
+    """Queue position (0 while running) and seconds until each job finishes.
+
+    Simulates ``limit`` slots: running jobs free theirs when their remaining
+    time is up, and queued jobs take the earliest free slot in ``order``.
+    """
+    positions: dict[str, QueuePosition] = {}
+    slots = []
+    for job in running:
+        elapsed = max(0.0, now - (job["started"] or now))
+        remaining = remaining_seconds(
+            job["media_seconds"], job["progress"], elapsed, speed(job)
+        )
+        positions[job["id"]] = {"position": 0, "eta_seconds": remaining}
+        slots.append(remaining)
+    slots += [0.0] * max(0, limit - len(slots))
+    heapq.heapify(slots)
+    for position, job in enumerate(order, 1):
+        end = heapq.heappop(slots) + job["media_seconds"] / speed(job)
+        heapq.heappush(slots, end)
+        positions[job["id"]] = {"position": position, "eta_seconds": end}
+    return positions
+
+
+class ExportScheduler:
+    """Runs queued exports, at most ``limit`` at a time, in dispatch order."""
+
+    def __init__(self, upload_dir: Path, limit: int | None = None):
+        self.upload_dir = upload_dir
+        self.store = JobStore(upload_dir / JOBS_FILENAME)
+        self.cache = ExportCache(
+            upload_dir / EXPORT_CACHE_DIRNAME, upload_dir / EXPORTS_DIRNAME
+        )
+        self.model = ThroughputModel(upload_dir / THROUGHPUT_FILENAME)
+        self.limit = limit or concurrency_limit()
+        self._jobs: dict[str, AnyExportJob] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._cancelled: set[str] = set()
+        self._wake = asyncio.Event()
+        self._stopping = False
+
+    @property
+    def workers(self) -> int:
+        """Segment workers per export, so that a full queue shares the cores."""
+        return max(1, (os.cpu_count() or 1) // self.limit)
+
+    def speed(self) -> float:
+        samples = self.store.recent_speeds()
+        return statistics.median(samples) if samples else DEFAULT_SPEED
+
+    def submit(
+        self,
+        owner: str,
+        video_file_name: str,
+        settings: ExportSettings,
+        media_seconds: float,
+        priority: JobPriority = "normal",
+        cache_key: str | None = None,
+        size: tuple[int, int] | None = None,
+    ) -> JobRecord:
+        """Queue an export, unless its output is cached or already on the way.
+
+        With a ``cache_key``, a cached output is placed in the exports folder
+        and returned as a finished job, and a queued or running job for the
+        same key is returned instead of starting a second encode. ``size`` is
+        the output frame size, which the ETA's throughput model is keyed on.
+        """
+        if cache_key is not None:
+            if (active := self.store.active_for_key(cache_key)) is not None:
+                self.cache.coalesced += 1
+                return active
+            destination = (
+                self.upload_dir
+                / EXPORTS_DIRNAME
+                / export_name(video_file_name, settings)
+            )
+            if self.cache.fetch(cache_key, settings, destination):
+                return self.store.add(
+                    owner,
+                    video_file_name,
+                    settings,
+                    media_seconds,
+                    priority,
+                    cache_key,
+                    status="done",
+                    size=size,
+                )
+        record = self.store.add(
+            owner,
+            video_file_name,
+            settings,
+            media_seconds,
+            priority,
+            cache_key,
+            size=size,
+        )
+        self._wake.set()
+        return record
+
+    def cancel(self, job_id: str, owner: str | None = None):
+        """Cancel a job; with ``owner``, only if that owner submitted it."""
+        record = self.store.get(job_id)
+        if record is None or record["status"] in FINISHED_STATUSES:
+            return
+        if owner is not None and record["owner"] != owner:
+            return
+        if record["status"] == "queued":
+            self.store.update(job_id, status="cancelled", finished=time.time())
+            return
+        self._cancelled.add(job_id)
+        if (job := self._jobs.get(job_id)) is not None:
+            job.cancel()
+        elif (task := self._tasks.get(job_id)) is not None:
+            # Still probing or analysing: abort that instead of waiting for it.
+            task.cancel()
+
+    def position(self, job_id: str) -> QueuePosition | None:
+        running = self.store.with_status("running")
+        order = dispatch_order(self.store.with_status("queued"), running)
+        fallback = self.speed()
+
+        def speed(job: JobRecord) -> float:
+            # Measured speed for the job's settings and output size, else
+            # recent exports of any kind.
+            if job["width"] and job["height"]:
+                size = (job["width"], job["height"])
+                return self.model.speed(job["settings"], size) or fallback
+            return fallback
+
+        positions = estimate_queue(order, running, self.limit, speed, time.time())
+        return positions.get(job_id)
+
+    def _dispatch(self):
+        while len(self._tasks) < self.limit:
+            queued = self.store.with_status("queued")
+            if not queued:
+                return
+            job = dispatch_order(queued, self.store.with_status("running"))[0]
+            self.store.update(job["id"], status="running", started=time.time())
+            self._tasks[job["id"]] = asyncio.create_task(self._run(job))
+
+    async def _run(self, record: JobRecord):
+        job_id = record["id"]
+        queue_wait = time.time() - record["created"]
+        content_hash = None
+        try:
+            content_hash = await asyncio.to_thread(
+                content_hash_for, self.upload_dir, record["video_file_name"]
+            )
+            job = await create_export_job(
+                self.upload_dir,
+                record["video_file_name"],
+                record["settings"],
+                self.workers,
+            )
+            self._jobs[job_id] = job
+            if job_id in self._cancelled:
+                job.cancel()
+            # Never truncate in place: the old file may be a cache entry's link.
+            await asyncio.to_thread(job.destination.unlink, missing_ok=True)
+            with (
+                get_upload_store().pinned(content_hash),
+                MemoryTracker(
+                    "export", job_id, pids=job.pids, allocated=job.buffered_bytes
+                ) as memory,
+                Span(
+                    "render",
+                    job_id,
+                    queue_wait,
+                    job.source.stat().st_size,
+                    record["media_seconds"],
+                    cancelled=(ExportCancelled, asyncio.CancelledError),
+                ) as span,
+            ):
+                task = asyncio.create_task(asyncio.to_thread(job.run))
+                try:
+                    while not task.done():
+                        await asyncio.wait({task}, timeout=POLL_INTERVAL)
+                        self.store.update(
+                            job_id,
+                            progress=job.progress,
+                            fps=job.frames_per_second,
+                            peak_rss=memory.peak_job_rss,
+                        )
+                    await task
+                finally:
+                    span.add_cpu(job.cpu_seconds)
+                    span.speed = job.ffmpeg_speed
+        except (ExportCancelled, asyncio.CancelledError) as e:
+            # When stopping, the job stays 'running' so the next start requeues it.
+            if not self._stopping:
+                self.store.update(job_id, status="cancelled", finished=time.time())
+            elif isinstance(e, asyncio.CancelledError):
+                raise
+        except (ExportError, ProbeError, DecodeError, FileNotFoundError, OSError) as e:
+            logging.exception(f"Export job {job_id} failed: {e}")
+            self.store.update(
+                job_id, status="failed", finished=time.time(), error=str(e)
+            )
+        except Exception as e:
+            # Anything else (a crashed worker pool, settings from an older
+            # version) must still finish the job, or it is requeued forever.
+            logging.exception(f"Export job {job_id} failed unexpectedly: {e}")
+            self.store.update(
+                job_id, status="failed", finished=time.time(), error=str(e)
+            )
+        else:
+            if record["cache_key"] is not None:
+                await asyncio.to_thread(
+                    self.cache.store,
+                    record["cache_key"],
+                    record["settings"],
+                    job.destination,
+                )
+            self.store.update(
+                job_id,
+                status="done",
+                finished=time.time(),
+                progress=1.0,
+                peak_rss=memory.peak_job_rss,
+            )
+            try:
+                await asyncio.to_thread(
+                    self.model.record,
+                    record["settings"],
+                    job.size,
+                    record["media_seconds"],
+                    job.elapsed,
+                    job.frames_done,
+                    job.stage_fps,
+                    threads=job.threads,
+                )
+            except Exception as e:
+                # The export is done; a bad measurement only affects ETAs.
+                logging.exception(f"Could not record throughput for {job_id}: {e}")
+        finally:
+            self._jobs.pop(job_id, None)
+            self._tasks.pop(job_id, None)
+            self._cancelled.discard(job_id)
+            self._wake.set()
+            if content_hash is not None:
+                # The export and its work dir count against the upload quota.
+                await asyncio.to_thread(get_upload_store().refresh, content_hash)
+
+    async def run(self):
+        """Dispatch jobs until cancelled; interrupted jobs are requeued first."""
+        if requeued := self.store.requeue_interrupted():
+            logging.info(f"Requeued {requeued} interrupted export job(s)")
+        try:
+            while True:
+                self._dispatch()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), POLL_INTERVAL)
+                except TimeoutError:
+                    pass
+                self._wake.clear()
+        finally:
+            self._stopping = True
+            for job in self._jobs.values():
+                if isinstance(job, SegmentedExportJob):
+                    job.suspend()
+                else:
+                    job.cancel()
+
+
+@functools.cache
+def get_export_scheduler() -> ExportScheduler:
+    scheduler = ExportScheduler(rx.get_upload_dir())
+    # Queued exports keep their source from being evicted before they start.
+    get_upload_store().add_pin_source(scheduler.store.active_video_names)
+    return scheduler
+
+
+async def run_export_scheduler():
+    await get_export_scheduler().run()
@@ -0,0 +1,588 @@
+import ctypes
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import TypedDict
+from app.processing.export import (
+    FFMPEG,
+    ExportCancelled,
+    ExportError,
+    ExportJob,
+    ExportSettings,
+    audio_codec_args,
+    muxer_args,
+    output_size,
+)
+from app.processing.features import FeatureTrack, FeatureTrackInfo
+from app.processing.filtergraph import NATIVE_STYLES, NativeExportJob
+from app.processing.memory import MEMORY_BUDGET
+from app.processing.metrics import reap
+from app.processing.probe import FFPROBE, ProbeResult
+
+EXPORT_WORKERS = int(os.environ.get("VISUALIZER_EXPORT_WORKERS", 0)) or (
+    os.cpu_count() or 1
+)
+MIN_SEGMENT_SECONDS = 10.0
+MONITOR_INTERVAL = 0.2
+CANCEL_TIMEOUT = 5.0
+PLAN_FILENAME = "plan.json"
+PLAN_VERSION = 1
+PR_SET_PDEATHSIG = 1
+
+
+class Segment(TypedDict):
+    index: int
+    start_frame: int
+    frame_count: int
+
+
+class SegmentPlan(TypedDict):
+    version: int
+    source: str
+    source_size: int
+    source_mtime_ns: int
+    settings: ExportSettings
+    renderer: str
+    fps: float
+    total_frames: int
+    segments: list[Segment]
+
+
+class SegmentTask(TypedDict):
+    segment: Segment
+    source: str
+    destination: str
+    probe: ProbeResult
+    settings: ExportSettings
+    threads: int
+    memory_budget: int
+    features_path: str | None
+    features_info: FeatureTrackInfo | None
+
+
+def keyframe_times(source: Path) -> list[float]:
+    """Presentation times of the video keyframes, read from packet flags only."""
+    try:
+        result = subprocess.run(
+            [
+                FFPROBE,
+                "-v",
+                "error",
+                "-select_streams",
+                "v:0",
+                "-show_entries",
+                "packet=pts_time,flags",
+                "-of",
+                "csv=p=0",
+                str(source),
+            ],
+            capture_output=True,
+            text=True,
+        )
+    except FileNotFoundError:
+        raise ExportError(
+            "FFprobe not found. Please ensure FFmpeg is installed and in the system's PATH."
+        ) from None
+    if result.returncode != 0:
+        raise ExportError(result.stderr.strip() or "ffprobe failed")
+    times = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" in flags:
+            try:
+                times.append(float(pts_time))
+            except ValueError:
+                continue
+    return sorted(times)
+
+
+def plan_segments(
+    keyframes: list[float],
+    total_frames: int,
+    fps: float,
+    count: int,
+    min_seconds: float = MIN_SEGMENT_SECONDS,
+) -> list[Segment]:
+    """Split ``total_frames`` into up to ``count`` runs that start on keyframes.
+
+    Each cut snaps to the keyframe nearest an even split so that every
+    segment decoder can seek straight to it; cuts that would leave a
+    segment shorter than ``min_seconds`` are dropped.
+    """
+    count = max(1, min(count, int(total_frames / fps / min_seconds)))
+    candidates = sorted({round(t * fps) for t in keyframes} - {0})
+    cuts = [0]
+    for i in range(1, count):
+        target = i * total_frames / count
+        if not candidates:
+            break
+        cut = min(candidates, key=lambda frame: abs(frame - target))
+        if (
+            cut - cuts[-1] >= min_seconds * fps
+            and total_frames - cut >= min_seconds * fps
+        ):
+            cuts.append(cut)
+    cuts.append(total_frames)
+    return [
+        {"index": i, "start_frame": start, "frame_count": stop - start}
+        for i, (start, stop) in enumerate(zip(cuts, cuts[1:]))
+    ]
+
+
+_progress = None
+_cpu = None
+_cancel = None
+
+
+def _kill_own_group(signum, frame):
+    os.killpg(0, signal.SIGKILL)
+
+
+def _exit_with_parent(parent: int):
+    """Take the worker's process group down when the server dies.
+
+    Workers lead their own process group, so signals sent to the server's
+    group (Ctrl-C, a service manager's SIGTERM) no longer reach them; on
+    Linux the kernel sends SIGTERM when the parent exits instead.
+    """
+    if not sys.platform.startswith("linux"):
+        return
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.prctl(PR_SET_PDEATHSIG, signal.SIGTERM) != 0:
+            return
+    except (OSError, AttributeError):
+        return
+    signal.signal(signal.SIGTERM, _kill_own_group)
+    # The parent may have died before the death signal was armed.
+    if os.getppid() != parent:
+        _kill_own_group(signal.SIGTERM, None)
+
+
+def _init_worker(progress, cpu, cancel, pids, parent):
+    global _progress, _cpu, _cancel
+    _progress = progress
+    _cpu = cpu
+    _cancel = cancel
+    # Lead a process group, so a stuck worker can be killed with its ffmpeg.
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+        _exit_with_parent(parent)
+    with pids.get_lock():
+        for slot, pid in enumerate(pids):
+            if not pid:
+                pids[slot] = os.getpid()
+                break
+
+
+def render_segment(task: SegmentTask) -> str:
+    """Pool worker: render one segment, video only, publishing its frame count.
+
+    The segment is written under a ``.part`` name and renamed when complete,
+    so an existing segment file is a finished checkpoint.
+    """
+    segment = task["segment"]
+    destination = Path(task["destination"])
+    part = destination.with_name(f"{destination.stem}.part{destination.suffix}")
+    common = dict(
+        start_frame=segment["start_frame"],
+        frame_count=segment["frame_count"],
+        include_audio=False,
+        threads=task["threads"],
+    )
+    if task["features_path"] is None:
+        job = NativeExportJob(
+            Path(task["source"]),
+            part,
+            task["probe"],
+            task["settings"],
+            **common,
+        )
+    else:
+        job = ExportJob(
+            Path(task["source"]),
+            part,
+            task["probe"],
+            FeatureTrack(Path(task["features_path"]), task["features_info"]),
+            task["settings"],
+            memory_budget=task["memory_budget"],
+            **common,
+        )
+    done = threading.Event()
+
+    def monitor():
+        while not done.wait(MONITOR_INTERVAL):
+            _progress[segment["index"]] = job.frames_done
+            if _cancel.is_set():
+                job.cancel()
+
+    thread = threading.Thread(target=monitor, daemon=True)
+    thread.start()
+    try:
+        job.run()
+    finally:
+        done.set()
+        thread.join()
+        _cpu[segment["index"]] = job.cpu_seconds
+    os.replace(part, destination)
+    _progress[segment["index"]] = segment["frame_count"]
+    return task["destination"]
+
+
+def concat_command(
+    listing: Path, source: Path, destination: Path, settings: ExportSettings
+) -> list[str]:
+    return [
+        FFMPEG,
+        "-nostdin",
+        "-y",
+        "-v",
+        "error",
+        "-f",
+        "concat",
+        "-safe",
+        "0",
+        "-i",
+        str(listing),
+        "-i",
+        str(source),
+        "-map",
+        "0:v:0",
+        "-map",
+        "1:a:0?",
+        "-c:v",
+        "copy",
+        *audio_codec_args(settings),
+        "-shortest",
+        *muxer_args(settings),
+        str(destination),
+    ]
+
+
+def _error_rank(error: BaseException) -> int:
+    """Real failures first, then a broken pool, then cancelled siblings."""
+    if isinstance(error, ExportCancelled):
+        return 2
+    return 1 if isinstance(error, BrokenProcessPool) else 0
+
+
+class SegmentedExportJob:
+    """Export split at keyframes and rendered by a pool of worker processes.
+
+    Segments are encoded video-only, then joined losslessly with the concat
+    demuxer while the source audio is muxed back in. Has the same interface
+    as ExportJob; ``features`` selects the Python renderer, otherwise the
+    native filter graph is used.
+
+    The plan and every finished segment stay in ``work_dir`` until the export
+    completes or is cancelled, so a run interrupted by a crash, a restart or
+    ``suspend`` resumes from the segments already rendered.
+    """
+
+    def __init__(
+        self,
+        source: Path,
+        destination: Path,
+        probe: ProbeResult,
+        settings: ExportSettings,
+        features: FeatureTrack | None = None,
+        workers: int = EXPORT_WORKERS,
+        memory_budget: int = MEMORY_BUDGET,
+    ):
+        if features is None and settings["visualization_type"] not in NATIVE_STYLES:
+            raise ExportError(
+                f"No native filter graph for {settings['visualization_type']!r}."
+            )
+        self.source = source
+        self.destination = destination
+        self.probe = probe
+        self.settings = settings
+        self.features = features
+        self.workers = max(1, workers)
+        self.memory_budget = memory_budget
+        self.fps = probe["fps"] or (features.fps if features else 30.0)
+        self.size = output_size(probe, settings["resolution"])
+        # Each worker picks its own encoder thread count.
+        self.threads = None
+        self.total_frames = max(1, int(round((probe["duration"] or 0) * self.fps)))
+        self.segments: list[Segment] = []
+        self.work_dir = destination.parent / f".{destination.stem}.segments"
+        self.cancelled = False
+        self.resumed_frames = 0
+        self._keep_checkpoints = False
+        self._started: float | None = None
+        self._finished: float | None = None
+        self._context = multiprocessing.get_context("spawn")
+        self._cancel = self._context.Event()
+        self._progress = None
+        self._cpu = None
+        self._concat_cpu = 0.0
+        self._worker_pids = None
+        self._concat: subprocess.Popen | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def frames_done(self) -> int:
+        if self._progress is None:
+            return 0
+        return min(self.total_frames, sum(self._progress))
+
+    @property
+    def progress(self) -> float:
+        return min(1.0, self.frames_done / self.total_frames)
+
+    @property
+    def elapsed(self) -> float:
+        if self._started is None:
+            return 0.0
+        return (self._finished or time.perf_counter()) - self._started
+
+    @property
+    def frames_per_second(self) -> float:
+        elapsed = self.elapsed
+        rendered = self.frames_done - self.resumed_frames
+        return rendered / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def stage_fps(self) -> dict[str, float]:
+        """Stages run in the worker processes and are not measured separately."""
+        return {}
+
+    @property
+    def cpu_seconds(self) -> float:
+        """CPU time of the segments rendered by this run, then the concat."""
+        return sum(self._cpu or ()) + self._concat_cpu
+
+    @property
+    def ffmpeg_speed(self) -> float | None:
+        """Segments render in parallel, so no single ffmpeg speed applies."""
+        return None
+
+    def pids(self) -> list[int]:
+        """The segment workers while they run, then the concat process."""
+        pids = [pid for pid in self._worker_pids or () if pid]
+        concat = self._concat
+        if concat is not None and concat.returncode is None:
+            pids.append(concat.pid)
+        return pids
+
+    def buffered_bytes(self) -> int:
+        """Segments are rendered in the workers, which ``pids`` covers."""
+        return 0
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            self._cancel.set()
+            if self._concat is not None and self._concat.poll() is None:
+                self._concat.kill()
+
+    def suspend(self):
+        """Stop like cancel, but keep the finished segments for the next run."""
+        self._keep_checkpoints = True
+        self.cancel()
+
+    def _segment_path(self, segment: Segment) -> Path:
+        return self.work_dir / f"{segment['index']:04d}{self.destination.suffix}"
+
+    def _load_plan(self) -> list[Segment]:
+        """The checkpointed plan if it is for this very export, else a new one."""
+        stat = self.source.stat()
+        identity = {
+            "version": PLAN_VERSION,
+            "source": str(self.source),
+            "source_size": stat.st_size,
+            "source_mtime_ns": stat.st_mtime_ns,
+            "settings": self.settings,
+            "renderer": "native" if self.features is None else "python",
+            "fps": self.fps,
+            "total_frames": self.total_frames,
+        }
+        plan_path = self.work_dir / PLAN_FILENAME
+        try:
+            plan = json.loads(plan_path.read_text())
+            if {key: plan.get(key) for key in identity} == identity:
+                return plan["segments"]
+        except FileNotFoundError:
+            pass
+        except (OSError, json.JSONDecodeError, AttributeError):
+            logging.warning(f"Ignoring unreadable export plan {plan_path}")
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        self.work_dir.mkdir(parents=True)
+        segments = plan_segments(
+            keyframe_times(self.source), self.total_frames, self.fps, self.workers
+        )
+        plan: SegmentPlan = {**identity, "segments": segments}
+        plan_path.write_text(json.dumps(plan))
+        return segments
+
+    def _render(self) -> list[Path]:
+        self.segments = self._load_plan()
+        for part in self.work_dir.glob("*.part.*"):
+            part.unlink()
+        self._progress = self._context.Array("q", len(self.segments), lock=False)
+        self._cpu = self._context.Array("d", len(self.segments), lock=False)
+        remaining = []
+        for segment in self.segments:
+            if self._segment_path(segment).exists():
+                self._progress[segment["index"]] = segment["frame_count"]
+                self.resumed_frames += segment["frame_count"]
+            else:
+                remaining.append(segment)
+        if self.resumed_frames:
+            logging.info(
+                f"Resuming {self.destination.name}: "
+                f"{len(self.segments) - len(remaining)} of {len(self.segments)} "
+                f"segments already rendered"
+            )
+        if remaining:
+            self._render_segments(remaining)
+        return [self._segment_path(segment) for segment in self.segments]
+
+    def _kill_workers(self):
+        """SIGKILL every worker's process group, taking its ffmpeg along."""
+        for pid in self._worker_pids or ():
+            if not pid:
+                continue
+            try:
+                if hasattr(os, "killpg"):
+                    os.killpg(pid, signal.SIGKILL)
+                else:
+                    os.kill(pid, signal.SIGTERM)
+            except (ProcessLookupError, PermissionError):
+                continue
+
+    def _render_segments(self, segments: list[Segment]):
+        workers = min(self.workers, len(segments))
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        tasks: list[SegmentTask] = [
+            {
+                "segment": segment,
+                "source": str(self.source),
+                "destination": str(self._segment_path(segment)),
+                "probe": self.probe,
+                "settings": self.settings,
+                "threads": threads,
+                "memory_budget": self.memory_budget // workers,
+                "features_path": str(self.features.path) if self.features else None,
+                "features_info": self.features.info if self.features else None,
+            }
+            for segment in segments
+        ]
+        self._worker_pids = self._context.Array("q", workers)
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=self._context,
+            initializer=_init_worker,
+            initargs=(
+                self._progress,
+                self._cpu,
+                self._cancel,
+                self._worker_pids,
+                os.getpid(),
+            ),
+        )
+        first_error = None
+        try:
+            futures = [pool.submit(render_segment, task) for task in tasks]
+            pending = set(futures)
+            while pending and not self._cancel.is_set():
+                done, pending = wait(
+                    pending, timeout=MONITOR_INTERVAL, return_when=FIRST_EXCEPTION
+                )
+                failed = [f.exception() for f in done if f.exception() is not None]
+                if failed:
+                    # Before the siblings are stopped, which breaks the pool.
+                    failed.sort(key=_error_rank)
+                    first_error = failed[0]
+                    break
+            if pending:
+                self._cancel.set()
+                for future in pending:
+                    future.cancel()
+                _, pending = wait(pending, timeout=CANCEL_TIMEOUT)
+            if pending:
+                # Workers get CANCEL_TIMEOUT to stop their ffmpeg processes;
+                # any still running after that are killed outright.
+                self._kill_workers()
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+            self._worker_pids = None
+        if self.cancelled:
+            raise ExportCancelled()
+        errors = [
+            future.exception()
+            for future in futures
+            if not future.cancelled() and future.exception() is not None
+        ]
+        # The first failure seen comes first; segments stopped because a
+        # sibling failed, and the pool broken by stopping them, come last.
+        if first_error is not None:
+            errors.insert(0, first_error)
+        errors.sort(key=_error_rank)
+        if errors:
+            raise errors[0]
+
+    def _join(self, parts: list[Path]):
+        listing = self.work_dir / "segments.txt"
+        listing.write_text(
+            "".join(
+                "file '{}'\n".format(str(part).replace("'", "'\\''")) for part in parts
+            )
+        )
+        with self._lock:
+            if self.cancelled:
+                raise ExportCancelled()
+            try:
+                self._concat = subprocess.Popen(
+                    concat_command(
+                        listing, self.source, self.destination, self.settings
+                    ),
+                    stderr=subprocess.PIPE,
+                )
+            except FileNotFoundError:
+                raise ExportError(
+                    "FFmpeg not found. Please ensure it is installed and in the system's PATH."
+                ) from None
+        stderr = self._concat.stderr.read()
+        self._concat_cpu = reap(self._concat)
+        if self.cancelled:
+            raise ExportCancelled()
+        if self._concat.returncode != 0:
+            raise ExportError(
+                stderr.decode(errors="replace").strip() or "concat failed"
+            )
+
+    def run(self) -> Path:
+        """Run the export to completion. Raises ExportCancelled or ExportError."""
+        self._started = time.perf_counter()
+        try:
+            self._join(self._render())
+        except ExportCancelled:
+            self.destination.unlink(missing_ok=True)
+            if not self._keep_checkpoints:
+                shutil.rmtree(self.work_dir, ignore_errors=True)
+            raise
+        except BaseException:
+            self.destination.unlink(missing_ok=True)
+            raise
+        finally:
+            self._finished = time.perf_counter()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        logging.info(
+            f"Exported {self.destination.name} in {len(self.segments)} segments "
+            f"on {min(self.workers, len(self.segments))} workers: "
+            f"{self.total_frames} frames in {self.elapsed:.1f} s "
+            f"({self.frames_per_second:.1f} fps)"
+        )
+        return self.destination
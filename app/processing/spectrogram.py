@@ -0,0 +1,136 @@
+import functools
+from typing import Callable
+import numpy as np
+from scipy import fft as sp_fft
+
+FFT_SIZE = 2048
+HOP = 1024
+NUM_BANDS = 64
+SPECTROGRAM_FILENAME = "spectrogram.npy"
+BATCH_FRAMES = 256
+MIN_FREQUENCY = 20.0
+
+
+def band_edges(sample_rate: int, num_bins: int = NUM_BANDS) -> np.ndarray:
+    return np.logspace(np.log10(MIN_FREQUENCY), np.log10(sample_rate / 2), num_bins + 1)
+
+
+@functools.lru_cache(maxsize=16)
+def band_matrix(sample_rate: int, fft_size: int, num_bins: int) -> np.ndarray:
+    """``(fft_size // 2 + 1, num_bins)`` matrix averaging FFT bins into log bands.
+
+    Bands that contain no FFT bin get an all-zero column.
+    """
+    freqs = sp_fft.rfftfreq(fft_size, 1 / sample_rate)
+    edges = band_edges(sample_rate, num_bins)
+    band = np.searchsorted(edges, freqs, side="right") - 1
+    valid = (band >= 0) & (band < num_bins)
+    matrix = np.zeros((len(freqs), num_bins), dtype=np.float32)
+    matrix[np.nonzero(valid)[0], band[valid]] = 1.0
+    counts = matrix.sum(axis=0)
+    np.divide(matrix, counts, out=matrix, where=counts > 0)
+    matrix.setflags(write=False)
+    return matrix
+
+
+@functools.lru_cache(maxsize=16)
+def _window(fft_size: int) -> np.ndarray:
+    window = np.hanning(fft_size).astype(np.float32)
+    # Scale so a full-scale sine peaks at 1.0 in its FFT bin.
+    window *= 2 / window.sum()
+    window.setflags(write=False)
+    return window
+
+
+class SpectrogramEngine:
+    """Overlapping STFT over a streamed mono track, reduced to log bands.
+
+    Frame ``k`` is centred on sample ``k * hop`` (``hop`` may be
+    fractional), with zero padding before the first and after the last
+    sample. Frames are transformed ``batch_frames`` at a time as one 2-D
+    ``rfft``, so memory depends on the batch and block sizes, never on the
+    track length. Each finished ``(frames, num_bins)`` batch is handed to
+    ``sink``; the running mean over all frames is kept for the global
+    spectrum.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        sink: Callable[[np.ndarray], None],
+        fft_size: int = FFT_SIZE,
+        hop: float = HOP,
+        num_bins: int = NUM_BANDS,
+        batch_frames: int = BATCH_FRAMES,
+    ):
+        self.sample_rate = sample_rate
+        self.fft_size = fft_size
+        self.hop = hop
+        self.num_bins = num_bins
+        self.batch_frames = batch_frames
+        self.frames = 0
+        self.num_samples = 0
+        self._sink = sink
+        self._matrix = band_matrix(sample_rate, fft_size, num_bins)
+        self._window = _window(fft_size)
+        self._offsets = np.arange(fft_size)
+        self._band_sum = np.zeros(num_bins, dtype=np.float64)
+        # Buffered samples, in padded coordinates starting at _buffer_start.
+        self._buffer = np.zeros(fft_size // 2, dtype=np.float32)
+        self._buffer_start = 0
+        self._batch_bytes = 0
+
+    @property
+    def buffered_bytes(self) -> int:
+        """Memory held by the buffered samples and the last transformed batch."""
+        return self._buffer.nbytes + self._batch_bytes
+
+    def _frame_start(self, frame: int) -> int:
+        return int(np.rint(frame * self.hop))
+
+    def _transform(self, starts: np.ndarray):
+        frames = self._buffer[starts[:, None] - self._buffer_start + self._offsets]
+        frames *= self._window
+        magnitude = np.abs(sp_fft.rfft(frames, axis=1, workers=-1))
+        self._batch_bytes = frames.nbytes + 3 * magnitude.nbytes
+        bands = (magnitude @ self._matrix).astype(np.float32)
+        self._band_sum += bands.sum(axis=0)
+        self.frames += len(bands)
+        self._sink(bands)
+
+    def _drain(self, total_frames: int | None = None):
+        buffer_end = self._buffer_start + len(self._buffer)
+        while True:
+            stop = self.frames + self.batch_frames
+            if total_frames is not None:
+                stop = min(stop, total_frames)
+            starts = np.rint(np.arange(self.frames, stop) * self.hop).astype(np.intp)
+            starts = starts[starts + self.fft_size <= buffer_end]
+            if not len(starts):
+                break
+            self._transform(starts)
+        keep_from = self._frame_start(self.frames) - self._buffer_start
+        if keep_from > 0:
+            self._buffer = self._buffer[keep_from:]
+            self._buffer_start += keep_from
+
+    def push(self, block: np.ndarray):
+        self.num_samples += len(block)
+        self._buffer = np.concatenate((self._buffer, block))
+        self._drain()
+
+    def finish(self) -> np.ndarray:
+        """Flush the remaining frames and return the average band spectrum."""
+        total_frames = (
+            int(np.ceil(self.num_samples / self.hop)) if self.num_samples else 0
+        )
+        last_end = self._frame_start(max(total_frames - 1, 0)) + self.fft_size
+        padding = last_end - (self._buffer_start + len(self._buffer))
+        if padding > 0:
+            self._buffer = np.concatenate(
+                (self._buffer, np.zeros(padding, dtype=np.float32))
+            )
+        self._drain(total_frames)
+        if not self.frames:
+            return np.zeros(self.num_bins, dtype=np.float32)
+        return (self._band_sum / self.frames).astype(np.float32)
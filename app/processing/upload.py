@@ -0,0 +1,101 @@
+import asyncio
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, TypedDict
+import reflex as rx
+
+CHUNK_SIZE = 4 * 1024 * 1024
+# Reflex reads a whole direct upload into memory before the handler runs, so
+# the dropzone refuses bigger files and they go through the resumable
+# endpoint, which streams chunks to disk.
+MAX_DIRECT_UPLOAD_BYTES = (
+    int(os.environ.get("VISUALIZER_MAX_DIRECT_UPLOAD_MB", 256)) * 1024 * 1024
+)
+ACCEPTED_VIDEO_TYPES = [
+    "video/mp4",
+    "video/webm",
+    "video/x-msvideo",
+    "video/quicktime",
+    "video/x-matroska",
+]
+VALID_EXTENSIONS = [".mp4", ".webm", ".avi", ".mov", ".mkv"]
+
+
+class UploadProgress(TypedDict):
+    bytes_written: int
+    total_bytes: int | None
+    percent: int
+    bytes_per_second: float
+
+
+class UploadWriter:
+    """Copy an upload to disk in fixed-size blocks, hashing it on the way.
+
+    This bounds the copy, not the request: by the time a direct upload
+    reaches the handler Reflex already holds it in memory, which is why
+    those are capped at ``MAX_DIRECT_UPLOAD_BYTES``.
+    """
+
+    def __init__(
+        self,
+        destination: Path,
+        total_bytes: int | None = None,
+        chunk_size: int = CHUNK_SIZE,
+    ):
+        self.destination = destination
+        self.total_bytes = total_bytes
+        self.chunk_size = chunk_size
+        self.bytes_written = 0
+        self.elapsed = 0.0
+        self._hasher = hashlib.sha256()
+
+    @property
+    def content_hash(self) -> str:
+        return self._hasher.hexdigest()
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes_written / self.elapsed if self.elapsed > 0 else 0.0
+
+    def _progress(self) -> UploadProgress:
+        percent = 0
+        if self.total_bytes:
+            percent = min(100, self.bytes_written * 100 // self.total_bytes)
+        return {
+            "bytes_written": self.bytes_written,
+            "total_bytes": self.total_bytes,
+            "percent": percent,
+            "bytes_per_second": self.bytes_per_second,
+        }
+
+    def _write_block(self, out: BinaryIO, block: bytes):
+        self._hasher.update(block)
+        out.write(block)
+
+    async def copy_from(self, file: rx.UploadFile) -> AsyncIterator[UploadProgress]:
+        """Stream ``file`` into ``destination``, yielding progress after each block.
+
+        The data is written to a ``.part`` file that is only renamed into place
+        once the copy completes, so a failed upload never leaves a truncated
+        video behind.
+        """
+        self.destination.parent.mkdir(parents=True, exist_ok=True)
+        partial_path = self.destination.with_name(self.destination.name + ".part")
+        started = time.perf_counter()
+        try:
+            with partial_path.open("wb") as out:
+                while True:
+                    block = await file.read(self.chunk_size)
+                    if not block:
+                        break
+                    await asyncio.to_thread(self._write_block, out, block)
+                    self.bytes_written += len(block)
+                    self.elapsed = time.perf_counter() - started
+                    yield self._progress()
+            partial_path.replace(self.destination)
+        except BaseException:
+            partial_path.unlink(missing_ok=True)
+            raise
+        self.elapsed = time.perf_counter() - started
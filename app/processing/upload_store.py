@@ -0,0 +1,271 @@
+import collections
+import contextlib
+import functools
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, TypedDict
+import reflex as rx
+from app.processing.artifacts import (
+    ARTIFACTS_DIRNAME,
+    NAME_INDEX_DIRNAME,
+    artifact_dir,
+    name_index_dir,
+    register_upload,
+)
+from app.processing.export import EXPORTS_DIRNAME
+from app.processing.export_cache import link_or_copy
+from app.processing.pipeline import export_files_pattern
+
+SOURCE_FILENAME = "source"
+UPLOAD_QUOTA_BYTES = (
+    int(os.environ.get("VISUALIZER_UPLOAD_QUOTA_MB", 20480)) * 1024 * 1024
+)
+# Content used this recently is never evicted, even over quota.
+EVICTION_GRACE_SECONDS = 15 * 60
+# Sizes are kept as running totals; a periodic rescan picks up outside changes.
+RESCAN_SECONDS = 10 * 60
+
+
+class UploadStoreStats(TypedDict):
+    entries: int
+    bytes: int
+    quota: int
+    deduplicated: int
+    deduplicated_bytes: int
+    evicted: int
+
+
+class _Entry(TypedDict):
+    content_hash: str
+    last_used: float
+    bytes: int
+    names: list[str]
+
+
+class UploadStore:
+    """Uploads stored once per content hash, with quota-driven LRU eviction.
+
+    The bytes live in the content's artifact directory as ``source``; the
+    per-session upload name is a hard link to it, so identical uploads share
+    one copy and every existing path keeps working. An entry's size covers
+    the source, all its derived artifacts and the exports rendered from its
+    upload names, with their segment work dirs; sizes are running totals
+    updated through ``refresh`` and rescanned every ``RESCAN_SECONDS``. Its
+    last use is the artifact directory's mtime, which ``artifact_dir``
+    refreshes. When the total goes over ``quota`` the least recently used
+    entries are removed with their artifacts, exports and upload names,
+    skipping pinned content, uploads named by a pin source (such as queued
+    exports) and anything used within ``EVICTION_GRACE_SECONDS``.
+    """
+
+    def __init__(self, upload_dir: Path, quota: int = UPLOAD_QUOTA_BYTES):
+        self.upload_dir = upload_dir
+        self.quota = quota
+        self.deduplicated = 0
+        self.deduplicated_bytes = 0
+        self.evicted = 0
+        self._pins: collections.Counter[str] = collections.Counter()
+        self._pin_sources: list[Callable[[], Iterable[str]]] = []
+        self._entries: dict[str, _Entry] = {}
+        self._scanned: float | None = None
+        self._lock = threading.Lock()
+
+    def _source(self, content_hash: str) -> Path:
+        return artifact_dir(self.upload_dir, content_hash) / SOURCE_FILENAME
+
+    def ingest(self, path: Path, content_hash: str, file_name: str) -> Path:
+        """Store the file at ``path`` and expose it as ``file_name``.
+
+        ``path`` is consumed: it becomes the stored copy, or is dropped when
+        the content is already stored. Runs eviction afterwards.
+        """
+        destination = self.upload_dir / file_name
+        with self._lock:
+            source = self._source(content_hash)
+            if source.exists():
+                self.deduplicated += 1
+                self.deduplicated_bytes += path.stat().st_size
+                if path != destination:
+                    path.unlink()
+                logging.info(f"Upload {file_name} duplicates stored content")
+            else:
+                os.replace(path, source)
+            link_or_copy(source, destination)
+            register_upload(self.upload_dir, file_name, content_hash)
+        self.refresh(content_hash)
+        self.enforce_quota(keep=content_hash)
+        return destination
+
+    @contextlib.contextmanager
+    def pinned(self, content_hash: str) -> Iterator[None]:
+        """Protect ``content_hash`` from eviction while the block runs."""
+        with self._lock:
+            self._pins[content_hash] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pins[content_hash] -= 1
+                if not self._pins[content_hash]:
+                    del self._pins[content_hash]
+
+    def add_pin_source(self, source: Callable[[], Iterable[str]]):
+        """Never evict the uploads whose names ``source`` returns at the time."""
+        self._pin_sources.append(source)
+
+    def _names(self) -> dict[str, list[str]]:
+        names: dict[str, list[str]] = collections.defaultdict(list)
+        index = name_index_dir(self.upload_dir)
+        if index.is_dir():
+            for name_path in index.iterdir():
+                try:
+                    names[name_path.read_text().strip()].append(name_path.name)
+                except OSError:
+                    continue
+        return names
+
+    def _derived(self, names: list[str]) -> list[Path]:
+        """Exports of the uploads ``names`` and their segment work dirs."""
+        exports = self.upload_dir / EXPORTS_DIRNAME
+        if not names or not exports.is_dir():
+            return []
+        patterns = [export_files_pattern(name) for name in names]
+        return [
+            path
+            for path in exports.iterdir()
+            if any(pattern.fullmatch(path.name) for pattern in patterns)
+        ]
+
+    def _measure(self, content_hash: str, names: list[str]) -> int:
+        seen: set[tuple[int, int]] = set()
+        size = 0
+        paths = [self.upload_dir / ARTIFACTS_DIRNAME / content_hash]
+        paths += [self.upload_dir / name for name in names]
+        paths += self._derived(names)
+        for top in paths:
+            for path in [top, *top.rglob("*")] if top.is_dir() else [top]:
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                if (stat.st_dev, stat.st_ino) in seen:
+                    continue
+                seen.add((stat.st_dev, stat.st_ino))
+                if not path.is_dir():
+                    size += stat.st_size
+        return size
+
+    def _scan(self):
+        names = self._names()
+        root = self.upload_dir / ARTIFACTS_DIRNAME
+        self._entries = {}
+        for directory in root.iterdir() if root.is_dir() else ():
+            if directory.name == NAME_INDEX_DIRNAME or not directory.is_dir():
+                continue
+            self._entries[directory.name] = {
+                "content_hash": directory.name,
+                "last_used": 0.0,
+                "bytes": self._measure(directory.name, names[directory.name]),
+                "names": names[directory.name],
+            }
+        self._scanned = time.monotonic()
+
+    def _ensure_scanned(self, max_age: float | None = None):
+        if self._scanned is None or (
+            max_age is not None and time.monotonic() - self._scanned > max_age
+        ):
+            self._scan()
+
+    def refresh(self, content_hash: str):
+        """Re-measure one entry after its artifacts or exports changed."""
+        with self._lock:
+            if self._scanned is None:
+                return
+            if not (self.upload_dir / ARTIFACTS_DIRNAME / content_hash).is_dir():
+                self._entries.pop(content_hash, None)
+                return
+            names = self._names()[content_hash]
+            self._entries[content_hash] = {
+                "content_hash": content_hash,
+                "last_used": 0.0,
+                "bytes": self._measure(content_hash, names),
+                "names": names,
+            }
+
+    def _remove(self, entry: _Entry):
+        for path in self._derived(entry["names"]):
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                path.unlink(missing_ok=True)
+        for name in entry["names"]:
+            (self.upload_dir / name).unlink(missing_ok=True)
+            (name_index_dir(self.upload_dir) / name).unlink(missing_ok=True)
+        shutil.rmtree(
+            self.upload_dir / ARTIFACTS_DIRNAME / entry["content_hash"],
+            ignore_errors=True,
+        )
+        self._entries.pop(entry["content_hash"], None)
+
+    def enforce_quota(self, keep: str | None = None):
+        """Evict least recently used content until usage fits the quota."""
+        pinned_names = {name for source in self._pin_sources for name in source()}
+        with self._lock:
+            self._ensure_scanned(RESCAN_SECONDS)
+            if not self.quota:
+                return
+            usage = sum(entry["bytes"] for entry in self._entries.values())
+            if usage <= self.quota:
+                return
+            root = self.upload_dir / ARTIFACTS_DIRNAME
+            for content_hash, entry in list(self._entries.items()):
+                try:
+                    entry["last_used"] = (root / content_hash).stat().st_mtime
+                except FileNotFoundError:
+                    usage -= self._entries.pop(content_hash)["bytes"]
+            recent = time.time() - EVICTION_GRACE_SECONDS
+            entries = sorted(self._entries.values(), key=lambda e: e["last_used"])
+            for entry in entries:
+                if usage <= self.quota:
+                    break
+                if (
+                    entry["content_hash"] == keep
+                    or entry["content_hash"] in self._pins
+                    or not pinned_names.isdisjoint(entry["names"])
+                    or entry["last_used"] > recent
+                ):
+                    continue
+                self._remove(entry)
+                usage -= entry["bytes"]
+                self.evicted += 1
+                logging.info(
+                    f"Evicted upload {entry['content_hash'][:12]} "
+                    f"({', '.join(entry['names']) or 'no names'}, "
+                    f"{entry['bytes'] / 2**20:.1f} MB)"
+                )
+            if usage > self.quota:
+                logging.warning(
+                    f"Uploads use {usage / 2**20:.0f} MB, over the "
+                    f"{self.quota / 2**20:.0f} MB quota, but everything left is in use"
+                )
+
+    def stats(self) -> UploadStoreStats:
+        with self._lock:
+            self._ensure_scanned()
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(entry["bytes"] for entry in self._entries.values()),
+                "quota": self.quota,
+                "deduplicated": self.deduplicated,
+                "deduplicated_bytes": self.deduplicated_bytes,
+                "evicted": self.evicted,
+            }
+
+
+@functools.cache
+def get_upload_store() -> UploadStore:
+    return UploadStore(rx.get_upload_dir())
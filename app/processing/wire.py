@@ -0,0 +1,53 @@
+import base64
+import numpy as np
+
+# Bump whenever the layout of encode_feature_rows changes.
+FEATURE_ROWS_VERSION = 1
+
+
+def encode_waveform(columns: np.ndarray) -> str:
+    """Base64 of ``(n, 3)`` amplitude/min/max columns in ``[-1, 1]`` as int8.
+
+    Row-major, so each point is three consecutive signed bytes. At chart
+    height 1/127 is well below a pixel.
+    """
+    quantized = np.round(np.clip(columns, -1.0, 1.0) * 127).astype(np.int8)
+    return base64.b64encode(quantized.tobytes()).decode("ascii")
+
+
+def encode_spectrum(frequencies: np.ndarray, magnitudes: np.ndarray) -> str:
+    """Base64 of ``n`` little-endian uint16 frequencies (Hz), then ``n`` uint8
+    magnitudes scaled from ``[0, 1]``."""
+    hz = np.round(np.clip(frequencies, 0, 65535)).astype("<u2")
+    levels = np.round(np.clip(magnitudes, 0.0, 1.0) * 255).astype(np.uint8)
+    return base64.b64encode(hz.tobytes() + levels.tobytes()).decode("ascii")
+
+
+def decode_waveform(payload: str) -> np.ndarray:
+    data = np.frombuffer(base64.b64decode(payload), dtype=np.int8)
+    return data.reshape(-1, 3).astype(np.float32) / 127
+
+
+def decode_spectrum(payload: str) -> tuple[np.ndarray, np.ndarray]:
+    data = base64.b64decode(payload)
+    n = len(data) // 3
+    frequencies = np.frombuffer(data[: 2 * n], dtype="<u2").astype(np.float32)
+    magnitudes = np.frombuffer(data[2 * n :], dtype=np.uint8).astype(np.float32)
+    return frequencies, magnitudes / 255
+
+
+def encode_feature_rows(
+    bands: np.ndarray, wave: np.ndarray, level: np.ndarray
+) -> bytes:
+    """Feature rows as bytes: uint8 bands, int8 wave points, one uint8 level.
+
+    Inputs are the normalised FeatureTrack accessors, so each row packs into
+    ``num_bins + wave_points + 1`` bytes.
+    """
+    rows = np.empty((len(level), bands.shape[1] + wave.shape[1] + 1), dtype=np.uint8)
+    rows[:, : bands.shape[1]] = np.round(np.clip(bands, 0.0, 1.0) * 255)
+    rows[:, bands.shape[1] : -1] = (
+        np.round(np.clip(wave, -1.0, 1.0) * 127).astype(np.int8).view(np.uint8)
+    )
+    rows[:, -1] = np.round(np.clip(level, 0.0, 1.0) * 255)
+    return rows.tobytes()
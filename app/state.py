@@ -1,11 +1,22 @@
 import reflex as rx
 import asyncio
-import os
+import logging
 import random
 import string
+import time
 from typing import TypedDict
 from app.states.audio_state import AudioState
 from app.states.export_state import ExportState
+from app.processing.artifacts import artifact_dir, register_upload
+from app.processing.probe import ProbeError, ProbeResult, probe_media
+from app.processing.proxy import ProxyError, generate_preview_assets
+from app.processing.resumable import ResumableUploadError, get_resumable_store
+from app.processing.upload import (
+    ACCEPTED_VIDEO_TYPES,
+    VALID_EXTENSIONS,
+    UploadWriter,
+)
+from app.processing.upload_store import get_upload_store
 
 
 class VideoMetadata(TypedDict):
@@ -14,6 +25,8 @@ class VideoMetadata(TypedDict):
     duration: str | None
     resolution: str | None
     audio_info: str | None
+    video_info: str | None
+    probe_time: str | None
     error: str | None
 
 
@@ -23,17 +36,14 @@ class State(rx.State):
     is_uploading: bool = False
     processing_message: str = ""
     video_file_name: str = ""
+    video_content_hash: str = ""
     video_metadata: VideoMetadata | None = None
     upload_progress: int = 0
     show_processing_error: bool = False
-    ACCEPTED_VIDEO_TYPES = [
-        "video/mp4",
-        "video/webm",
-        "video/x-msvideo",
-        "video/quicktime",
-        "video/x-matroska",
-    ]
-    VALID_EXTENSIONS = [".mp4", ".webm", ".avi", ".mov", ".mkv"]
+    preview_proxy_ready: bool = False
+    thumbnail_strip_ready: bool = False
+    ACCEPTED_VIDEO_TYPES = ACCEPTED_VIDEO_TYPES
+    VALID_EXTENSIONS = VALID_EXTENSIONS
 
     def _format_size(self, size_bytes: int) -> str:
         if size_bytes < 1024:
@@ -45,12 +55,108 @@ class State(rx.State):
         else:
             return f"{size_bytes / 1024**3:.2f} GB"
 
+    def _unique_name(self, filename: str) -> str:
+        unique_suffix = "".join(
+            random.choices(string.ascii_letters + string.digits, k=8)
+        )
+        return f"{unique_suffix}_{filename}"
+
+    def _show_error(self, filename: str, size: int, message: str):
+        self.video_metadata = {
+            "filename": filename,
+            "size": self._format_size(size),
+            "duration": None,
+            "resolution": None,
+            "audio_info": None,
+            "video_info": None,
+            "probe_time": None,
+            "error": message,
+        }
+        self.is_uploading = False
+        self.show_processing_error = True
+
+    def _format_duration(self, seconds: float | None) -> str | None:
+        if seconds is None:
+            return None
+        total = int(round(seconds))
+        return f"{total // 3600:02d}:{total % 3600 // 60:02d}:{total % 60:02d}"
+
+    def _format_bit_rate(self, bit_rate: int | None) -> str | None:
+        if not bit_rate:
+            return None
+        if bit_rate < 1_000_000:
+            return f"{bit_rate / 1000:.0f} kbps"
+        return f"{bit_rate / 1_000_000:.1f} Mbps"
+
+    def _format_audio_info(self, probe: ProbeResult) -> str | None:
+        if not probe["has_audio"]:
+            return "No audio track"
+        parts = [(probe["audio_codec"] or "unknown").upper()]
+        if probe["sample_rate"]:
+            parts.append(f"{probe['sample_rate'] / 1000:g}kHz")
+        if probe["channel_layout"]:
+            parts.append(probe["channel_layout"].title())
+        elif probe["channels"]:
+            parts.append(f"{probe['channels']} ch")
+        if bit_rate := self._format_bit_rate(probe["audio_bit_rate"]):
+            parts.append(bit_rate)
+        return ", ".join(parts)
+
+    def _format_video_info(self, probe: ProbeResult) -> str | None:
+        if not probe["has_video"]:
+            return None
+        parts = [(probe["video_codec"] or "unknown").upper()]
+        if probe["fps"]:
+            parts.append(f"{probe['fps']:.2f}".rstrip("0").rstrip(".") + " fps")
+        if bit_rate := self._format_bit_rate(
+            probe["video_bit_rate"] or probe["bit_rate"]
+        ):
+            parts.append(bit_rate)
+        return ", ".join(parts)
+
+    async def _load_metadata(self, filename: str, size: int):
+        upload_dir = rx.get_upload_dir()
+        register_upload(upload_dir, self.video_file_name, self.video_content_hash)
+        started = time.perf_counter()
+        try:
+            probe = await probe_media(
+                upload_dir / self.video_file_name,
+                upload_dir,
+                self.video_content_hash,
+            )
+        except ProbeError as e:
+            logging.exception(f"FFprobe error: {e}")
+            self._show_error(filename, size, "Could not read video metadata.")
+            return
+        probe_ms = (time.perf_counter() - started) * 1000
+        logging.info(
+            f"Probed {self.video_file_name} in {probe_ms:.1f} ms "
+            f"(original probe {probe['probe_seconds'] * 1000:.1f} ms)"
+        )
+        resolution = None
+        if probe["width"] and probe["height"]:
+            resolution = f"{probe['width']}x{probe['height']}"
+        self.video_metadata = {
+            "filename": filename,
+            "size": self._format_size(size),
+            "duration": self._format_duration(probe["duration"]),
+            "resolution": resolution,
+            "audio_info": self._format_audio_info(probe),
+            "video_info": self._format_video_info(probe),
+            "probe_time": f"{probe_ms:.0f} ms",
+            "error": None,
+        }
+        self.is_uploading = False
+
     @rx.event
     async def handle_upload(self, files: list[rx.UploadFile]):
         self.is_uploading = True
         self.video_metadata = None
         self.video_file_name = ""
+        self.video_content_hash = ""
         self.show_processing_error = False
+        self.preview_proxy_ready = False
+        self.thumbnail_strip_ready = False
         self.upload_progress = 0
         if not files:
             self.is_uploading = False
@@ -59,45 +165,108 @@ class State(rx.State):
         if file.content_type not in self.ACCEPTED_VIDEO_TYPES or not any(
             (file.filename.lower().endswith(ext) for ext in self.VALID_EXTENSIONS)
         ):
-            self.video_metadata = {
-                "filename": file.filename,
-                "size": self._format_size(file.size),
-                "duration": None,
-                "resolution": None,
-                "audio_info": None,
-                "error": "Invalid file type. Please upload a valid video file (MP4, WEBM, AVI, MOV, MKV).",
-            }
-            self.is_uploading = False
-            self.show_processing_error = True
+            self._show_error(
+                file.filename,
+                file.size,
+                "Invalid file type. Please upload a valid video file (MP4, WEBM, AVI, MOV, MKV).",
+            )
             return
         self.processing_message = "Uploading file..."
         yield
-        for i in range(101):
-            self.upload_progress = i
-            await asyncio.sleep(0.01)
-        upload_data = await file.read()
         upload_dir = rx.get_upload_dir()
         upload_dir.mkdir(parents=True, exist_ok=True)
-        unique_suffix = "".join(
-            random.choices(string.ascii_letters + string.digits, k=8)
-        )
-        unique_name = f"{unique_suffix}_{file.filename}"
+        unique_name = self._unique_name(file.filename)
         file_path = upload_dir / unique_name
-        with file_path.open("wb") as f:
-            f.write(upload_data)
+        writer = UploadWriter(file_path, total_bytes=file.size)
+        try:
+            async for progress in writer.copy_from(file):
+                if progress["percent"] == self.upload_progress:
+                    continue
+                self.upload_progress = progress["percent"]
+                self.processing_message = (
+                    f"Uploading file... {progress['percent']}% "
+                    f"({self._format_size(int(progress['bytes_per_second']))}/s)"
+                )
+                yield
+            await asyncio.to_thread(
+                get_upload_store().ingest, file_path, writer.content_hash, unique_name
+            )
+        except OSError as e:
+            logging.exception(f"Failed to store upload: {e}")
+            self._show_error(
+                file.filename, file.size, "Failed to save the uploaded file."
+            )
+            return
+        self.upload_progress = 100
+        self.video_content_hash = writer.content_hash
         self.video_file_name = unique_name
         self.processing_message = "Analyzing video metadata..."
         yield
-        await asyncio.sleep(1)
-        self.video_metadata = {
-            "filename": file.filename,
-            "size": self._format_size(file.size),
-            "duration": "00:01:34",
-            "resolution": "1920x1080",
-            "audio_info": "AAC, 48kHz, Stereo",
-            "error": None,
-        }
-        self.is_uploading = False
+        await self._load_metadata(file.filename, file.size)
+        if not self.show_processing_error:
+            yield State.prepare_preview_assets
+
+    @rx.event
+    async def finish_resumable_upload(self, upload_id: str):
+        if not upload_id:
+            return
+        self.is_uploading = True
+        self.video_metadata = None
+        self.video_file_name = ""
+        self.video_content_hash = ""
+        self.show_processing_error = False
+        self.preview_proxy_ready = False
+        self.thumbnail_strip_ready = False
+        self.upload_progress = 100
+        self.processing_message = "Verifying upload..."
+        yield
+        store = get_resumable_store()
+        try:
+            status = await store.status(upload_id)
+            completed = await store.complete(
+                upload_id, self._unique_name(status["filename"])
+            )
+            await asyncio.to_thread(
+                get_upload_store().ingest,
+                rx.get_upload_dir() / completed["stored_name"],
+                completed["content_hash"],
+                completed["stored_name"],
+            )
+        except (ResumableUploadError, OSError) as e:
+            logging.exception(f"Failed to finish resumable upload: {e}")
+            self._show_error(upload_id, 0, f"Failed to finish the upload: {e}")
+            return
+        self.video_content_hash = completed["content_hash"]
+        self.video_file_name = completed["stored_name"]
+        self.processing_message = "Analyzing video metadata..."
+        yield
+        await self._load_metadata(completed["filename"], completed["size"])
+        if not self.show_processing_error:
+            yield State.prepare_preview_assets
+
+    @rx.event(background=True)
+    async def prepare_preview_assets(self):
+        """Build the preview proxy and thumbnail strip at low priority."""
+        async with self:
+            file_name = self.video_file_name
+            content_hash = self.video_content_hash
+        if not file_name or not content_hash:
+            return
+        upload_dir = rx.get_upload_dir()
+        try:
+            probe = await probe_media(upload_dir / file_name, upload_dir, content_hash)
+            assets = await generate_preview_assets(
+                upload_dir / file_name, artifact_dir(upload_dir, content_hash), probe
+            )
+        except (ProbeError, ProxyError, OSError) as e:
+            logging.exception(f"Failed to prepare preview assets: {e}")
+            return
+        await asyncio.to_thread(get_upload_store().refresh, content_hash)
+        async with self:
+            if self.video_content_hash != content_hash:
+                return
+            self.preview_proxy_ready = assets["proxy"]
+            self.thumbnail_strip_ready = assets["thumbnails"]
 
     @rx.var
     def uploaded_video_url(self) -> str:
@@ -107,7 +276,10 @@ class State(rx.State):
     def clear_video(self):
         self.video_metadata = None
         self.video_file_name = ""
+        self.video_content_hash = ""
         self.is_uploading = False
         self.show_processing_error = False
+        self.preview_proxy_ready = False
+        self.thumbnail_strip_ready = False
         self.upload_progress = 0
-        return [AudioState.clear_visualizations, ExportState.clear_export]
\ No newline at end of file
+        return [AudioState.clear_visualizations, ExportState.clear_export]
@@ -1,30 +1,42 @@
 import reflex as rx
 import numpy as np
-import ffmpeg
 import asyncio
 import logging
-from typing import TypedDict, Literal
-from scipy.fft import fft
+from typing import Literal
 from app.states.export_state import ExportState
-
-
-class WaveformPoint(TypedDict):
-    time: float
-    amplitude: float
-
-
-class SpectrumPoint(TypedDict):
-    frequency: float
-    magnitude: float
+from app.processing.analysis import analyze_media, open_peaks
+from app.processing.artifacts import artifact_dir, content_hash_for
+from app.processing.decode import DecodeError
+from app.processing.peaks import PeakPyramid
+from app.processing.probe import ProbeError, probe_media
+from app.processing.spectrogram import band_edges
+from app.processing.upload_store import get_upload_store
+from app.processing.wire import encode_spectrum, encode_waveform
 
 
 VisualizationType = Literal["waveform", "spectrum", "both"]
 VisualizationPosition = Literal["bottom", "top", "overlay"]
 
 
+def waveform_columns(
+    pyramid: PeakPyramid, start: float, end: float, width: int
+) -> np.ndarray:
+    """Normalised amplitude/min/max chart columns for ``[start, end)``."""
+    columns = pyramid.query(start, end, width)
+    peak = float(np.max(np.abs(columns[:, :2]))) if len(columns) else 0.0
+    if peak > 0:
+        columns[:, :2] /= peak
+    amplitude = np.where(
+        np.abs(columns[:, 1]) >= np.abs(columns[:, 0]), columns[:, 1], columns[:, 0]
+    )
+    return np.column_stack([amplitude, columns[:, 0], columns[:, 1]])
+
+
 class AudioState(rx.State):
-    waveform_data: list[WaveformPoint] = []
-    spectrum_data: list[SpectrumPoint] = []
+    waveform_payload: str = ""
+    waveform_duration: float = 0.0
+    spectrum_payload: str = ""
+    feature_track_id: str = ""
     is_processing_audio: bool = False
     processing_audio_message: str = ""
     visualization_type: VisualizationType = "waveform"
@@ -40,22 +52,42 @@ class AudioState(rx.State):
             self.processing_audio_message = "Extracting audio from video..."
         upload_dir = rx.get_upload_dir()
         video_path = upload_dir / video_file_name
-        audio_path = upload_dir / f"{video_file_name}.wav"
         try:
-            stream = ffmpeg.input(video_path)
-            stream = ffmpeg.output(
-                stream.audio, audio_path, ac=1, ar="44100", format="wav"
+            content_hash = await asyncio.to_thread(
+                content_hash_for, upload_dir, video_file_name
             )
-            ffmpeg.run(
-                stream, overwrite_output=True, capture_stdout=True, capture_stderr=True
+            probe = await probe_media(video_path, upload_dir, content_hash)
+        except (ProbeError, OSError) as e:
+            logging.exception(f"FFprobe error: {e}")
+            async with self:
+                self.is_processing_audio = False
+                self.processing_audio_message = "Failed to read video metadata."
+            return
+        if not probe["has_audio"]:
+            async with self:
+                self.is_processing_audio = False
+                self.processing_audio_message = "This video has no audio track."
+            return
+        num_points = 200
+        artifacts = artifact_dir(upload_dir, content_hash)
+
+        async def report_progress(fraction: float):
+            async with self:
+                self.processing_audio_message = (
+                    f"Analyzing audio... {int(fraction * 100)}%"
+                )
+
+        try:
+            analysis = await analyze_media(
+                video_path, artifacts, probe, progress=report_progress
             )
-        except ffmpeg.Error as e:
-            logging.exception(f"FFmpeg error: {e.stderr.decode()}")
+        except DecodeError as e:
+            logging.exception(f"FFmpeg error: {e}")
             async with self:
                 self.is_processing_audio = False
                 self.processing_audio_message = "Failed to extract audio."
             return
-        except FileNotFoundError as e:
+        except FileNotFoundError:
             logging.exception(
                 "FFmpeg not found. Please ensure it is installed and in the system's PATH."
             )
@@ -63,53 +95,26 @@ class AudioState(rx.State):
                 self.is_processing_audio = False
                 self.processing_audio_message = "FFmpeg not found."
             return
+        await asyncio.to_thread(get_upload_store().refresh, content_hash)
         async with self:
             self.processing_audio_message = "Generating waveform..."
-        from scipy.io import wavfile
-
-        sample_rate, audio_samples = wavfile.read(audio_path)
-        if audio_samples.dtype == np.int16:
-            audio_samples = audio_samples.astype(np.float32) / 32767.0
-        num_points = 200
-        step = len(audio_samples) // num_points
-        downsampled = audio_samples[::step][:num_points]
-        if np.max(np.abs(downsampled)) > 0:
-            downsampled = downsampled / np.max(np.abs(downsampled))
-        time_points = np.linspace(0, len(audio_samples) / sample_rate, num_points)
-        waveform = [
-            {"time": t, "amplitude": a} for t, a in zip(time_points, downsampled)
-        ]
+        pyramid = open_peaks(artifacts)
+        waveform = encode_waveform(
+            waveform_columns(pyramid, 0, pyramid.duration, num_points)
+        )
         async with self:
-            self.waveform_data = waveform
+            self.waveform_payload = waveform
+            self.waveform_duration = pyramid.duration
             self.processing_audio_message = "Generating spectrum..."
-        await asyncio.sleep(0.5)
-        num_bins = 64
-        fft_size = 2048
-        if len(audio_samples) > fft_size:
-            chunk = audio_samples[:fft_size]
-        else:
-            chunk = audio_samples
-        fft_result = fft(chunk)
-        n = len(chunk)
-        magnitude = np.abs(fft_result[: n // 2])
-        freqs = np.fft.fftfreq(n, 1 / sample_rate)[: n // 2]
-        bin_edges = np.logspace(np.log10(20), np.log10(sample_rate / 2), num_bins + 1)
-        bin_magnitudes = []
-        for i in range(num_bins):
-            mask = (freqs >= bin_edges[i]) & (freqs < bin_edges[i + 1])
-            if np.any(mask):
-                bin_magnitudes.append(np.mean(magnitude[mask]))
-            else:
-                bin_magnitudes.append(0)
-        bin_magnitudes = np.array(bin_magnitudes)
+        bin_magnitudes = np.array(analysis["spectrum"])
         if np.max(bin_magnitudes) > 0:
             bin_magnitudes = bin_magnitudes / np.max(bin_magnitudes)
-        spectrum = [
-            {"frequency": f, "magnitude": m}
-            for f, m in zip(bin_edges[:-1], bin_magnitudes)
-        ]
+        spectrum = encode_spectrum(
+            band_edges(analysis["sample_rate"])[:-1], bin_magnitudes
+        )
         async with self:
-            self.spectrum_data = spectrum
+            self.spectrum_payload = spectrum
+            self.feature_track_id = content_hash
             self.is_processing_audio = False
 
     @rx.event
@@ -126,7 +131,9 @@ class AudioState(rx.State):
 
     @rx.event
     def clear_visualizations(self):
-        self.waveform_data = []
-        self.spectrum_data = []
+        self.waveform_payload = ""
+        self.waveform_duration = 0.0
+        self.spectrum_payload = ""
+        self.feature_track_id = ""
         self.is_processing_audio = False
-        return ExportState.clear_export
\ No newline at end of file
+        return ExportState.clear_export
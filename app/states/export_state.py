@@ -1,10 +1,29 @@
 import reflex as rx
-from typing import Literal, TypedDict
+from typing import Literal
 import asyncio
+import logging
+from app.processing.artifacts import content_hash_for
+from app.processing.export import EXPORTS_DIRNAME, ExportSettings, output_size
+from app.processing.export_cache import export_cache_key
+from app.processing.probe import ProbeError, probe_media
+from app.processing.scheduler import (
+    FINISHED_STATUSES,
+    POLL_INTERVAL,
+    JobPriority,
+    get_export_scheduler,
+)
 
 ExportFormat = Literal["mp4", "mov", "avi"]
 ExportQuality = Literal["low", "medium", "high"]
 ExportResolution = Literal["480p", "720p", "1080p", "source"]
+ExportEngine = Literal["native", "python"]
+
+
+def _format_eta(seconds: float) -> str:
+    total = int(round(seconds))
+    if total < 60:
+        return f"{total}s"
+    return f"{total // 60}m {total % 60:02d}s"
 
 
 class ExportState(rx.State):
@@ -12,11 +31,16 @@ class ExportState(rx.State):
     export_format: ExportFormat = "mp4"
     export_quality: ExportQuality = "medium"
     export_resolution: ExportResolution = "source"
+    export_engine: ExportEngine = "native"
     is_exporting: bool = False
     export_progress: int = 0
     export_message: str = ""
     exported_video_url: str = ""
     cancel_export_flag: bool = False
+    export_priority: JobPriority = "normal"
+    export_job_id: str = ""
+    queue_position: int = 0
+    export_eta_seconds: float = 0.0
 
     @rx.event
     def toggle_export_modal(self):
@@ -34,38 +58,117 @@ class ExportState(rx.State):
     def set_export_resolution(self, resolution: ExportResolution):
         self.export_resolution = resolution
 
+    @rx.event
+    def set_export_engine(self, engine: ExportEngine):
+        self.export_engine = engine
+
+    @rx.event
+    def set_export_priority(self, priority: JobPriority):
+        self.export_priority = priority
+
     @rx.event
     def cancel_export(self):
         self.cancel_export_flag = True
+        if self.export_job_id:
+            get_export_scheduler().cancel(
+                self.export_job_id, self.router.session.client_token
+            )
 
     @rx.event(background=True)
     async def start_export(self, video_file_name: str):
+        from app.states.audio_state import AudioState
+
         async with self:
+            if not video_file_name:
+                return
             self.is_exporting = True
             self.export_progress = 0
             self.exported_video_url = ""
             self.cancel_export_flag = False
             self.export_message = "Preparing to export..."
-        for i in range(101):
+            audio_state = await self.get_state(AudioState)
+            settings: ExportSettings = {
+                "engine": self.export_engine,
+                "format": self.export_format,
+                "quality": self.export_quality,
+                "resolution": self.export_resolution,
+                "visualization_type": audio_state.visualization_type,
+                "color": audio_state.visualization_color,
+                "position": audio_state.visualization_position,
+            }
+        upload_dir = rx.get_upload_dir()
+        scheduler = get_export_scheduler()
+        try:
+            content_hash = await asyncio.to_thread(
+                content_hash_for, upload_dir, video_file_name
+            )
+            probe = await probe_media(
+                upload_dir / video_file_name, upload_dir, content_hash
+            )
+        except (ProbeError, OSError) as e:
+            logging.exception(f"Export failed: {e}")
+            async with self:
+                self.is_exporting = False
+                self.export_message = "Export failed."
+            return
+        async with self:
+            record = scheduler.submit(
+                self.router.session.client_token,
+                video_file_name,
+                settings,
+                probe["duration"] or 0.0,
+                self.export_priority,
+                export_cache_key(content_hash, settings),
+                size=output_size(probe, settings["resolution"]),
+            )
+            self.export_job_id = record["id"]
+        while record["status"] not in FINISHED_STATUSES:
+            await asyncio.sleep(POLL_INTERVAL)
+            record = scheduler.store.get(record["id"])
+            position = scheduler.position(record["id"])
             async with self:
                 if self.cancel_export_flag:
-                    self.is_exporting = False
-                    self.export_message = "Export cancelled."
-                    self.export_progress = 0
-                    return
-                self.export_progress = i
-                self.export_message = f"Exporting... {i}%"
-                if i == 50:
-                    self.export_message = "Applying visualizations..."
-            await asyncio.sleep(0.1)
+                    owner = self.router.session.client_token
+                    scheduler.cancel(record["id"], owner)
+                    if record["owner"] != owner:
+                        # Coalesced into another session's job: stop following it.
+                        record = {**record, "status": "cancelled"}
+                self.queue_position = position["position"] if position else 0
+                self.export_eta_seconds = position["eta_seconds"] if position else 0.0
+                eta = _format_eta(self.export_eta_seconds)
+                if record["status"] == "queued":
+                    self.export_message = (
+                        f"Queued, position {self.queue_position} (done in about {eta})"
+                    )
+                elif record["status"] == "running":
+                    self.export_progress = int(record["progress"] * 100)
+                    self.export_message = (
+                        f"Exporting... {self.export_progress}% "
+                        f"({record['fps']:.1f} fps, about {eta} left)"
+                    )
         async with self:
             self.is_exporting = False
-            self.export_message = "Export complete!"
-            self.exported_video_url = video_file_name
+            self.queue_position = 0
+            self.export_eta_seconds = 0.0
+            if record["status"] == "cancelled":
+                self.export_message = "Export cancelled."
+                self.export_progress = 0
+            elif record["status"] == "failed":
+                self.export_message = "Export failed."
+                self.export_progress = 0
+            else:
+                self.export_progress = 100
+                self.export_message = "Export complete!"
+                if record["peak_rss"]:
+                    self.export_message = (
+                        f"Export complete! (peak memory "
+                        f"{record['peak_rss'] / 2**20:.0f} MB)"
+                    )
+                self.exported_video_url = f"{EXPORTS_DIRNAME}/{record['export_name']}"
 
     @rx.event
     def clear_export(self):
         self.exported_video_url = ""
         self.is_exporting = False
         self.export_progress = 0
-        self.export_message = ""
\ No newline at end of file
+        self.export_message = ""
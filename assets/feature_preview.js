@@ -0,0 +1,147 @@
+// Draws the per-frame visualization into every <canvas data-feature-track>,
+// following the playhead of the video selected by its data-video attribute.
+// Feature rows are fetched from /api/features/<version>/<hash>/chunks/<n> in
+// windows of chunk_frames around the playhead and interpolated between frames
+// locally.
+(() => {
+  const KEEP_CHUNKS = 2;
+  const RETRY_MS = 2000;
+  const tracks = new Map();
+
+  function trackFor(url) {
+    let track = tracks.get(url);
+    if (!track) {
+      track = { info: null, chunks: new Map() };
+      tracks.set(url, track);
+      fetch(url)
+        .then((response) =>
+          response.ok ? response.json() : Promise.reject(response.status),
+        )
+        .then((info) => {
+          track.info = info;
+        })
+        .catch(() => setTimeout(() => tracks.delete(url), RETRY_MS));
+    }
+    return track;
+  }
+
+  function chunk(url, track, index) {
+    const { frames, chunk_frames: chunkFrames } = track.info;
+    if (index < 0 || index * chunkFrames >= frames) return null;
+    const cached = track.chunks.get(index);
+    if (cached !== undefined) return cached instanceof Uint8Array ? cached : null;
+    track.chunks.set(index, "pending");
+    fetch(`${url}/chunks/${index}`)
+      .then((response) =>
+        response.ok ? response.arrayBuffer() : Promise.reject(response.status),
+      )
+      .then((buffer) => track.chunks.set(index, new Uint8Array(buffer)))
+      .catch(() => setTimeout(() => track.chunks.delete(index), RETRY_MS));
+    return null;
+  }
+
+  function row(url, track, frame) {
+    const { num_bins: bins, wave_points: points, chunk_frames: chunkFrames } =
+      track.info;
+    const size = bins + points + 1;
+    const index = Math.floor(frame / chunkFrames);
+    const data = chunk(url, track, index);
+    if (!data) return null;
+    const offset = (frame - index * chunkFrames) * size;
+    if (offset + size > data.length) return null;
+    return data.subarray(offset, offset + size);
+  }
+
+  function prefetch(url, track, frame) {
+    const chunkFrames = track.info.chunk_frames;
+    const index = Math.floor(frame / chunkFrames);
+    if (frame % chunkFrames > chunkFrames * 0.75) chunk(url, track, index + 1);
+    for (const key of track.chunks.keys()) {
+      if (Math.abs(key - index) > KEEP_CHUNKS) track.chunks.delete(key);
+    }
+  }
+
+  // Interpolated bands in [0, 1] and wave points in [-1, 1] at time t.
+  function features(url, track, t) {
+    const { fps, frames, num_bins: bins, wave_points: points } = track.info;
+    const position = Math.min(Math.max(t * fps, 0), frames - 1);
+    const frame = Math.floor(position);
+    const next = Math.min(frame + 1, frames - 1);
+    const a = row(url, track, frame);
+    const b = row(url, track, next) || a;
+    prefetch(url, track, frame);
+    if (!a) return null;
+    const mix = position - frame;
+    const bands = new Float32Array(bins);
+    const wave = new Float32Array(points);
+    for (let i = 0; i < bins; i++) {
+      bands[i] = (a[i] * (1 - mix) + b[i] * mix) / 255;
+    }
+    for (let i = 0; i < points; i++) {
+      const from = (a[bins + i] << 24) >> 24;
+      const to = (b[bins + i] << 24) >> 24;
+      wave[i] = (from * (1 - mix) + to * mix) / 127;
+    }
+    return { bands, wave };
+  }
+
+  function drawSpectrum(context, bands, x, y, width, height) {
+    const step = width / bands.length;
+    const bar = Math.max(1, step * 0.8);
+    for (let i = 0; i < bands.length; i++) {
+      const h = bands[i] * height;
+      context.fillRect(x + i * step, y + height - h, bar, h);
+    }
+  }
+
+  function drawWaveform(context, wave, x, y, width, height) {
+    context.beginPath();
+    for (let i = 0; i < wave.length; i++) {
+      const px = x + (i / (wave.length - 1)) * width;
+      const py = y + height / 2 - (wave[i] * height) / 2;
+      if (i === 0) context.moveTo(px, py);
+      else context.lineTo(px, py);
+    }
+    context.lineWidth = Math.max(1, height / 60);
+    context.stroke();
+  }
+
+  function draw(canvas) {
+    const url = canvas.dataset.featureTrack;
+    const video = document.querySelector(canvas.dataset.video);
+    if (!url || !video) return;
+    const track = trackFor(url);
+    if (!track.info) return;
+    const ratio = window.devicePixelRatio || 1;
+    const width = Math.round(canvas.clientWidth * ratio);
+    const height = Math.round(canvas.clientHeight * ratio);
+    const style = canvas.dataset.style || "waveform";
+    const color = canvas.dataset.color || "#6200EA";
+    const key = `${video.currentTime}|${style}|${color}|${width}x${height}`;
+    if (canvas._featureKey === key) return;
+    const frame = features(url, track, video.currentTime);
+    if (!frame) return;
+    canvas._featureKey = key;
+    if (canvas.width !== width) canvas.width = width;
+    if (canvas.height !== height) canvas.height = height;
+    const context = canvas.getContext("2d");
+    context.clearRect(0, 0, width, height);
+    context.fillStyle = color;
+    context.strokeStyle = color;
+    if (style === "spectrum") {
+      drawSpectrum(context, frame.bands, 0, 0, width, height);
+    } else if (style === "both") {
+      drawWaveform(context, frame.wave, 0, 0, width, height / 2);
+      drawSpectrum(context, frame.bands, 0, height / 2, width, height / 2);
+    } else {
+      drawWaveform(context, frame.wave, 0, 0, width, height);
+    }
+  }
+
+  function loop() {
+    document.querySelectorAll("canvas[data-feature-track]").forEach(draw);
+    window.requestAnimationFrame(loop);
+  }
+
+  window.requestAnimationFrame(loop);
+})();
@@ -0,0 +1,80 @@
+// Chunked, resumable uploads for large files. Chunks are hashed with SHA-256,
+// sent in parallel and retried with backoff; an interrupted upload picks up
+// the chunks the server has not confirmed yet.
+window.resumableUpload = async function (inputId, apiUrl, parallel = 4) {
+  const input = document.getElementById(inputId);
+  const file = input && input.files && input.files[0];
+  if (!file) return "";
+  const progressEl = document.getElementById(inputId + "-progress");
+  const key = `resumable:${file.name}:${file.size}:${file.lastModified}`;
+
+  let status = null;
+  const savedId = localStorage.getItem(key);
+  if (savedId) {
+    const res = await fetch(`${apiUrl}/api/uploads/${savedId}`);
+    if (res.ok) status = await res.json();
+  }
+  if (!status) {
+    const res = await fetch(`${apiUrl}/api/uploads`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({
+        filename: file.name,
+        size: file.size,
+        content_type: file.type,
+      }),
+    });
+    if (!res.ok) throw new Error((await res.json()).error);
+    status = await res.json();
+    localStorage.setItem(key, status.upload_id);
+  }
+
+  const received = new Set(status.received_chunks);
+  const pending = [];
+  for (let i = 0; i < status.total_chunks; i++) {
+    if (!received.has(i)) pending.push(i);
+  }
+  let done = received.size;
+  const report = () => {
+    if (progressEl) {
+      progressEl.textContent = `${Math.floor((done * 100) / status.total_chunks)}%`;
+    }
+  };
+  report();
+
+  const sendChunk = async (index) => {
+    const start = index * status.chunk_size;
+    const end = Math.min(file.size, start + status.chunk_size);
+    const data = await file.slice(start, end).arrayBuffer();
+    const digest = new Uint8Array(await crypto.subtle.digest("SHA-256", data));
+    const checksum = Array.from(digest, (b) => b.toString(16).padStart(2, "0")).join("");
+    for (let attempt = 0; ; attempt++) {
+      let res = null;
+      try {
+        res = await fetch(
+          `${apiUrl}/api/uploads/${status.upload_id}/chunks/${index}`,
+          { method: "PUT", headers: { "X-Chunk-Sha256": checksum }, body: data },
+        );
+      } catch (e) {
+        if (attempt >= 5) throw e;
+      }
+      if (res && res.ok) return;
+      if (res && res.status < 500) {
+        throw new Error((await res.json()).error);
+      }
+      if (attempt >= 5) throw new Error(`Chunk ${index} failed to upload.`);
+      await new Promise((resolve) => setTimeout(resolve, 500 * 2 ** attempt));
+    }
+  };
+
+  const worker = async () => {
+    while (pending.length) {
+      await sendChunk(pending.shift());
+      done += 1;
+      report();
+    }
+  };
+  await Promise.all(Array.from({ length: parallel }, worker));
+  localStorage.removeItem(key);
+  return status.upload_id;
+};
@@ -0,0 +1,93 @@
+"""Compare the native filter-graph export with the Python overlay renderer.
+
+    python -m benchmarks.export_engines --duration 30 --size 1280x720
+
+Generates a synthetic clip with ffmpeg's lavfi sources, analyzes it once
+and then exports it with both engines for every visualization style.
+"""
+
+import argparse
+import asyncio
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from app.processing.analysis import analyze_media, open_features
+from app.processing.export import ExportJob, ExportSettings
+from app.processing.filtergraph import NATIVE_STYLES, NativeExportJob
+from app.processing.probe import run_ffprobe
+
+
+def generate_clip(path: Path, duration: float, size: str, fps: int):
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-nostdin",
+            "-y",
+            "-v",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            f"testsrc2=size={size}:rate={fps}:duration={duration}",
+            "-f",
+            "lavfi",
+            "-i",
+            f"sine=frequency=440:beep_factor=4:duration={duration}",
+            "-c:v",
+            "libx264",
+            "-preset",
+            "ultrafast",
+            "-c:a",
+            "aac",
+            "-shortest",
+            str(path),
+        ],
+        check=True,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--size", default="1280x720")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--quality", default="medium")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(tmp)
+        source = work_dir / "source.mp4"
+        generate_clip(source, args.duration, args.size, args.fps)
+        probe = asyncio.run(run_ffprobe(source))
+        analysis = asyncio.run(analyze_media(source, work_dir, probe))
+        features = open_features(work_dir, analysis)
+        print(f"{'engine':<8} {'style':<10} {'seconds':>8} {'fps':>8} {'realtime':>9}")
+        for style in NATIVE_STYLES:
+            for engine in ("native", "python"):
+                settings: ExportSettings = {
+                    "engine": engine,
+                    "format": "mp4",
+                    "quality": args.quality,
+                    "resolution": "source",
+                    "visualization_type": style,
+                    "color": "#6200EA",
+                    "position": "bottom",
+                }
+                destination = work_dir / f"{engine}_{style}.mp4"
+                if engine == "native":
+                    job = NativeExportJob(source, destination, probe, settings)
+                else:
+                    job = ExportJob(source, destination, probe, features, settings)
+                started = time.perf_counter()
+                job.run()
+                elapsed = time.perf_counter() - started
+                print(
+                    f"{engine:<8} {style:<10} {elapsed:>8.2f} "
+                    f"{job.total_frames / elapsed:>8.1f} "
+                    f"{args.duration / elapsed:>8.2f}x"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Measure overlay rendering speed in frames per second at common sizes.
+
+    python -m benchmarks.overlay_render --frames 240
+    python -m benchmarks.overlay_render --sizes 1920x1080 --positions overlay
+
+Renders random feature rows onto a flat frame for every style, once a row
+at a time through ``render`` and once through ``rasterize`` in batches of
+``--batch`` rows followed by ``composite`` per frame, as the exporter does.
+"""
+
+import argparse
+import time
+import numpy as np
+from app.processing.features import WAVE_POINTS
+from app.processing.render import RENDER_BATCH, OverlayRenderer
+from app.processing.spectrogram import NUM_BANDS
+
+SIZES = ["1280x720", "1920x1080", "3840x2160"]
+STYLES = ["waveform", "spectrum", "both"]
+
+
+def single_fps(
+    renderer: OverlayRenderer,
+    frame: np.ndarray,
+    bands: np.ndarray,
+    wave: np.ndarray,
+) -> float:
+    started = time.perf_counter()
+    for index in range(len(bands)):
+        renderer.render(frame, bands[index], wave[index])
+    return len(bands) / (time.perf_counter() - started)
+
+
+def batched_fps(
+    renderer: OverlayRenderer,
+    frame: np.ndarray,
+    bands: np.ndarray,
+    wave: np.ndarray,
+    batch: int,
+) -> float:
+    started = time.perf_counter()
+    for start in range(0, len(bands), batch):
+        strip = renderer.rasterize(
+            bands[start : start + batch], wave[start : start + batch]
+        )
+        for index in range(len(strip["first"])):
+            renderer.composite(frame, strip, index)
+    return len(bands) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=120)
+    parser.add_argument("--sizes", nargs="+", default=SIZES)
+    parser.add_argument("--styles", nargs="+", choices=STYLES, default=STYLES)
+    parser.add_argument(
+        "--positions",
+        nargs="+",
+        choices=["bottom", "top", "overlay"],
+        default=["bottom"],
+    )
+    parser.add_argument("--batch", type=int, default=RENDER_BATCH)
+    parser.add_argument("--color", default="#6200EA")
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    bands = rng.uniform(0, 1, (args.frames, NUM_BANDS)).astype(np.float32)
+    wave = rng.uniform(-1, 1, (args.frames, WAVE_POINTS)).astype(np.float32)
+    print(f"{'size':>10} {'position':>8} {'style':>9} {'single':>10} {'batched':>10}")
+    for size in args.sizes:
+        width, height = map(int, size.split("x"))
+        frame = np.full((height, width, 3), 96, dtype=np.uint8)
+        for position in args.positions:
+            for style in args.styles:
+                renderer = OverlayRenderer(
+                    width, height, style, args.color, position, args.batch
+                )
+                single = single_fps(renderer, frame, bands, wave)
+                batched = batched_fps(renderer, frame, bands, wave, args.batch)
+                print(
+                    f"{size:>10} {position:>8} {style:>9} "
+                    f"{single:>6.1f} fps {batched:>6.1f} fps"
+                )
+
+
+if __name__ == "__main__":
+    main()
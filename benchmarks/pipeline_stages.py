@@ -0,0 +1,359 @@
+"""Time every pipeline stage on synthetic media and check for regressions.
+
+    python -m benchmarks.pipeline_stages --durations 10 60 --sizes 1280x720
+    python -m benchmarks.pipeline_stages --save-baseline benchmarks/pipeline_baseline.json
+
+Clips are generated with ffmpeg's lavfi sources (``testsrc2`` video with a
+``sine`` or pink-noise soundtrack), so every run measures identical input.
+Each stage runs on its own: probe, PCM decode, peak pyramid, STFT, overlay
+rendering and encoding. The encoder is fed real frames of the clip, decoded
+up front into a pool of at most ``ENCODE_POOL_BYTES`` that is played forward
+and back, so motion stays continuous without a scene cut at the loop.
+Results are reported as a realtime multiple (media seconds per wall
+second), MB/s of input to the stage and the peak RSS the stage added. With
+a baseline, a stage whose realtime multiple drops or whose peak memory
+grows by more than the tolerance is reported as a regression and the exit
+status is 1.
+"""
+
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, TypedDict
+import numpy as np
+from app.processing.decode import BLOCK_FRAMES, SAMPLE_RATE, decode_pcm
+from app.processing.export import ExportSettings, decode_command, encode_command
+from app.processing.features import WAVE_POINTS
+from app.processing.memory import MemoryTracker
+from app.processing.peaks import PeakPyramidBuilder
+from app.processing.probe import run_ffprobe
+from app.processing.render import OverlayRenderer
+from app.processing.spectrogram import NUM_BANDS, SpectrogramEngine
+
+BASELINE_PATH = Path(__file__).with_name("pipeline_baseline.json")
+BASELINE_VERSION = 1
+AUDIO_SOURCES = {
+    "sine": "sine=frequency=440:beep_factor=4:sample_rate=48000",
+    "noise": "anoisesrc=color=pink:amplitude=0.5:sample_rate=48000:seed=1",
+}
+DEFAULT_TOLERANCES = {"realtime": 0.15, "peak_rss": 0.25}
+# Peak RSS differences below this are sampling noise, not regressions.
+MEMORY_SLACK = 16 * 1024 * 1024
+FPS = 30
+ENCODE_POOL_BYTES = 256 * 1024 * 1024
+
+
+class StageResult(TypedDict):
+    seconds: float
+    realtime: float
+    mb_per_second: float
+    peak_rss: int
+
+
+def generate_clip(path: Path, duration: float, size: str, audio: str):
+    if path.exists():
+        return
+    partial = path.with_name(f".{path.stem}.part{path.suffix}")
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-nostdin",
+            "-y",
+            "-v",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            f"testsrc2=size={size}:rate={FPS}:duration={duration}",
+            "-f",
+            "lavfi",
+            "-i",
+            f"{AUDIO_SOURCES[audio]}:duration={duration}",
+            "-c:v",
+            "libx264",
+            "-preset",
+            "ultrafast",
+            "-c:a",
+            "aac",
+            "-shortest",
+            str(partial),
+        ],
+        check=True,
+    )
+    partial.replace(path)
+
+
+def measure(
+    name: str, run: Callable[[], int], media_seconds: float, repeats: int
+) -> StageResult:
+    """Best-of-``repeats`` timing of ``run``, which returns the bytes it consumed."""
+    best = float("inf")
+    peak = 0
+    for _ in range(repeats):
+        with MemoryTracker("benchmark", name) as memory:
+            started = time.perf_counter()
+            consumed = run()
+            elapsed = time.perf_counter() - started
+        best = min(best, elapsed)
+        peak = max(peak, memory.peak_job_rss)
+    return {
+        "seconds": best,
+        "realtime": media_seconds / best,
+        "mb_per_second": consumed / best / 1e6,
+        "peak_rss": peak,
+    }
+
+
+async def _decode(source: Path) -> list[np.ndarray]:
+    return [block async for block in decode_pcm(source)]
+
+
+def decode_frames(source: Path, size: tuple[int, int], count: int) -> np.ndarray:
+    """The first ``count`` frames of ``source`` as ``(count, height, width, 3)``."""
+    width, height = size
+    process = subprocess.run(
+        decode_command(source, size, FPS, duration=count / FPS),
+        capture_output=True,
+        check=True,
+    )
+    frame_bytes = width * height * 3
+    count = len(process.stdout) // frame_bytes
+    return np.frombuffer(process.stdout, np.uint8, count * frame_bytes).reshape(
+        count, height, width, 3
+    )
+
+
+def run_case(
+    source: Path,
+    duration: float,
+    size: str,
+    settings: ExportSettings,
+    repeats: int,
+) -> dict[str, StageResult]:
+    width, height = (int(value) for value in size.split("x"))
+    frames = int(duration * FPS)
+    frame_bytes = width * height * 3
+    probe = asyncio.run(run_ffprobe(source))
+
+    def probe_stage() -> int:
+        asyncio.run(run_ffprobe(source))
+        return source.stat().st_size
+
+    def decode_stage() -> int:
+        async def consume() -> int:
+            return sum([block.nbytes async for block in decode_pcm(source)])
+
+        return asyncio.run(consume())
+
+    # Decoded once outside the timings, so the analysis stages see only their own cost.
+    pcm = np.concatenate(asyncio.run(_decode(source)))
+    blocks = [pcm[i : i + BLOCK_FRAMES] for i in range(0, len(pcm), BLOCK_FRAMES)]
+
+    def peaks_stage() -> int:
+        builder = PeakPyramidBuilder(SAMPLE_RATE, len(pcm))
+        for block in blocks:
+            builder.push(block)
+        return pcm.nbytes
+
+    def stft_stage() -> int:
+        engine = SpectrogramEngine(SAMPLE_RATE, lambda rows: None)
+        for block in blocks:
+            engine.push(block)
+        engine.finish()
+        return pcm.nbytes
+
+    rng = np.random.default_rng(0)
+    bands = rng.uniform(0, 1, (frames, NUM_BANDS)).astype(np.float32)
+    wave = rng.uniform(-1, 1, (frames, WAVE_POINTS)).astype(np.float32)
+    frame = np.full((height, width, 3), 96, dtype=np.uint8)
+
+    def render_stage() -> int:
+        renderer = OverlayRenderer(
+            width,
+            height,
+            settings["visualization_type"],
+            settings["color"],
+            settings["position"],
+        )
+        for start in range(0, frames, renderer.batch):
+            stop = start + renderer.batch
+            strip = renderer.rasterize(bands[start:stop], wave[start:stop])
+            for index in range(len(strip["first"])):
+                renderer.composite(frame, strip, index)
+        return frames * frame_bytes
+
+    # Decoded outside the timing; the sequence ping-pongs over the pool.
+    pool = decode_frames(
+        source, (width, height), min(frames, max(2, ENCODE_POOL_BYTES // frame_bytes))
+    )
+    sequence = [*range(len(pool)), *range(len(pool) - 2, 0, -1)]
+
+    def encode_stage() -> int:
+        with tempfile.TemporaryDirectory() as tmp:
+            destination = Path(tmp) / f"encoded.{settings['format']}"
+            command = encode_command(
+                source, destination, (width, height), FPS, settings, False
+            )
+            process = subprocess.Popen(
+                command, stdin=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+            for index in range(frames):
+                process.stdin.write(pool[sequence[index % len(sequence)]].data)
+            _, stderr = process.communicate()
+            if process.returncode != 0:
+                raise RuntimeError(stderr.decode(errors="replace").strip())
+        return frames * frame_bytes
+
+    media_seconds = probe["duration"] or duration
+    stages = {
+        "probe": probe_stage,
+        "decode": decode_stage,
+        "peaks": peaks_stage,
+        "stft": stft_stage,
+        "render": render_stage,
+        "encode": encode_stage,
+    }
+    return {
+        stage: measure(f"{source.stem}/{stage}", run, media_seconds, repeats)
+        for stage, run in stages.items()
+    }
+
+
+def compare(
+    results: dict[str, StageResult],
+    baseline: dict[str, StageResult],
+    tolerances: dict[str, float],
+) -> list[str]:
+    """Descriptions of every stage that regressed beyond its tolerance.
+
+    ``tolerances`` holds fractions for ``realtime`` and ``peak_rss``; a
+    ``<stage>`` or ``<case>/<stage>`` key overrides the realtime tolerance.
+    """
+    regressions = []
+    for key, result in results.items():
+        reference = baseline.get(key)
+        if reference is None:
+            continue
+        stage = key.rsplit("/", 1)[-1]
+        tolerance = tolerances.get(key, tolerances.get(stage, tolerances["realtime"]))
+        floor = reference["realtime"] * (1 - tolerance)
+        if result["realtime"] < floor:
+            regressions.append(
+                f"{key}: {result['realtime']:.2f}x realtime, "
+                f"baseline {reference['realtime']:.2f}x (-{tolerance:.0%} allowed)"
+            )
+        ceiling = reference["peak_rss"] * (1 + tolerances["peak_rss"]) + MEMORY_SLACK
+        if result["peak_rss"] > ceiling:
+            regressions.append(
+                f"{key}: peak {result['peak_rss'] / 2**20:.0f} MB, "
+                f"baseline {reference['peak_rss'] / 2**20:.0f} MB "
+                f"(+{tolerances['peak_rss']:.0%} allowed)"
+            )
+    return regressions
+
+
+def parse_tolerance(value: str) -> tuple[str, float]:
+    key, _, fraction = value.rpartition("=")
+    if not key:
+        raise argparse.ArgumentTypeError("expected STAGE=FRACTION")
+    return key, float(fraction)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--durations", type=float, nargs="+", default=[10.0, 60.0])
+    parser.add_argument(
+        "--sizes", nargs="+", default=["640x360", "1280x720", "1920x1080"]
+    )
+    parser.add_argument("--audio", choices=AUDIO_SOURCES, default="sine")
+    parser.add_argument("--style", default="both")
+    parser.add_argument("--format", default="mp4")
+    parser.add_argument("--quality", default="medium")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--media-dir", type=Path, help="keep generated clips here")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", type=Path)
+    parser.add_argument("--tolerance", type=float, help="realtime regression fraction")
+    parser.add_argument("--memory-tolerance", type=float)
+    parser.add_argument(
+        "--stage-tolerance",
+        type=parse_tolerance,
+        action="append",
+        default=[],
+        metavar="STAGE=FRACTION",
+    )
+    args = parser.parse_args()
+    settings: ExportSettings = {
+        "engine": "python",
+        "format": args.format,
+        "quality": args.quality,
+        "resolution": "source",
+        "visualization_type": args.style,
+        "color": "#6200EA",
+        "position": "bottom",
+    }
+
+    results: dict[str, StageResult] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        media_dir = args.media_dir or Path(tmp)
+        media_dir.mkdir(parents=True, exist_ok=True)
+        print(
+            f"{'case':<22} {'stage':<7} {'seconds':>8} {'realtime':>9} "
+            f"{'MB/s':>8} {'peak MB':>8}"
+        )
+        for duration in args.durations:
+            for size in args.sizes:
+                case = f"{duration:g}s-{size}-{args.audio}"
+                source = media_dir / f"{case}.mp4"
+                generate_clip(source, duration, size, args.audio)
+                for stage, result in run_case(
+                    source, duration, size, settings, args.repeats
+                ).items():
+                    results[f"{case}/{stage}"] = result
+                    print(
+                        f"{case:<22} {stage:<7} {result['seconds']:>8.3f} "
+                        f"{result['realtime']:>8.1f}x "
+                        f"{result['mb_per_second']:>8.1f} "
+                        f"{result['peak_rss'] / 2**20:>8.1f}"
+                    )
+
+    if args.save_baseline:
+        args.save_baseline.write_text(
+            json.dumps(
+                {
+                    "version": BASELINE_VERSION,
+                    "tolerances": DEFAULT_TOLERANCES,
+                    "results": results,
+                },
+                indent=2,
+            )
+        )
+        print(f"Saved baseline to {args.save_baseline}")
+        return
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+    stored = json.loads(args.baseline.read_text())
+    if stored.get("version") != BASELINE_VERSION:
+        sys.exit(f"Baseline {args.baseline} has an unsupported version")
+    tolerances = {**DEFAULT_TOLERANCES, **stored.get("tolerances", {})}
+    if args.tolerance is not None:
+        tolerances["realtime"] = args.tolerance
+    if args.memory_tolerance is not None:
+        tolerances["peak_rss"] = args.memory_tolerance
+    tolerances.update(args.stage_tolerance)
+    if regressions := compare(results, stored["results"], tolerances):
+        print("Regressions against the baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print(f"No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Compare the chart payloads as JSON lists of points and as packed base64.
+
+    python -m benchmarks.wire_format --points 200
+
+Measures what the state update for the waveform and spectrum costs on the
+websocket: encoded size and the time to build and serialize it.
+"""
+
+import argparse
+import json
+import time
+import numpy as np
+from app.processing.spectrogram import band_edges
+from app.processing.wire import encode_spectrum, encode_waveform
+
+
+def points_payload(columns: np.ndarray, frequencies, magnitudes, duration) -> str:
+    times = np.linspace(0, duration, len(columns))
+    waveform = [
+        {"time": float(t), "amplitude": float(a), "min": float(lo), "max": float(hi)}
+        for t, (a, lo, hi) in zip(times, columns)
+    ]
+    spectrum = [
+        {"frequency": float(f), "magnitude": float(m)}
+        for f, m in zip(frequencies, magnitudes)
+    ]
+    return json.dumps({"waveform_data": waveform, "spectrum_data": spectrum})
+
+
+def packed_payload(columns: np.ndarray, frequencies, magnitudes, duration) -> str:
+    return json.dumps(
+        {
+            "waveform_payload": encode_waveform(columns),
+            "waveform_duration": duration,
+            "spectrum_payload": encode_spectrum(frequencies, magnitudes),
+        }
+    )
+
+
+def measure(build, repeats: int, *args) -> tuple[int, float]:
+    started = time.perf_counter()
+    for _ in range(repeats):
+        payload = build(*args)
+    return len(payload.encode()), (time.perf_counter() - started) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=180.0)
+    parser.add_argument("--repeats", type=int, default=1000)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    columns = rng.uniform(-1, 1, (args.points, 3))
+    frequencies = band_edges(44100)[:-1]
+    magnitudes = rng.uniform(0, 1, len(frequencies))
+    results = {
+        "points": measure(
+            points_payload,
+            args.repeats,
+            columns,
+            frequencies,
+            magnitudes,
+            args.duration,
+        ),
+        "packed": measure(
+            packed_payload,
+            args.repeats,
+            columns,
+            frequencies,
+            magnitudes,
+            args.duration,
+        ),
+    }
+    for name, (size, seconds) in results.items():
+        print(f"{name:<8} {size:>8} bytes  {seconds * 1e6:>8.1f} us")
+    ratio = results["points"][0] / results["packed"][0]
+    print(f"packed payload is {ratio:.1f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
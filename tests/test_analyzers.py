@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from app.processing.analyzers import ANALYZERS, Analyzer, FrameSplitter
+from app.processing.features import WAVE_POINTS, FeatureTrackBuilder
+from app.processing.npy import NpyRowWriter
+from app.processing.spectrogram import NUM_BANDS
+
+# Fractional hops: 48 kHz and 44.1 kHz at NTSC and film rates.
+RATES = [
+    (48000, 30000 / 1001),
+    (48000, 24000 / 1001),
+    (44100, 30000 / 1001),
+    (44100, 24.0),
+]
+
+
+def split(sample_rate: int, fps: float, length: int, block: int):
+    splitter = FrameSplitter(sample_rate, fps, 1)
+    signal = np.arange(length, dtype=np.float32)[:, None]
+    frames = []
+    for start in range(0, length + 1, block):
+        final = start + block > length
+        samples, starts = splitter.push(signal[start : start + block], final)
+        if len(starts):
+            frames += np.split(samples[:, 0], starts[1:])
+        if final:
+            break
+    return frames
+
+
+@pytest.mark.parametrize("sample_rate, fps", RATES)
+@pytest.mark.parametrize("block", [1, 1000, 4096])
+def test_frames_cover_the_signal_without_empty_frames(sample_rate, fps, block):
+    hop = sample_rate / fps
+    for length in [
+        *range(1, 40),
+        *(round(k * hop) + d for k in range(1, 8) for d in (-1, 0, 1)),
+    ]:
+        frames = split(sample_rate, fps, length, block)
+        assert all(len(frame) for frame in frames)
+        assert np.array_equal(np.concatenate(frames), np.arange(length))
+        assert [int(frame[0]) for frame in frames] == [
+            round(k * hop) for k in range(len(frames))
+        ]
+
+
+def test_final_frame_starting_at_the_end_is_not_emitted():
+    # round(1 * 1601.6) == 1602: a second frame would hold no samples.
+    assert [len(frame) for frame in split(48000, 30000 / 1001, 1602, 4096)] == [1602]
+
+
+@pytest.mark.parametrize("sample_rate, fps", RATES)
+@pytest.mark.parametrize("frames", [1, 2, 7])
+def test_feature_track_matches_the_splitter_frames(tmp_path, sample_rate, fps, frames):
+    hop = sample_rate / fps
+    for length in (round(frames * hop) + d for d in (-1, 0, 1)):
+        writer = NpyRowWriter(tmp_path / "features.npy", NUM_BANDS + WAVE_POINTS + 1)
+        builder = FeatureTrackBuilder(sample_rate, fps, writer)
+        builder.push(np.full(length, 0.1, dtype=np.float32))
+        info = builder.finish()
+        writer.close()
+        assert info["frames"] == len(split(sample_rate, fps, length, 4096))
+
+
+def test_analyzer_requires_push_and_stats(tmp_path):
+    class Incomplete(Analyzer):
+        name = "incomplete"
+
+        def push(self, block: np.ndarray):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete(48000, 1, 30.0, tmp_path, ["value"])
+
+
+@pytest.mark.parametrize("name", ["loudness", "channel_levels"])
+def test_analyzers_flush_fractional_lengths(tmp_path, name):
+    analyzer = ANALYZERS[name](48000, 2, 30000 / 1001, tmp_path)
+    analyzer.push(np.full((1602, 2), 0.1, dtype=np.float32))
+    assert analyzer.finish()["frames"] == 1
@@ -0,0 +1,71 @@
+import os
+import pytest
+from app.processing.export_cache import ExportCache, export_cache_key
+
+SETTINGS = {"format": "mp4", "quality": "medium"}
+
+
+def export(cache: ExportCache, name: str, size: int, age: float = 0.0) -> str:
+    output = cache.exports_dir / name
+    output.write_bytes(os.urandom(size))
+    key = export_cache_key(name, SETTINGS)
+    cache.store(key, SETTINGS, output)
+    for path in (output, cache.directory / f"{key}.mp4"):
+        os.utime(path, (1e9 - age, 1e9 - age))
+    return key
+
+
+@pytest.fixture
+def cache(tmp_path) -> ExportCache:
+    exports = tmp_path / "exports"
+    exports.mkdir()
+    return ExportCache(tmp_path / "cache", exports, max_bytes=2500)
+
+
+def test_key_depends_on_source_and_settings():
+    key = export_cache_key("abc", SETTINGS)
+    assert key == export_cache_key("abc", dict(reversed(SETTINGS.items())))
+    assert key != export_cache_key("abd", SETTINGS)
+    assert key != export_cache_key("abc", {**SETTINGS, "quality": "high"})
+
+
+def test_entries_share_the_export_inode(cache):
+    export(cache, "a.mp4", 1000)
+    export(cache, "b.mp4", 1000)
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["bytes"] == 2000
+
+
+def test_eviction_removes_the_oldest_entry_and_its_export(cache):
+    oldest = export(cache, "a.mp4", 1000, age=30)
+    export(cache, "b.mp4", 1000, age=20)
+    export(cache, "c.mp4", 1000)
+    assert not (cache.directory / f"{oldest}.mp4").exists()
+    assert sorted(p.name for p in cache.exports_dir.iterdir()) == ["b.mp4", "c.mp4"]
+    assert cache.stats()["bytes"] == 2000
+
+
+def test_fetch_marks_an_entry_as_recently_used(tmp_path, cache):
+    first = export(cache, "a.mp4", 1000, age=30)
+    second = export(cache, "b.mp4", 1000, age=20)
+    (cache.exports_dir / "a.mp4").unlink()
+    assert cache.fetch(first, SETTINGS, cache.exports_dir / "a.mp4")
+    export(cache, "c.mp4", 1000)
+    assert (cache.directory / f"{first}.mp4").exists()
+    assert not (cache.directory / f"{second}.mp4").exists()
+    assert cache.hits == 1
+
+
+def test_exports_being_written_are_counted_but_kept(cache):
+    (cache.exports_dir / "partial.mp4").write_bytes(b"x" * 1500)
+    oldest = export(cache, "a.mp4", 600, age=30)
+    export(cache, "b.mp4", 600)
+    assert (cache.exports_dir / "partial.mp4").exists()
+    assert not (cache.directory / f"{oldest}.mp4").exists()
+    assert cache.stats()["bytes"] == 2100
+
+
+def test_fetch_misses_unknown_keys(tmp_path, cache):
+    assert not cache.fetch("0" * 64, SETTINGS, tmp_path / "out.mp4")
+    assert not (tmp_path / "out.mp4").exists()
+    assert cache.misses == 1
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from app.processing.peaks import PeakPyramid, PeakPyramidBuilder
+
+SAMPLE_RATE = 1000
+LEVELS = (4, 16, 64)
+
+
+def build(tmp_path, signal: np.ndarray, block: int = 777) -> PeakPyramid:
+    builder = PeakPyramidBuilder(SAMPLE_RATE, len(signal), LEVELS)
+    for start in range(0, len(signal), block):
+        builder.push(signal[start : start + block])
+    return builder.finish(tmp_path / "peaks.bin")
+
+
+def signal(length: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return rng.uniform(-1, 1, length).astype(np.float32)
+
+
+@pytest.mark.parametrize("length", [1, 63, 64, 1000, 10_007])
+@pytest.mark.parametrize("width", [1, 7, 100])
+def test_query_covers_the_extremes_of_the_range(tmp_path, length, width):
+    samples = signal(length)
+    pyramid = build(tmp_path, samples)
+    columns = pyramid.query(0.0, pyramid.duration, width)
+    assert columns.shape == (width, 3)
+    assert columns.dtype == np.float32
+    # Values are stored as float16.
+    assert columns[:, 0].min() == pytest.approx(samples.min(), abs=1e-3)
+    assert columns[:, 1].max() == pytest.approx(samples.max(), abs=1e-3)
+    assert np.all(columns[:, 0] <= columns[:, 1])
+    assert np.all(columns[:, 2] >= 0)
+
+
+@pytest.mark.parametrize("width", [10, 40, 160])
+def test_query_columns_match_the_samples(tmp_path, width):
+    samples = np.repeat(np.linspace(-1, 1, 40, dtype=np.float32), 64)
+    pyramid = build(tmp_path, samples)
+    columns = pyramid.query(0.0, pyramid.duration, width)
+    step = len(samples) // width
+    for i, column in enumerate(columns):
+        start = i * step // 4 * 4
+        stop = -(-(i + 1) * step // 4) * 4
+        window = samples[start:stop]
+        assert column[0] == pytest.approx(window.min(), abs=2e-3)
+        assert column[1] == pytest.approx(window.max(), abs=2e-3)
+
+
+def test_query_of_a_subrange_ignores_buckets_outside_it(tmp_path):
+    # 40 samples per pixel reads the 16-sample level; [1, 3) s spans buckets
+    # 62 to 187, so the edges are rounded out to samples 992 and 3008.
+    samples = np.zeros(4000, dtype=np.float32)
+    samples[:992] = 1.0
+    samples[3008:] = -1.0
+    pyramid = build(tmp_path, samples)
+    columns = pyramid.query(1.0, 3.0, 50)
+    assert np.all(columns == 0)
+
+
+@pytest.mark.parametrize(
+    "start, end, width", [(2.0, 1.0, 10), (5.0, 6.0, 10), (0.0, 1.0, 0)]
+)
+def test_empty_queries_return_zeros(tmp_path, start, end, width):
+    pyramid = build(tmp_path, signal(2000))
+    columns = pyramid.query(start, end, width)
+    assert columns.shape == (width, 3)
+    assert not columns.any()
+
+
+def test_rms_of_a_constant_signal(tmp_path):
+    pyramid = build(tmp_path, np.full(5000, -0.5, dtype=np.float32))
+    columns = pyramid.query(0.0, pyramid.duration, 20)
+    assert np.allclose(columns, [-0.5, -0.5, 0.5], atol=1e-3)
+
+
+def test_levels_must_nest():
+    with pytest.raises(ValueError):
+        PeakPyramidBuilder(SAMPLE_RATE, levels=(4, 10))
@@ -0,0 +1,106 @@
+import pytest
+from app.processing.probe import PROBE_CACHE_VERSION, parse_probe_output
+
+VIDEO = {
+    "codec_type": "video",
+    "codec_name": "h264",
+    "width": 1920,
+    "height": 1080,
+    "avg_frame_rate": "30000/1001",
+    "r_frame_rate": "30/1",
+    "bit_rate": "4000000",
+}
+AUDIO = {
+    "codec_type": "audio",
+    "codec_name": "aac",
+    "sample_rate": "48000",
+    "channels": 2,
+    "channel_layout": "stereo",
+    "bit_rate": "128000",
+}
+COVER = {
+    "codec_type": "video",
+    "codec_name": "mjpeg",
+    "width": 600,
+    "height": 600,
+    "disposition": {"attached_pic": 1},
+}
+
+
+def test_parses_video_and_audio_streams():
+    result = parse_probe_output(
+        {
+            "format": {
+                "format_name": "mov,mp4,m4a",
+                "duration": "12.5",
+                "bit_rate": "4128000",
+                "size": "6450000",
+            },
+            "streams": [VIDEO, AUDIO],
+        },
+        0.25,
+    )
+    assert result == {
+        "version": PROBE_CACHE_VERSION,
+        "format_name": "mov,mp4,m4a",
+        "duration": 12.5,
+        "bit_rate": 4128000,
+        "size": 6450000,
+        "has_video": True,
+        "video_codec": "h264",
+        "width": 1920,
+        "height": 1080,
+        "fps": pytest.approx(30000 / 1001),
+        "video_bit_rate": 4000000,
+        "has_audio": True,
+        "audio_codec": "aac",
+        "sample_rate": 48000,
+        "channels": 2,
+        "channel_layout": "stereo",
+        "audio_bit_rate": 128000,
+        "probe_seconds": 0.25,
+    }
+
+
+def test_cover_art_is_not_the_video_stream():
+    result = parse_probe_output({"streams": [COVER, AUDIO]}, 0.0)
+    assert not result["has_video"]
+    assert result["width"] is None
+    assert result["fps"] is None
+    assert result["has_audio"]
+
+
+@pytest.mark.parametrize(
+    "avg_frame_rate, r_frame_rate, fps",
+    [
+        ("0/0", "25/1", 25.0),
+        ("", "24000/1001", 24000 / 1001),
+        ("30/0", "30/1", 30.0),
+        ("0/0", "0/0", None),
+        ("abc", None, None),
+    ],
+)
+def test_frame_rate_falls_back_to_the_base_rate(avg_frame_rate, r_frame_rate, fps):
+    video = {**VIDEO, "avg_frame_rate": avg_frame_rate, "r_frame_rate": r_frame_rate}
+    result = parse_probe_output({"streams": [video]}, 0.0)
+    assert result["fps"] == (pytest.approx(fps) if fps else None)
+
+
+def test_missing_and_malformed_fields_become_none():
+    video = {**VIDEO, "duration": "8.0", "width": "N/A", "bit_rate": None}
+    result = parse_probe_output(
+        {"format": {"duration": "N/A", "size": "big"}, "streams": [video]}, 0.0
+    )
+    assert result["duration"] == 8.0
+    assert result["size"] is None
+    assert result["width"] is None
+    assert result["video_bit_rate"] is None
+    assert not result["has_audio"]
+    assert result["sample_rate"] is None
+
+
+def test_empty_output_has_no_streams():
+    result = parse_probe_output({}, 0.0)
+    assert not result["has_video"]
+    assert not result["has_audio"]
+    assert result["duration"] is None
@@ -0,0 +1,104 @@
+import pytest
+from app.processing.scheduler import JobRecord, dispatch_order, estimate_queue
+
+
+def job(
+    id: str,
+    owner: str = "a",
+    priority: str = "normal",
+    created: float = 0.0,
+    media_seconds: float = 60.0,
+    started: float | None = None,
+    progress: float = 0.0,
+) -> JobRecord:
+    return {
+        "id": id,
+        "owner": owner,
+        "priority": priority,
+        "status": "queued" if started is None else "running",
+        "video_file_name": f"{id}.mp4",
+        "export_name": f"{id}_visualized.mp4",
+        "settings": {},
+        "media_seconds": media_seconds,
+        "cache_key": None,
+        "width": None,
+        "height": None,
+        "created": created,
+        "started": started,
+        "finished": None,
+        "progress": progress,
+        "fps": 0.0,
+        "peak_rss": None,
+        "error": None,
+    }
+
+
+def ids(jobs: list[JobRecord]) -> list[str]:
+    return [job["id"] for job in jobs]
+
+
+def test_higher_priority_goes_first():
+    queued = [
+        job("batch", priority="batch", created=0),
+        job("normal", priority="normal", created=1),
+        job("interactive", priority="interactive", created=2),
+    ]
+    assert ids(dispatch_order(queued, [])) == ["interactive", "normal", "batch"]
+
+
+def test_owners_take_turns_within_a_priority():
+    queued = [
+        job("a1", "a", created=0),
+        job("a2", "a", created=1),
+        job("a3", "a", created=2),
+        job("b1", "b", created=3),
+        job("c1", "c", created=4),
+        job("b2", "b", created=5),
+    ]
+    assert ids(dispatch_order(queued, [])) == ["a1", "b1", "c1", "a2", "b2", "a3"]
+
+
+def test_running_jobs_count_against_their_owner():
+    running = [job("a0", "a", started=0), job("a00", "a", started=0)]
+    queued = [job("a1", "a", created=0), job("b1", "b", created=1)]
+    assert ids(dispatch_order(queued, running)) == ["b1", "a1"]
+
+
+def test_priority_beats_fairness():
+    running = [job("b0", "b", started=0)]
+    queued = [
+        job("a1", "a", created=0, priority="batch"),
+        job("b1", "b", created=1, priority="interactive"),
+    ]
+    assert ids(dispatch_order(queued, running)) == ["b1", "a1"]
+
+
+@pytest.mark.parametrize(
+    "limit, expected",
+    [
+        (1, {"q1": (1, 30.0), "q2": (2, 50.0), "q3": (3, 90.0)}),
+        (2, {"q1": (1, 20.0), "q2": (2, 30.0), "q3": (3, 60.0)}),
+        (4, {"q1": (1, 20.0), "q2": (2, 20.0), "q3": (3, 40.0)}),
+    ],
+)
+def test_queue_estimates_simulate_the_slots(limit, expected):
+    # Running: 10 s left at speed 1. Queued: 20, 20 and 40 media seconds.
+    running = [job("r", media_seconds=20, started=90.0)]
+    order = [
+        job("q1", media_seconds=20),
+        job("q2", media_seconds=20),
+        job("q3", media_seconds=40),
+    ]
+    positions = estimate_queue(order, running, limit, lambda job: 1.0, now=100.0)
+    assert positions["r"] == {"position": 0, "eta_seconds": pytest.approx(10.0)}
+    for id, (position, eta) in expected.items():
+        assert positions[id]["position"] == position
+        assert positions[id]["eta_seconds"] == pytest.approx(eta)
+
+
+def test_queue_estimates_use_each_jobs_speed():
+    order = [job("slow", media_seconds=60), job("fast", media_seconds=60)]
+    speeds = {"slow": 0.5, "fast": 4.0}
+    positions = estimate_queue(order, [], 1, lambda job: speeds[job["id"]], now=0.0)
+    assert positions["slow"]["eta_seconds"] == pytest.approx(120.0)
+    assert positions["fast"]["eta_seconds"] == pytest.approx(135.0)
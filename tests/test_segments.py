@@ -0,0 +1,45 @@
+import pytest
+from app.processing.segments import plan_segments
+
+FPS = 30.0
+
+
+def check_cover(segments, total_frames: int):
+    assert [s["index"] for s in segments] == list(range(len(segments)))
+    assert segments[0]["start_frame"] == 0
+    for before, after in zip(segments, segments[1:]):
+        assert after["start_frame"] == before["start_frame"] + before["frame_count"]
+    assert sum(s["frame_count"] for s in segments) == total_frames
+
+
+@pytest.mark.parametrize("count", [1, 2, 4, 8])
+def test_segments_start_on_keyframes(count):
+    keyframes = [i * 2.0 for i in range(60)]
+    segments = plan_segments(keyframes, 3600, FPS, count)
+    check_cover(segments, 3600)
+    assert len(segments) == count
+    starts = {round(t * FPS) for t in keyframes}
+    assert all(s["start_frame"] in starts for s in segments)
+
+
+def test_cuts_snap_to_the_nearest_keyframe():
+    segments = plan_segments([0.0, 19.0, 31.0, 50.0], 1800, FPS, 2)
+    assert [s["start_frame"] for s in segments] == [0, 930]
+
+
+@pytest.mark.parametrize(
+    "total_frames, count, expected",
+    [(600, 8, 2), (599, 8, 1), (100, 4, 1), (3600, 100, 12)],
+)
+def test_segments_are_never_shorter_than_the_minimum(total_frames, count, expected):
+    keyframes = [i * 1.0 for i in range(total_frames // 30 + 1)]
+    segments = plan_segments(keyframes, total_frames, FPS, count)
+    check_cover(segments, total_frames)
+    assert len(segments) == expected
+    assert all(s["frame_count"] >= 10 * FPS for s in segments[:-1])
+
+
+@pytest.mark.parametrize("keyframes", [[], [0.0], [59.9]])
+def test_without_usable_keyframes_there_is_one_segment(keyframes):
+    segments = plan_segments(keyframes, 1800, FPS, 4)
+    assert segments == [{"index": 0, "start_frame": 0, "frame_count": 1800}]
@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import os
+import time
+import pytest
+from app.processing.artifacts import ARTIFACTS_DIRNAME
+from app.processing.export import EXPORTS_DIRNAME
+from app.processing.resumable import ResumableUploadError, ResumableUploadStore
+from app.processing.upload import UploadWriter
+from app.processing.upload_store import EVICTION_GRACE_SECONDS, UploadStore
+
+DATA = bytes(range(256)) * 40
+
+
+class Upload:
+    def __init__(self, data: bytes, fail_after: int | None = None):
+        self.data = data
+        self.offset = 0
+        self.fail_after = fail_after
+
+    async def read(self, size: int) -> bytes:
+        if self.fail_after is not None and self.offset >= self.fail_after:
+            raise ConnectionError("client went away")
+        block = self.data[self.offset : self.offset + size]
+        self.offset += len(block)
+        return block
+
+
+async def copy(writer: UploadWriter, upload: Upload) -> list[dict]:
+    return [progress async for progress in writer.copy_from(upload)]
+
+
+@pytest.mark.parametrize("chunk_size", [1000, len(DATA), 2 * len(DATA)])
+def test_writer_copies_and_hashes_the_upload(tmp_path, chunk_size):
+    destination = tmp_path / "video.mp4"
+    writer = UploadWriter(destination, len(DATA), chunk_size)
+    progress = asyncio.run(copy(writer, Upload(DATA)))
+    assert destination.read_bytes() == DATA
+    assert writer.content_hash == hashlib.sha256(DATA).hexdigest()
+    assert len(progress) == -(-len(DATA) // chunk_size)
+    assert progress[-1]["bytes_written"] == len(DATA)
+    assert progress[-1]["percent"] == 100
+
+
+def test_failed_copy_leaves_no_file(tmp_path):
+    destination = tmp_path / "video.mp4"
+    writer = UploadWriter(destination, len(DATA), 1000)
+    with pytest.raises(ConnectionError):
+        asyncio.run(copy(writer, Upload(DATA, fail_after=3000)))
+    assert list(tmp_path.iterdir()) == []
+
+
+def upload_chunks(store: ResumableUploadStore, data: bytes, chunk_size: int, order):
+    async def run():
+        status = await store.create("clip.mp4", len(data), chunk_size=chunk_size)
+        for index in order(status["total_chunks"]):
+            chunk = data[index * chunk_size : (index + 1) * chunk_size]
+            status = await store.write_chunk(
+                status["upload_id"], index, chunk, hashlib.sha256(chunk).hexdigest()
+            )
+        return status
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize(
+    "order", [range, lambda n: reversed(range(n)), lambda n: [*range(n), 0]]
+)
+def test_resumable_upload_completes_in_any_order(tmp_path, order):
+    store = ResumableUploadStore(tmp_path)
+    status = upload_chunks(store, DATA, 4096, order)
+    assert status["complete"]
+    assert status["confirmed_offset"] == len(DATA)
+    completed = asyncio.run(store.complete(status["upload_id"], "stored.mp4"))
+    assert (tmp_path / "stored.mp4").read_bytes() == DATA
+    assert completed["content_hash"] == hashlib.sha256(DATA).hexdigest()
+    assert list(store.work_dir.iterdir()) == []
+
+
+def test_resumable_upload_tracks_the_contiguous_prefix(tmp_path):
+    store = ResumableUploadStore(tmp_path)
+    status = upload_chunks(store, DATA, 4096, lambda n: [0, 2])
+    assert status["received_chunks"] == [0, 2]
+    assert status["confirmed_offset"] == 4096
+    assert not status["complete"]
+    with pytest.raises(ResumableUploadError, match="missing chunks"):
+        asyncio.run(store.complete(status["upload_id"], "stored.mp4"))
+
+
+@pytest.mark.parametrize(
+    "index, data, sha256, message",
+    [
+        (3, DATA[:4096], None, "out of range"),
+        (0, DATA[:4095], None, "expected 4096"),
+        (0, DATA[:4096], "0" * 64, "checksum"),
+    ],
+)
+def test_resumable_upload_rejects_bad_chunks(tmp_path, index, data, sha256, message):
+    store = ResumableUploadStore(tmp_path)
+
+    async def run():
+        status = await store.create("clip.mp4", len(DATA), chunk_size=4096)
+        await store.write_chunk(
+            status["upload_id"],
+            index,
+            data,
+            sha256 or hashlib.sha256(data).hexdigest(),
+        )
+
+    with pytest.raises(ResumableUploadError, match=message):
+        asyncio.run(run())
+
+
+def test_resumable_upload_enforces_the_size_limit(tmp_path):
+    store = ResumableUploadStore(tmp_path, max_size=len(DATA) - 1)
+    with pytest.raises(ResumableUploadError, match="limited"):
+        asyncio.run(store.create("clip.mp4", len(DATA)))
+    assert not store.work_dir.exists()
+
+
+def add_upload(upload_dir, store: UploadStore, name: str, size: int, age: float):
+    path = upload_dir / f"incoming_{name}"
+    path.write_bytes(os.urandom(size))
+    content_hash = hashlib.sha256(path.read_bytes()).hexdigest()
+    store.ingest(path, content_hash, name)
+    used = time.time() - age
+    os.utime(upload_dir / ARTIFACTS_DIRNAME / content_hash, (used, used))
+    return content_hash
+
+
+def test_quota_evicts_least_recently_used_content(tmp_path):
+    store = UploadStore(tmp_path, quota=0)
+    old = EVICTION_GRACE_SECONDS + 100
+    oldest = add_upload(tmp_path, store, "a.mp4", 1000, old + 50)
+    middle = add_upload(tmp_path, store, "b.mp4", 1000, old)
+    exports = tmp_path / EXPORTS_DIRNAME
+    exports.mkdir()
+    (exports / "a_visualized_0123abcd.mp4").write_bytes(b"x" * 500)
+    store.refresh(oldest)
+    recent = add_upload(tmp_path, store, "c.mp4", 1000, 0)
+    store.quota = 2500
+    store.enforce_quota()
+    assert not (tmp_path / "a.mp4").exists()
+    assert not (tmp_path / ARTIFACTS_DIRNAME / oldest).exists()
+    assert list(exports.iterdir()) == []
+    assert (tmp_path / "b.mp4").exists()
+    assert (tmp_path / "c.mp4").exists()
+    assert store.stats()["entries"] == 2
+    assert store.stats()["evicted"] == 1
+    assert (tmp_path / ARTIFACTS_DIRNAME / middle).is_dir()
+    assert (tmp_path / ARTIFACTS_DIRNAME / recent).is_dir()
+
+
+def test_quota_spares_pinned_and_recent_content(tmp_path):
+    store = UploadStore(tmp_path, quota=0)
+    old = EVICTION_GRACE_SECONDS + 100
+    pinned = add_upload(tmp_path, store, "a.mp4", 1000, old + 50)
+    add_upload(tmp_path, store, "b.mp4", 1000, old)
+    add_upload(tmp_path, store, "c.mp4", 1000, 0)
+    store.add_pin_source(lambda: ["b.mp4"])
+    store.quota = 1000
+    with store.pinned(pinned):
+        store.enforce_quota()
+    assert {p.name for p in tmp_path.glob("*.mp4")} == {"a.mp4", "b.mp4", "c.mp4"}
+    assert store.stats()["evicted"] == 0
+
+
+def test_identical_uploads_are_stored_once(tmp_path):
+    store = UploadStore(tmp_path, quota=0)
+    data = os.urandom(1000)
+    content_hash = hashlib.sha256(data).hexdigest()
+    for name in ("a.mp4", "b.mp4"):
+        (tmp_path / f"incoming_{name}").write_bytes(data)
+        store.ingest(tmp_path / f"incoming_{name}", content_hash, name)
+    assert os.path.samefile(tmp_path / "a.mp4", tmp_path / "b.mp4")
+    stats = store.stats()
+    assert stats["entries"] == 1
+    assert stats["bytes"] == 1000
+    assert stats["deduplicated_bytes"] == 1000
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from app.processing.wire import (
+    decode_spectrum,
+    decode_waveform,
+    encode_feature_rows,
+    encode_spectrum,
+    encode_waveform,
+)
+
+
+@pytest.mark.parametrize("points", [0, 1, 500])
+def test_waveform_round_trips_within_one_step(points):
+    columns = np.random.default_rng(0).uniform(-1, 1, (points, 3))
+    decoded = decode_waveform(encode_waveform(columns))
+    assert decoded.shape == (points, 3)
+    assert np.abs(decoded - columns).max(initial=0) <= 0.5 / 127 + 1e-6
+
+
+def test_waveform_clips_out_of_range_values():
+    decoded = decode_waveform(encode_waveform(np.array([[2.0, -3.0, 0.0]])))
+    assert decoded.tolist() == [[1.0, -1.0, 0.0]]
+
+
+@pytest.mark.parametrize("points", [0, 1, 64])
+def test_spectrum_round_trips(points):
+    rng = np.random.default_rng(0)
+    frequencies = np.sort(rng.uniform(20, 20000, points))
+    magnitudes = rng.uniform(0, 1, points)
+    hz, levels = decode_spectrum(encode_spectrum(frequencies, magnitudes))
+    assert np.abs(hz - frequencies).max(initial=0) <= 0.5
+    assert np.abs(levels - magnitudes).max(initial=0) <= 0.5 / 255 + 1e-6
+
+
+def test_spectrum_clips_frequencies_and_magnitudes():
+    hz, levels = decode_spectrum(
+        encode_spectrum(np.array([-5.0, 1e6]), np.array([-0.5, 1.5]))
+    )
+    assert hz.tolist() == [0.0, 65535.0]
+    assert levels.tolist() == [0.0, 1.0]
+
+
+def test_feature_rows_pack_bands_wave_and_level():
+    bands = np.array([[0.0, 0.5, 1.0], [2.0, -1.0, 0.25]])
+    wave = np.array([[-1.0, 0.5], [0.0, 3.0]])
+    level = np.array([0.5, 1.0])
+    rows = np.frombuffer(encode_feature_rows(bands, wave, level), dtype=np.uint8)
+    rows = rows.reshape(2, 6)
+    assert rows[:, :3].tolist() == [[0, 128, 255], [255, 0, 64]]
+    assert rows[:, 3:5].view(np.int8).tolist() == [[-127, 64], [0, 127]]
+    assert rows[:, 5].tolist() == [128, 255]
+
+
+def test_feature_rows_of_an_empty_range():
+    empty = np.empty((0, 4))
+    assert encode_feature_rows(empty, np.empty((0, 2)), np.empty(0)) == b""